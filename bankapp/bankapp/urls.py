@@ -23,7 +23,8 @@ from branches.views import (
     reports, mail, crm, compliance_dashboard, customer_experience,
     get_subcategories, get_segmentation_data, customers_page,
     logout_view, transactions, transaction_chat, risk_assessment_api,  # Add risk_assessment_api import
-    insider_threat_logs_api,chat_bot,ecom_dashboard # Import the insider threat logs API
+    insider_threat_logs_api,chat_bot,ecom_dashboard, # Import the insider threat logs API
+    neo4j_pool_metrics_api, transactions_api, risk_tier_stats_api, chat_stream_api
 )
 
 urlpatterns = [
@@ -38,6 +39,7 @@ urlpatterns = [
     path('pattern_analysis/', pattern_analysis, name='pattern_analysis'),  # Add URL pattern for pattern analysis
     path('insider_threat/', insider_threat, name='insider_threat'),  # Add URL pattern for insider threat
     path('chatbot/', chat_bot, name='chatbot'),  # Add URL pattern for chatbot
+    path('api/chat/stream/', chat_stream_api, name='chat_stream_api'),  # Add URL pattern for the streaming chatbot API
     path('ecom_dashboard/', ecom_dashboard , name='ecom_dashboard'),  # Add URL pattern for e-commerce dashboard
     path('reports/', reports, name='reports'),  # Add URL pattern for reports
     path('crm/', crm, name='crm'),  # Add URL pattern for CRM
@@ -50,7 +52,10 @@ urlpatterns = [
     path('customers/search/', include('customers.urls')),  # Add URL pattern for customer search
     path('logout/', logout_view, name='logout'),
     path('transactions/', transactions, name='transactions'),  # Add URL pattern for transactions
+    path('api/transactions/', transactions_api, name='transactions_api'),  # Add URL pattern for chunked transactions API
     path('transaction_chat/', transaction_chat, name='transaction_chat'),  # Add URL pattern for transaction chat
     path('api/risk-assessment/', risk_assessment_api, name='risk_assessment_api'),  # Add URL pattern for risk assessment API
+    path('api/risk-assessment/tiers/', risk_tier_stats_api, name='risk_tier_stats_api'),  # Add URL pattern for risk scoring tier counters
     path('api/insider-threat/logs/', insider_threat_logs_api, name='insider_threat_logs_api'),  # Add URL pattern for insider threat logs API
+    path('api/neo4j/pool-metrics/', neo4j_pool_metrics_api, name='neo4j_pool_metrics_api'),  # Add URL pattern for Neo4j pool metrics
 ]
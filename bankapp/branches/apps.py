@@ -1,6 +1,18 @@
+import atexit
+
 from django.apps import AppConfig
 
 
 class BranchesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'branches'
+
+    def ready(self):
+        # The Neo4j driver is shared by every request; close its pool once, at exit
+        from .neo4j_pool import close_drivers
+        atexit.register(close_drivers)
+
+        # Spawn the code sandbox's workers now, while the process is still single-threaded
+        from .code_sandbox import close_sandbox_pool, get_sandbox_pool
+        get_sandbox_pool()
+        atexit.register(close_sandbox_pool)
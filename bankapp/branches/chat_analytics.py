@@ -0,0 +1,270 @@
+import base64
+import io
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import pandas as pd
+
+from .query_classifier import normalize_query
+from .transaction_store import parse_timestamps
+
+# Cube dimensions: name -> (source column, label and plural used in answers)
+DIMENSIONS = OrderedDict([
+    ('fraud', ('label_for_fraud', 'fraud label', 'fraud labels')),
+    ('method', ('method_of_transaction', 'payment method', 'payment methods')),
+    ('currency', ('transaction_currency', 'currency', 'currencies')),
+    ('location', ('location_data', 'location', 'locations')),
+    ('category', ('merchant_category', 'merchant category', 'merchant categories')),
+    ('counterparty', ('to_recipient_customer_account', 'recipient', 'recipients')),
+    ('month', ('timestamp', 'month', 'months')),
+])
+
+# Query wording that maps onto one dimension of the cube
+INTENT_PATTERNS = (
+    ('fraud', re.compile(r'\b(fraud\w*|suspicious|flagged)\b')),
+    ('method', re.compile(r'\b(payment methods?|methods?|channels?)\b')),
+    ('currency', re.compile(r'\bcurrenc(y|ies)\b')),
+    ('location', re.compile(r'\b(locations?|city|cities|country|countries|where)\b')),
+    ('category', re.compile(r'\b(categor(y|ies)|merchants?)\b')),
+    ('counterparty', re.compile(r'\b(recipients?|counterpart(y|ies)|payees?|who did i (pay|send))\b')),
+    ('month', re.compile(r'\b(monthly|per month|by month|each month|over time|trends?)\b')),
+)
+
+# Wording that asks for specific rows, filters, rankings or a time window, which the
+# cube's all-time aggregates cannot answer
+ROW_LEVEL_PATTERN = re.compile(
+    r'\d|\b(list|details?|which|between|above|below|more than|less than|before|after'
+    r'|largest|smallest|biggest|highest|lowest|most|least|top|max(imum)?|min(imum)?'
+    r'|last|this|past|previous|recent(ly)?|today|yesterday|since|during'
+    r'|weeks?|weekly|years?|yearly|annual(ly)?'
+    r'|jan(uary)?|feb(ruary)?|mar(ch)?|apr(il)?|may|june?|july?|aug(ust)?|sept?(ember)?'
+    r'|oct(ober)?|nov(ember)?|dec(ember)?)\b'
+)
+
+# Rows shown per dimension table, and cubes kept for recently active customers
+TOP_ROWS = 20
+CACHE_SIZE = int(os.environ.get('CHAT_CUBE_CACHE_SIZE', '256'))
+# Generated-code analyses kept for repeated questions
+ANALYSIS_CACHE_SIZE = int(os.environ.get('CHAT_ANALYSIS_CACHE_SIZE', '512'))
+
+
+def match_intent(query: str) -> Optional[str]:
+    """
+    Map a chat query onto a cube dimension
+
+    Returns:
+        str: The dimension name, or None if the query needs generated code
+        (row-level filters, several dimensions, or no known dimension)
+    """
+    text = query.lower()
+    if ROW_LEVEL_PATTERN.search(text):
+        return None
+    matches = [name for name, pattern in INTENT_PATTERNS if pattern.search(text)]
+    return matches[0] if len(matches) == 1 else None
+
+
+def data_version(df: pd.DataFrame) -> int:
+    """Content hash of the transactions, so a cube is rebuilt whenever the loaded data changes"""
+    columns = [c for c in ['transaction_id', 'transaction_amount'] + [d[0] for d in DIMENSIONS.values()] if c in df.columns]
+    if df.empty or not columns:
+        return len(df)
+    return int(pd.util.hash_pandas_object(df[columns].astype(str), index=False).sum())
+
+
+class AnalyticsCube:
+    """Precomputed group-bys of one customer's transactions"""
+
+    def __init__(self, df: pd.DataFrame):
+        amounts = pd.to_numeric(df['transaction_amount'], errors='coerce') if 'transaction_amount' in df.columns \
+            else pd.Series(0.0, index=df.index)
+        fraud = pd.to_numeric(df['label_for_fraud'], errors='coerce').fillna(0) if 'label_for_fraud' in df.columns \
+            else pd.Series(0, index=df.index)
+        base = pd.DataFrame({'amount': amounts, 'fraud': (fraud == 1).astype(int)}, index=df.index)
+
+        self.count = len(df)
+        self.total_amount = float(amounts.sum())
+        self.avg_amount = self.total_amount / self.count if self.count else 0.0
+        self.fraud_count = int(base['fraud'].sum())
+        # A few rows as CSV for prompt context, far more compact than indented JSON
+        self.sample = df.head(5).to_csv(index=False)
+        self._prompt_summary = None
+        self.tables: Dict[str, pd.DataFrame] = {}
+        self.charts: Dict[str, Optional[str]] = {}
+        self.lock = threading.Lock()
+
+        for name, (column, _, _) in DIMENSIONS.items():
+            if column not in df.columns:
+                continue
+            if name == 'month':
+                timestamps = parse_timestamps(df[column].astype(str))
+                keys = timestamps.dt.to_period('M').astype(str).where(timestamps.notna(), 'Unknown')
+            elif name == 'fraud':
+                keys = base['fraud'].map({1: 'Flagged', 0: 'Normal'})
+            else:
+                keys = df[column].fillna('Unknown').astype(str)
+            grouped = base.groupby(keys.to_numpy())
+            table = pd.DataFrame({
+                'transactions': grouped.size(),
+                'total_amount': grouped['amount'].sum(),
+                'average_amount': grouped['amount'].mean(),
+                'flagged': grouped['fraud'].sum(),
+            })
+            if name == 'month':
+                table = table.sort_index()
+            else:
+                table = table.sort_values('total_amount', ascending=False)
+            self.tables[name] = table
+
+    def supports(self, dimension: str) -> bool:
+        return dimension in self.tables
+
+    def counts(self, dimension: str) -> Dict[str, int]:
+        """Transactions per value of a dimension, most frequent first (empty if the column is missing)"""
+        table = self.tables.get(dimension)
+        if table is None:
+            return {}
+        return table['transactions'].sort_values(ascending=False, kind='stable').astype(int).to_dict()
+
+    def prompt_summary(self) -> str:
+        """Text overview of the transactions for LLM prompts, built once per cube"""
+        if self._prompt_summary is None:
+            def lines(counts):
+                return '\n'.join(f"- {k}: {v}" for k, v in counts.items())
+            self._prompt_summary = f"""Total Transactions: {self.count}
+Fraud Transactions: {self.fraud_count}
+Total Transaction Amount: {self.total_amount:.2f}
+
+Transaction Methods:
+{lines(self.counts('method'))}
+
+Transaction Locations:
+{lines(self.counts('location'))}
+
+Sample Transactions (up to 5, CSV):
+{self.sample}"""
+        return self._prompt_summary
+
+    def _chart(self, dimension: str) -> Optional[str]:
+        """Bar chart of one dimension as a base64 PNG, rendered once per cube"""
+        with self.lock:
+            if dimension in self.charts:
+                return self.charts[dimension]
+            try:
+                import matplotlib.pyplot as plt
+                table = self.tables[dimension]
+                if dimension != 'month':
+                    table = table.head(TOP_ROWS)
+                label = DIMENSIONS[dimension][1]
+                fig, axes = plt.subplots(1, 2, figsize=(12, 5))
+                table['total_amount'].plot(kind='line' if dimension == 'month' else 'bar', ax=axes[0], color='#2196F3', marker='o' if dimension == 'month' else None)
+                axes[0].set_title(f'Amount by {label} (₹)')
+                table['transactions'].plot(kind='bar', ax=axes[1], color='#4CAF50')
+                axes[1].set_title(f'Transactions by {label}')
+                for ax in axes:
+                    ax.tick_params(axis='x', rotation=45)
+                fig.tight_layout()
+                buffer = io.BytesIO()
+                fig.savefig(buffer, format='png')
+                plt.close(fig)
+                chart = base64.b64encode(buffer.getvalue()).decode()
+            except Exception as e:
+                print(f"Error rendering analytics chart: {e}")
+                chart = None
+            self.charts[dimension] = chart
+            return chart
+
+    def answer(self, dimension: str) -> Dict[str, Any]:
+        """
+        Answer a question about one dimension straight from the cube
+
+        Returns:
+            dict: summary, visualization (base64 PNG) and dataframe_html
+        """
+        table = self.tables[dimension]
+        _, label, plural = DIMENSIONS[dimension]
+        shown = table if dimension == 'month' else table.head(TOP_ROWS)
+
+        if dimension == 'fraud':
+            summary = (f"{self.fraud_count} of your {self.count} transactions are flagged as suspicious"
+                       + (f", totalling ₹{table.loc['Flagged', 'total_amount']:,.2f}." if 'Flagged' in table.index else "."))
+        elif dimension == 'month':
+            busiest = table['total_amount'].idxmax() if len(table) else 'N/A'
+            summary = (f"Your transactions span {len(table)} {plural if len(table) != 1 else label}. The highest total was in {busiest} "
+                       f"(₹{table['total_amount'].max():,.2f} across {int(table.loc[busiest, 'transactions'])} transactions)."
+                       if len(table) else "No dated transactions were found.")
+        else:
+            top = table.index[0] if len(table) else 'N/A'
+            summary = (f"Across {len(table)} {plural if len(table) != 1 else label}, {top} accounts for the most, with ₹{table['total_amount'].iloc[0]:,.2f} "
+                       f"over {int(table['transactions'].iloc[0])} of your {self.count} transactions."
+                       if len(table) else f"No {label} information was found.")
+
+        display = shown.reset_index().rename(columns={'index': label.capitalize()})
+        display['total_amount'] = display['total_amount'].map('₹{:,.2f}'.format)
+        display['average_amount'] = display['average_amount'].map('₹{:,.2f}'.format)
+        return {
+            'summary': summary,
+            'visualization': self._chart(dimension),
+            'dataframe_html': display.to_html(classes='table table-striped table-hover', border=0, index=False),
+        }
+
+
+_cubes: "OrderedDict[Tuple[str, Any], AnalyticsCube]" = OrderedDict()
+_cubes_lock = threading.Lock()
+
+
+def get_cube(customer_id, df: pd.DataFrame, version=None) -> AnalyticsCube:
+    """
+    Get the analytics cube of a customer's transactions
+
+    Cubes are keyed by customer and data version, so they are rebuilt only
+    when the customer's transactions change.
+
+    Args:
+        customer_id: Customer the transactions belong to
+        df: The customer's transactions
+        version: Version of the source data (e.g. TransactionStore.version);
+                 without it the rows are hashed to detect changes
+    """
+    key = (str(customer_id), version if version is not None else data_version(df))
+    with _cubes_lock:
+        cube = _cubes.get(key)
+        if cube is not None:
+            _cubes.move_to_end(key)
+            return cube
+    cube = AnalyticsCube(df)
+    with _cubes_lock:
+        _cubes[key] = cube
+        while len(_cubes) > CACHE_SIZE:
+            _cubes.popitem(last=False)
+    return cube
+
+
+_analyses: "OrderedDict[Tuple[str, str, Any], Dict[str, Any]]" = OrderedDict()
+_analyses_lock = threading.Lock()
+
+
+def analysis_key(query: str, customer_id, df: pd.DataFrame, version=None) -> Tuple[str, str, Any]:
+    """Cache key of a generated-code analysis: normalized query, customer and data version"""
+    return normalize_query(query), str(customer_id), version if version is not None else data_version(df)
+
+
+def get_cached_analysis(key: Tuple[str, str, Any]) -> Optional[Dict[str, Any]]:
+    """Get a copy of a cached analysis response (generated code, summary, chart and explanation)"""
+    with _analyses_lock:
+        response = _analyses.get(key)
+        if response is None:
+            return None
+        _analyses.move_to_end(key)
+    return {**response, 'canvas_data': dict(response['canvas_data'] or {})}
+
+
+def cache_analysis(key: Tuple[str, str, Any], response: Dict[str, Any]):
+    """Keep an analysis response for repeats of the same question on the same data"""
+    with _analyses_lock:
+        _analyses[key] = response
+        _analyses.move_to_end(key)
+        while len(_analyses) > ANALYSIS_CACHE_SIZE:
+            _analyses.popitem(last=False)
@@ -0,0 +1,245 @@
+import ast
+import base64
+import builtins
+import importlib
+import io
+import multiprocessing
+import os
+import re
+import signal
+import threading
+import types
+from typing import Any, Dict, Optional, Tuple
+
+import pandas as pd
+
+# Worker processes, wall-clock seconds a snippet may run (and wait for a free
+# worker), and the CPU time and address space each worker may use
+MAX_WORKERS = int(os.environ.get('CHAT_SANDBOX_WORKERS', '2'))
+TIMEOUT_SECONDS = float(os.environ.get('CHAT_SANDBOX_TIMEOUT', '20'))
+CPU_SECONDS = int(os.environ.get('CHAT_SANDBOX_CPU_SECONDS', '15'))
+MEMORY_MB = int(os.environ.get('CHAT_SANDBOX_MEMORY_MB', '2048'))
+
+# Extra seconds to wait for a replacement worker to start (import pandas and matplotlib)
+STARTUP_SECONDS = float(os.environ.get('CHAT_SANDBOX_STARTUP_SECONDS', '30'))
+
+# Keys of the generated code's output dict passed back to the request
+OUTPUT_KEYS = ('summary', 'visualization', 'dataframe_html')
+
+# Builtins available to generated code: no open, __import__ of arbitrary
+# modules, eval/exec/compile or getattr-style reflection
+SAFE_BUILTINS = (
+    'abs', 'all', 'any', 'bool', 'dict', 'divmod', 'enumerate', 'filter', 'float', 'format',
+    'frozenset', 'hasattr', 'int', 'isinstance', 'len', 'list', 'locals', 'map', 'max', 'min',
+    'pow', 'print', 'range', 'repr', 'reversed', 'round', 'set', 'slice', 'sorted', 'str',
+    'sum', 'tuple', 'zip',
+    'Exception', 'ArithmeticError', 'AttributeError', 'IndexError', 'KeyError', 'TypeError',
+    'ValueError', 'ZeroDivisionError',
+)
+
+# Modules generated code may import; io is narrowed to in-memory buffers
+ALLOWED_MODULES = ('base64', 'datetime', 'io', 'math', 'matplotlib', 'matplotlib.pyplot', 'numpy', 'pandas')
+
+# pandas/numpy/matplotlib attributes that read or write files or URLs
+_IO_ATTRIBUTE = re.compile(
+    r'^(read_\w+'
+    r'|to_(?!(?:datetime|dict|frame|html|list|markdown|numeric|numpy|period|records|string|timedelta|timestamp)$)\w+'
+    r'|\w*open\w*|\w*load\w*|save(?!fig$)\w*|imread|imsave|fromfile|tofile|memmap'
+    r'|DataSource|ExcelFile|ExcelWriter|HDFStore)$'
+)
+
+_IN_MEMORY_IO = types.SimpleNamespace(BytesIO=io.BytesIO, StringIO=io.StringIO)
+
+
+class SandboxLimitExceeded(Exception):
+    """Raised inside a worker when a snippet runs out of wall-clock or CPU time"""
+
+
+def check_code(code: str) -> Optional[str]:
+    """
+    Statically reject code that could escape the sandbox's namespace
+
+    Private and dunder attributes (the usual route from any object back to
+    the real builtins) and pandas/numpy file and URL I/O are refused.
+
+    Returns:
+        str: Why the code was rejected, or None if it may run
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return f"SyntaxError: {e}"
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Attribute):
+            if node.attr.startswith('_'):
+                return f"Access to private attribute '{node.attr}' is not allowed"
+            if _IO_ATTRIBUTE.match(node.attr):
+                return f"File and network access ('{node.attr}') is not allowed"
+        elif isinstance(node, ast.Name) and node.id.startswith('__'):
+            return f"Access to '{node.id}' is not allowed"
+        elif isinstance(node, ast.Constant) and isinstance(node.value, str) and '__' in node.value:
+            # str.format fields such as "{0.__class__}" reach attributes too
+            return "Strings containing '__' are not allowed"
+    return None
+
+
+def _restricted_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level or name not in ALLOWED_MODULES:
+        raise ImportError(f"Module '{name}' is not available to analysis code")
+    if name == 'io':
+        return _IN_MEMORY_IO
+    module = importlib.import_module(name)
+    return module if fromlist else importlib.import_module(name.partition('.')[0])
+
+
+def _raise_limit(signum, frame):
+    raise SandboxLimitExceeded('CPU time limit exceeded' if signum == signal.SIGXCPU else 'Time limit exceeded')
+
+
+def _init_worker(cpu_seconds: int, memory_mb: int):
+    """Pool initializer: import the analysis libraries, then lock the worker down"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot  # noqa: F401
+    try:
+        import resource
+    except ImportError:
+        # No rlimits on this platform; the parent's wall-clock timeout still applies
+        return
+    # Time spent importing is not charged to the snippet
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = int(usage.ru_utime + usage.ru_stime) + cpu_seconds
+    signal.signal(signal.SIGXCPU, _raise_limit)
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+    memory = memory_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    # Writes to files (e.g. savefig to a path) fail with EFBIG instead of killing the worker
+    signal.signal(signal.SIGXFSZ, signal.SIG_IGN)
+    resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))
+
+
+def _run_snippet(code: str, df: pd.DataFrame, timeout: float) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Run a snippet in a pool worker and return its output dict or an error message"""
+    import matplotlib.pyplot as plt
+
+    if hasattr(signal, 'setitimer'):
+        signal.signal(signal.SIGALRM, _raise_limit)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        safe_builtins = {name: getattr(builtins, name) for name in SAFE_BUILTINS}
+        safe_builtins['__import__'] = _restricted_import
+        namespace = {'__builtins__': safe_builtins, 'df': df, 'pd': pd, 'plt': plt,
+                     'io': _IN_MEMORY_IO, 'base64': base64}
+        exec(code, namespace)
+        output = namespace.get('output')
+        if not isinstance(output, dict):
+            return None, "Generated code did not produce an output dictionary"
+        return {key: None if output.get(key) is None else str(output[key])
+                for key in OUTPUT_KEYS if key in output}, None
+    except BaseException as e:
+        return None, f"{type(e).__name__}: {e}"
+    finally:
+        if hasattr(signal, 'setitimer'):
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+class SandboxPool:
+    """
+    Bounded pool of resource-limited worker processes for generated code
+
+    Workers are started with spawn, so they never inherit the server's
+    threads, locks or address space; each imports pandas and matplotlib
+    once and then sets its own rlimits. A worker runs a single snippet and
+    is replaced in the background, so no snippet sees another's state.
+    """
+
+    def __init__(self, workers: int = MAX_WORKERS, cpu_seconds: int = CPU_SECONDS, memory_mb: int = MEMORY_MB):
+        self.workers = workers
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(workers)
+        self._pool = self._start()
+
+    def _start(self):
+        return multiprocessing.get_context('spawn').Pool(
+            processes=self.workers, initializer=_init_worker,
+            initargs=(self.cpu_seconds, self.memory_mb), maxtasksperchild=1
+        )
+
+    def run(self, code: str, df: pd.DataFrame,
+            timeout: float = TIMEOUT_SECONDS) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Execute generated analysis code in a pool worker
+
+        The snippet sees df, pd, plt, io and base64, may import only
+        ALLOWED_MODULES, and should assign an output dict. At most `workers`
+        snippets run at once.
+
+        Args:
+            code: Python code to run
+            df: Transactions available to the code as df
+            timeout: Wall-clock seconds to wait for a free worker, and then for the snippet
+
+        Returns:
+            tuple: (output dict with summary, visualization and dataframe_html, or None;
+            error message or None)
+        """
+        error = check_code(code)
+        if error:
+            return None, error
+        if not self._slots.acquire(timeout=timeout):
+            return None, "All analysis workers are busy"
+        try:
+            with self.lock:
+                pool = self._pool
+                result = pool.apply_async(_run_snippet, (code, df, timeout))
+            try:
+                return result.get(timeout + STARTUP_SECONDS)
+            except multiprocessing.TimeoutError:
+                # The worker ignored its own time limit; replace every worker rather than leave it running
+                self._recycle(pool)
+                return None, f"Analysis timed out after {timeout:g} seconds"
+        finally:
+            self._slots.release()
+
+    def _recycle(self, pool):
+        with self.lock:
+            if self._pool is not pool:
+                return
+            self._pool = self._start()
+        pool.terminate()
+
+    def close(self):
+        with self.lock:
+            self._pool.terminate()
+            self._pool.join()
+
+
+_pool: Optional[SandboxPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_sandbox_pool() -> SandboxPool:
+    """Get the process-wide sandbox pool, starting its workers on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = SandboxPool()
+    return _pool
+
+
+def close_sandbox_pool():
+    """Stop the sandbox workers (registered at exit)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def run_code(code: str, df: pd.DataFrame,
+             timeout: float = TIMEOUT_SECONDS) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Execute generated analysis code in the shared sandbox pool (see SandboxPool.run)"""
+    return get_sandbox_pool().run(code, df, timeout)
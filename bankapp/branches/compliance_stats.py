@@ -0,0 +1,111 @@
+import io
+import os
+import threading
+from typing import Any, Dict, Tuple
+
+import pandas as pd
+
+# CSV flag columns counted for the compliance dashboard header
+FLAG_COLUMNS = ('smurfing_indicator', 'previous_fraud_flag')
+
+# Bytes just before the counted offset, compared to detect rewrites (vs appends)
+_TAIL_CHECK_BYTES = 256
+
+
+class AppendedRowCounter:
+    """
+    Running counts of flag columns in a CSV that grows by appending rows
+
+    Only bytes appended since the last call are parsed. If the file shrinks
+    or the already-counted part changes, everything is counted again.
+    """
+
+    def __init__(self, csv_path: str, columns: Tuple[str, ...] = FLAG_COLUMNS):
+        self.csv_path = csv_path
+        self.columns = columns
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.header = None
+        self.offset = 0
+        self.tail = b''
+        self.rows = 0
+        self.counts = {column: 0 for column in self.columns}
+
+    def _count(self, data: bytes, header: bool):
+        """Add the flag counts of complete CSV lines in data"""
+        if header:
+            frame = pd.read_csv(io.BytesIO(data), usecols=lambda c: c in self.columns)
+            self.header = pd.read_csv(io.BytesIO(data), nrows=0).columns.tolist()
+        else:
+            # Appended rows may omit trailing empty fields, so select the flag columns by position
+            positions = {self.header.index(c): c for c in self.columns if c in self.header}
+            frame = pd.read_csv(io.BytesIO(data), header=None, usecols=list(positions))
+            frame = frame.rename(columns=positions)
+        self.rows += len(frame)
+        for column in self.columns:
+            if column in frame.columns:
+                self.counts[column] += int((pd.to_numeric(frame[column], errors='coerce') == 1).sum())
+
+    def update(self) -> Dict[str, int]:
+        """
+        Count any rows appended since the last update
+
+        Returns:
+            dict: rows and one count per flag column (rows where the flag is 1)
+        """
+        with self.lock:
+            size = os.path.getsize(self.csv_path)
+            with open(self.csv_path, 'rb') as f:
+                if self.offset:
+                    f.seek(max(0, self.offset - len(self.tail)))
+                    if size < self.offset or f.read(len(self.tail)) != self.tail:
+                        # Rewritten rather than appended: start over
+                        self._reset()
+                f.seek(self.offset)
+                data = f.read()
+
+            # Only consume complete lines; a row still being written is counted next time
+            end = data.rfind(b'\n') + 1
+            if end > 0:
+                self._count(data[:end], header=self.offset == 0)
+                self.offset += end
+                self.tail = data[max(0, end - _TAIL_CHECK_BYTES):end]
+            return {'rows': self.rows, **self.counts}
+
+
+_counters: Dict[str, AppendedRowCounter] = {}
+_counters_lock = threading.Lock()
+
+
+def flag_counts(csv_path: str) -> Dict[str, int]:
+    """Get the up-to-date flag counts of a CSV from its process-wide counter"""
+    key = os.path.abspath(csv_path)
+    with _counters_lock:
+        counter = _counters.get(key)
+        if counter is None:
+            counter = _counters[key] = AppendedRowCounter(key)
+    return counter.update()
+
+
+def compliance_dashboard_stats(csv_path: str, risk_cache) -> Dict[str, Any]:
+    """
+    Get the compliance dashboard header figures from running aggregates
+
+    Args:
+        csv_path: Transactions CSV the dashboard lists
+        risk_cache: RiskAssessmentCache holding the scored transactions
+
+    Returns:
+        dict: high_risk_count, avg_risk_score, scored_count, pattern_anomalies and insider_threats
+    """
+    totals = risk_cache.totals()
+    counts = flag_counts(csv_path)
+    return {
+        'high_risk_count': totals['high_risk'],
+        'avg_risk_score': totals['risk_sum'] / totals['scored'] if totals['scored'] else 0,
+        'scored_count': totals['scored'],
+        'pattern_anomalies': counts['smurfing_indicator'],
+        'insider_threats': counts['previous_fraud_flag']
+    }
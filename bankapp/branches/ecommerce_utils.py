@@ -0,0 +1,170 @@
+import json
+import threading
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, Optional, Sequence
+
+try:
+    from .transaction_store import parse_timestamps, project_columns
+except ImportError:
+    # Imported by the benchmark scripts from the branches directory
+    from transaction_store import parse_timestamps, project_columns
+
+# Seed for the simulated per-order risk scores, so a dashboard is stable across reloads
+RISK_SCORE_SEED = 42
+
+_stats_cache = {}
+_stats_lock = threading.Lock()
+
+
+def _order_draws(transaction_ids: pd.Series, seed: Optional[int]) -> np.ndarray:
+    """
+    Get a pseudo-random 64-bit value per order, derived from its transaction_id
+
+    Hashing the id (rather than drawing from a generator) keeps each order's
+    value the same when rows are added, removed or reordered.
+    """
+    if seed is None:
+        return np.random.default_rng().integers(0, 2 ** 63, len(transaction_ids), dtype=np.uint64)
+    hash_key = str(seed).rjust(16, '0')[-16:]
+    return pd.util.hash_pandas_object(transaction_ids.astype(str), index=False,
+                                      hash_key=hash_key).to_numpy(dtype=np.uint64)
+
+
+def score_orders(df: pd.DataFrame, seed: Optional[int] = RISK_SCORE_SEED) -> pd.DataFrame:
+    """
+    Add simulated fraud, chargeback and risk score columns to e-commerce orders
+
+    Args:
+        df: Orders with transaction_id, payment_method, ip_address,
+            order_amount, new_amount, coupon_used and country columns
+        seed: Seed for the simulated risk scores (None for fresh random scores)
+
+    Returns:
+        DataFrame: A shallow copy of df with is_fraud, is_chargeback,
+        base_risk_score and risk_score columns added
+    """
+    df = df.copy(deep=False)
+    draws = _order_draws(df['transaction_id'], seed)
+    order_amount = df['order_amount'].to_numpy(dtype=float)
+
+    # Basic preprocessing - add fraud flag (simulated)
+    is_fraud = ((df['payment_method'] == 0)
+                | df['ip_address'].str.startswith('200.', na=False)
+                | ((df['order_amount'] > 9000) & (df['country'] != 'India'))).to_numpy(dtype=bool)
+    df['is_fraud'] = is_fraud
+
+    # Chargebacks: discounted more than 10% with a coupon
+    df['is_chargeback'] = (((df['order_amount'] - df['new_amount']) / df['order_amount'] > 0.1)
+                           & (df['coupon_used'] == 'YES'))
+
+    df['base_risk_score'] = np.where(is_fraud, 80.0, 25 + order_amount / 10000 * 30)
+    df['risk_score'] = np.where(is_fraud,
+                                85 + (draws % 15).astype(np.int64),
+                                20 + (draws % 40).astype(np.int64))
+    return df
+
+
+def _status(risk_score: int):
+    """Map a risk score to the dashboard status label and badge classes"""
+    if risk_score >= 70:
+        return 'Flagged', 'bg-red-100 text-red-800'
+    if risk_score >= 40:
+        return 'Review', 'bg-yellow-100 text-yellow-800'
+    return 'Approved', 'bg-green-100 text-green-800'
+
+
+def ecommerce_dashboard_stats(df: pd.DataFrame, seed: Optional[int] = RISK_SCORE_SEED) -> Dict[str, Any]:
+    """
+    Compute the e-commerce dashboard figures with whole-column operations
+
+    Only the 3 highest-risk and 10 most recent orders are ever turned into
+    Python objects; everything else stays vectorized.
+
+    Args:
+        df: E-commerce orders (see score_orders for the required columns)
+        seed: Seed for the simulated risk scores
+
+    Returns:
+        dict: Dashboard statistics, alerts, recent orders and chart data
+    """
+    scored = score_orders(df, seed)
+
+    total_transactions = len(scored)
+    fraud_transactions = int(scored['is_fraud'].sum())
+    fraud_percentage = (fraud_transactions / total_transactions * 100) if total_transactions > 0 else 0
+    avg_risk_score = float(scored['base_risk_score'].mean()) if total_transactions > 0 else 0
+    chargebacks = int(scored['is_chargeback'].sum())
+
+    # Get high risk alerts (top 3 by risk score)
+    high_risk_alerts = [
+        {
+            'transaction_id': row['transaction_id'],
+            'risk_score': int(row['risk_score']),
+            'amount': float(row['order_amount']),
+            'time_ago': f"{i*3+2} minutes ago"
+        }
+        for i, row in enumerate(scored.nlargest(3, 'risk_score').to_dict('records'))
+    ]
+
+    # Get recent transactions (top 10 by timestamp)
+    scored['parsed_timestamp'] = parse_timestamps(scored['timestamp'])
+    recent_transactions = []
+    for row in scored.nlargest(10, 'parsed_timestamp').to_dict('records'):
+        risk_score = int(row['risk_score'])
+        status, status_class = _status(risk_score)
+        recent_transactions.append({
+            'transaction_id': row['transaction_id'],
+            'user_id': f"U{row['customer_id'] % 10000}",
+            'risk_score': risk_score,
+            'country': row['country'],
+            'status': status,
+            'status_class': status_class,
+            'amount': float(row['order_amount'])
+        })
+
+    # Prepare chart data for fraud vs legitimate transactions
+    chart_data = {
+        'labels': ['Legitimate', 'Fraudulent'],
+        'data': [total_transactions - fraud_transactions, fraud_transactions]
+    }
+
+    return {
+        'total_transactions': total_transactions,
+        'fraud_percentage': fraud_percentage,
+        'avg_risk_score': avg_risk_score,
+        'chargebacks': chargebacks,
+        'high_risk_alerts': high_risk_alerts,
+        'recent_transactions': recent_transactions,
+        'chart_data_json': json.dumps(chart_data)
+    }
+
+
+def cached_dashboard_stats(store, seed: Optional[int] = RISK_SCORE_SEED,
+                           columns: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """
+    Get the dashboard figures for a TransactionStore, computed once per data version
+
+    Args:
+        store: The TransactionStore holding the e-commerce orders
+        seed: Seed for the simulated risk scores
+        columns: Columns to project from the store's frame, as returned by shared_store
+
+    Returns:
+        dict: See ecommerce_dashboard_stats
+    """
+    frame = store.frame()
+    if columns is not None:
+        frame = project_columns(frame, columns)
+    key = (store.csv_path, store.version, seed)
+    stats = _stats_cache.get(key)
+    if stats is None:
+        with _stats_lock:
+            stats = _stats_cache.get(key)
+            if stats is None:
+                stats = ecommerce_dashboard_stats(frame, seed)
+                # Only the latest version of each file is worth keeping
+                for old_key in [k for k in _stats_cache if k[0] == store.csv_path]:
+                    del _stats_cache[old_key]
+                _stats_cache[key] = stats
+    return stats
@@ -0,0 +1,86 @@
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Compliance status by risk score: (lower bound, status, badge classes), highest first
+RISK_STATUSES = (
+    (70, 'Frozen', 'bg-red-100 text-red-800'),
+    (30, 'Under Review', 'bg-yellow-100 text-yellow-800'),
+    (None, 'Validated', 'bg-green-100 text-green-800'),
+)
+
+
+def risk_status(scores: np.ndarray):
+    """
+    Map risk scores to compliance status labels and badge classes
+
+    Returns:
+        tuple: (status array, status class array)
+    """
+    conditions = [scores >= bound for bound, _, _ in RISK_STATUSES[:-1]]
+    status = np.select(conditions, [s for _, s, _ in RISK_STATUSES[:-1]], default=RISK_STATUSES[-1][1])
+    status_class = np.select(conditions, [c for _, _, c in RISK_STATUSES[:-1]], default=RISK_STATUSES[-1][2])
+    return status, status_class
+
+
+def format_dates(timestamps: pd.Series, fmt: str = '%b %d, %Y') -> np.ndarray:
+    """Format datetimes, with 'N/A' for missing values"""
+    return timestamps.dt.strftime(fmt).fillna('N/A').to_numpy(dtype=object)
+
+
+def relative_time(timestamps: pd.Series, now: Optional[pd.Timestamp] = None) -> np.ndarray:
+    """Describe datetimes as '3d ago', '5h ago' or '12m ago' relative to now"""
+    now = now if now is not None else pd.Timestamp.now()
+    delta = now - timestamps
+    days = delta.dt.days
+    seconds = delta.dt.seconds
+    hours = seconds // 3600
+    minutes = seconds // 60
+    text = np.select(
+        [days > 0, hours > 0],
+        [days.astype('Int64').astype(str) + 'd ago', hours.astype('Int64').astype(str) + 'h ago'],
+        default=minutes.astype('Int64').astype(str) + 'm ago'
+    )
+    return np.where(timestamps.isna().to_numpy(), 'N/A', text).astype(object)
+
+
+def format_currency(amounts: pd.Series, symbol: str = '₹') -> np.ndarray:
+    """Format amounts as currency with thousands separators, with 'N/A' for non-numeric values"""
+    numeric = pd.to_numeric(amounts, errors='coerce')
+    text = numeric.map('{:,.2f}'.format, na_action='ignore')
+    return (symbol + text).fillna('N/A').to_numpy(dtype=object)
+
+
+def format_compliance_page(transactions: List[Dict[str, Any]], timestamps: pd.Series,
+                           now: Optional[pd.Timestamp] = None) -> List[Dict[str, Any]]:
+    """
+    Add display fields to a page of compliance transactions with whole-column operations
+
+    Args:
+        transactions: Page rows carrying risk_score and transaction_amount
+        timestamps: Parsed timestamps of the same rows, in the same order
+        now: Reference time for relative times (default: now)
+
+    Returns:
+        list: The same dicts with status, status_class, formatted_date,
+        time_ago and formatted_amount set
+    """
+    if not transactions:
+        return transactions
+    timestamps = pd.Series(timestamps.to_numpy(), dtype='datetime64[ns]')
+    scores = pd.to_numeric(pd.Series([t.get('risk_score', 0) for t in transactions]), errors='coerce').fillna(0).to_numpy()
+    amounts = pd.Series([t.get('transaction_amount') for t in transactions])
+
+    status, status_class = risk_status(scores)
+    columns = {
+        'status': status,
+        'status_class': status_class,
+        'formatted_date': format_dates(timestamps),
+        'time_ago': relative_time(timestamps, now),
+        'formatted_amount': format_currency(amounts),
+    }
+    for name, values in columns.items():
+        for transaction, value in zip(transactions, values.tolist()):
+            transaction[name] = value
+    return transactions
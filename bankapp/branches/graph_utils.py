@@ -4,6 +4,7 @@ from pyvis.network import Network
 import os
 import json
 import random
+from .transaction_store import load_customer_transactions, STATISTICS_COLUMNS
 
 def generate_transaction_graph(customer_id=20917, output_path='bankapp/branches/static/graph'):
     """
@@ -20,12 +21,9 @@ def generate_transaction_graph(customer_id=20917, output_path='bankapp/branches/
     csv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 
                            'data', 'final_synthetic_transactions.csv')
     
-    # Read the CSV file
     try:
-        df = pd.read_csv(csv_path)
-        
-        # Filter transactions for the specified customer account number
-        customer_transactions = df[df['customer_account_number'] == customer_id]
+        # Get the customer's transactions from the shared customer index
+        customer_transactions = load_customer_transactions(customer_id, csv_path, key_columns=('customer_account_number',))
         
         # Create a directed graph
         G = nx.DiGraph()
@@ -199,10 +197,9 @@ def get_transaction_statistics(customer_id=20917):
                            'data', 'final_synthetic_transactions.csv')
     
     try:
-        df = pd.read_csv(csv_path)
-        
-        # Filter transactions for the specified customer account number
-        customer_transactions = df[df['customer_account_number'] == customer_id]
+        # Get the customer's transactions, loading only the columns needed here
+        customer_transactions = load_customer_transactions(customer_id, csv_path, columns=STATISTICS_COLUMNS,
+                                                           key_columns=('customer_account_number',))
         
         # Calculate statistics
         total = len(customer_transactions)
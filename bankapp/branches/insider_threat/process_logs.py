@@ -1,12 +1,21 @@
 import json
 import os
 import base64
-from google import genai
 from google.genai import types
 from pathlib import Path
 
 from dotenv import load_dotenv
 
+try:
+    from ..risk_profiling.utils.llm_clients import get_gemini_client
+    from ..risk_profiling.utils.prompt_encoder import compact_json
+except ImportError:
+    # Run as a script
+    import sys
+    sys.path.append(str(Path(__file__).resolve().parent.parent / 'risk_profiling'))
+    from utils.llm_clients import get_gemini_client
+    from utils.prompt_encoder import compact_json
+
 load_dotenv()
 
 def load_logs_from_directory(logs_dir):
@@ -87,22 +96,20 @@ LOGS DATA:
 ## Insider Threat Alerts:
 """
     
-    prompt += json.dumps(insider_threats, indent=2)
+    prompt += compact_json(insider_threats)
     
     prompt += """
 
 ## Detailed Activity Logs:
 """
     
-    prompt += json.dumps(activity_logs, indent=2)
+    prompt += compact_json(activity_logs)
     
     return prompt
 
 def call_gemini_llm(prompt):
     """Call Gemini LLM with the prepared prompt."""
-    client = genai.Client(
-        api_key=os.environ.get("GOOGLE_API_KEY"),
-    )
+    client = get_gemini_client()
 
     model = "gemini-2.0-pro-exp-02-05"
     contents = [
@@ -45,12 +45,21 @@ class InsiderThreatMiddleware:
             ip = request.META.get('REMOTE_ADDR')
         return ip
 
+# Session roles allowed to see customer data
+STAFF_ROLES = ('compliance', 'employee')
+
+
+def has_staff_role(request) -> bool:
+    """Check whether the session belongs to a logged-in compliance officer or employee"""
+    return request.session.get('user_role') in STAFF_ROLES
+
+
 class RoleBasedAccessMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        if request.path.startswith('/dashboard') and request.session.get('user_role') not in ['compliance', 'employee']:
+        if request.path.startswith('/dashboard') and not has_staff_role(request):
             return redirect('/')
 
         response = self.get_response(request)
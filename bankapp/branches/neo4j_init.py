@@ -1,6 +1,11 @@
-from neo4j import GraphDatabase
 import os
 
+try:
+    from .neo4j_pool import get_driver
+except ImportError:
+    # Run as a standalone script from the branches directory
+    from neo4j_pool import get_driver
+
 def initialize_neo4j():
     """
     Initialize Neo4j database with necessary constraints and indexes
@@ -12,7 +17,7 @@ def initialize_neo4j():
     
     try:
         # Connect to Neo4j
-        driver = GraphDatabase.driver(uri, auth=(user, password))
+        driver = get_driver(uri, user, password)
         
         with driver.session() as session:
             # Create constraints
@@ -26,7 +31,6 @@ def initialize_neo4j():
             
             print("Neo4j database initialized successfully!")
         
-        driver.close()
         return True
     
     except Exception as e:
@@ -0,0 +1,154 @@
+from neo4j import GraphDatabase
+import os
+import time
+import threading
+from typing import Dict, Any, Optional
+
+# Connection pool settings, overridable per deployment
+NEO4J_MAX_POOL_SIZE = int(os.environ.get('NEO4J_MAX_POOL_SIZE', '50'))
+NEO4J_ACQUISITION_TIMEOUT = float(os.environ.get('NEO4J_CONNECTION_ACQUISITION_TIMEOUT', '30'))
+NEO4J_LIVENESS_CHECK_TIMEOUT = float(os.environ.get('NEO4J_LIVENESS_CHECK_TIMEOUT', '60'))
+NEO4J_MAX_CONNECTION_LIFETIME = float(os.environ.get('NEO4J_MAX_CONNECTION_LIFETIME', '3600'))
+
+# One driver (and so one connection pool) per server and user for the whole process
+_drivers: Dict[tuple, Any] = {}
+_drivers_lock = threading.Lock()
+
+
+class InstrumentedDriver:
+    """
+    A shared driver that counts its sessions and times transaction starts
+
+    The driver publishes no pool statistics, so they are measured at its
+    public boundary instead: every session() is counted while open, and
+    begin_transaction() - which waits for a pooled connection before sending
+    BEGIN - is timed. Everything else is passed through to the driver.
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.lock = threading.Lock()
+        self.stats = {'open_sessions': 0, 'sessions': 0, 'transactions': 0, 'total_wait': 0.0, 'max_wait': 0.0}
+
+    def __getattr__(self, name):
+        return getattr(self.driver, name)
+
+    def session(self, **config):
+        session = self.driver.session(**config)
+        with self.lock:
+            self.stats['sessions'] += 1
+            self.stats['open_sessions'] += 1
+        return InstrumentedSession(session, self)
+
+    def record_wait(self, waited: float):
+        with self.lock:
+            self.stats['transactions'] += 1
+            self.stats['total_wait'] += waited
+            self.stats['max_wait'] = max(self.stats['max_wait'], waited)
+
+    def record_close(self):
+        with self.lock:
+            self.stats['open_sessions'] -= 1
+
+    def snapshot(self) -> Dict[str, float]:
+        with self.lock:
+            return dict(self.stats)
+
+
+class InstrumentedSession:
+    """Session wrapper reporting its lifetime and transaction starts to an InstrumentedDriver"""
+
+    def __init__(self, session, driver: InstrumentedDriver):
+        self.session = session
+        self._driver = driver
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def begin_transaction(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.session.begin_transaction(*args, **kwargs)
+        finally:
+            self._driver.record_wait(time.perf_counter() - start)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._driver.record_close()
+        self.session.close()
+
+
+def get_driver(uri: Optional[str] = None, user: str = "admin", password: str = "admin123"):
+    """
+    Get the process-wide Neo4j driver for a server, creating it on first use
+
+    Args:
+        uri: Bolt URI (default: NEO4J_URI or bolt://localhost:7687)
+        user: Neo4j user name
+        password: Neo4j password
+
+    Returns:
+        InstrumentedDriver: A shared driver; do not close it, use close_drivers at shutdown
+    """
+    uri = uri or os.environ.get('NEO4J_URI', 'bolt://localhost:7687')
+    key = (uri, user)
+    driver = _drivers.get(key)
+    if driver is None:
+        with _drivers_lock:
+            driver = _drivers.get(key)
+            if driver is None:
+                driver = InstrumentedDriver(GraphDatabase.driver(
+                    uri,
+                    auth=(user, password),
+                    max_connection_pool_size=NEO4J_MAX_POOL_SIZE,
+                    connection_acquisition_timeout=NEO4J_ACQUISITION_TIMEOUT,
+                    liveness_check_timeout=NEO4J_LIVENESS_CHECK_TIMEOUT,
+                    max_connection_lifetime=NEO4J_MAX_CONNECTION_LIFETIME
+                ))
+                _drivers[key] = driver
+    return driver
+
+
+def close_drivers():
+    """Close every shared driver (called once at process exit)"""
+    with _drivers_lock:
+        for driver in _drivers.values():
+            try:
+                driver.close()
+            except Exception as e:
+                print(f"Error closing Neo4j driver: {str(e)}")
+        _drivers.clear()
+
+
+def get_pool_metrics() -> Dict[str, Any]:
+    """
+    Get connection pool usage for every shared driver
+
+    Returns:
+        dict: Per "uri (user)" entry with max_size, open_sessions, sessions,
+        transactions, avg_wait_ms and max_wait_ms (time to start a transaction)
+    """
+    metrics = {}
+    with _drivers_lock:
+        drivers = list(_drivers.items())
+    for key, driver in drivers:
+        stats = driver.snapshot()
+        transactions = stats['transactions']
+        metrics[f"{key[0]} ({key[1]})"] = {
+            'max_size': NEO4J_MAX_POOL_SIZE,
+            'open_sessions': stats['open_sessions'],
+            'sessions': stats['sessions'],
+            'transactions': transactions,
+            'avg_wait_ms': stats['total_wait'] / transactions * 1000 if transactions else 0.0,
+            'max_wait_ms': stats['max_wait'] * 1000
+        }
+    return metrics
@@ -1,8 +1,31 @@
-from neo4j import GraphDatabase
 import pandas as pd
+import hashlib
+import json
 import os
-from typing import Dict, Any
+import time
+from typing import Dict, Any, List, Optional, Set
 import urllib.parse
+from .transaction_store import load_customer_transactions
+from .neo4j_pool import get_driver
+
+# Number of nodes or relationships sent to Neo4j per UNWIND query / transaction
+BULK_BATCH_SIZE = 5000
+
+def _transaction_key(row: pd.Series, seen: Dict[str, int]) -> str:
+    """
+    Get the id a transaction relationship is merged on
+
+    Rows without a transaction_id get an id derived from their contents, so
+    they neither collapse into one relationship nor change between reloads.
+    Identical rows are told apart by their order of appearance.
+    """
+    transaction_id = row.get('transaction_id')
+    if transaction_id is not None and not pd.isna(transaction_id):
+        return str(transaction_id)
+    content = json.dumps({k: v for k, v in row.items() if k != 'transaction_id'}, sort_keys=True, default=str)
+    key = 'DERIVED_' + hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]
+    seen[key] = seen.get(key, 0) + 1
+    return key if seen[key] == 1 else f"{key}_{seen[key]}"
 
 class Neo4jConnection:
     def __init__(self, uri=None, user=None, password=None):
@@ -11,11 +34,12 @@ class Neo4jConnection:
         self.user = "admin"
         self.password = "admin123"
         
-        self.driver = GraphDatabase.driver(self.uri, auth=(self.user, self.password))
+        # Shared process-wide driver, so connections are pooled across requests
+        self.driver = get_driver(self.uri, self.user, self.password)
         
     def close(self):
-        """Close the Neo4j connection"""
-        self.driver.close()
+        """Release this connection; the shared driver stays open for other requests"""
+        self.driver = None
         
     def verify_connectivity(self):
         """Verify Neo4j connection"""
@@ -38,11 +62,8 @@ def load_transaction_data(customer_id: int, csv_path: str) -> Dict[str, Any]:
         dict: Transaction data and statistics
     """
     try:
-        # Read the CSV file
-        df = pd.read_csv(csv_path)
-        
-        # Filter transactions for the specified customer
-        customer_transactions = df[df['customer_account_number'] == customer_id]
+        # Get the customer's transactions from the shared customer index
+        customer_transactions = load_customer_transactions(customer_id, csv_path, key_columns=('customer_account_number',))
         
         # Calculate statistics
         total_transactions = len(customer_transactions)
@@ -65,14 +86,17 @@ def load_transaction_data(customer_id: int, csv_path: str) -> Dict[str, Any]:
         })
         
         # Add transaction nodes and relationships
+        derived_ids = {}
         for _, row in customer_transactions.iterrows():
+            transaction_id = _transaction_key(row, derived_ids)
+            
             # Determine if this is an incoming or outgoing transaction
             is_outgoing = row['transaction_amount'] < 0
             
             # Get or generate counterparty account
             other_party = row.get('counterparty_account_number', None)
             if pd.isna(other_party) or other_party is None:
-                other_party = f"ACC_{row['transaction_id']}"
+                other_party = f"ACC_{transaction_id}"
             
             # Add counterparty node
             nodes.append({
@@ -90,6 +114,7 @@ def load_transaction_data(customer_id: int, csv_path: str) -> Dict[str, Any]:
                 'end_node': str(other_party) if is_outgoing else str(customer_id),
                 'type': 'TRANSACTION',
                 'properties': {
+                    'transaction_id': transaction_id,
                     'amount': float(row['transaction_amount']),
                     'currency': row['transaction_currency'],
                     'method': row['method_of_transaction'],
@@ -114,52 +139,193 @@ def load_transaction_data(customer_id: int, csv_path: str) -> Dict[str, Any]:
         print(f"Error loading transaction data: {str(e)}")
         return {'error': str(e)}
 
-def create_transaction_graph(neo4j_conn: Neo4jConnection, data: Dict[str, Any]) -> bool:
+def _run_in_batches(session, query: str, rows: List[Dict[str, Any]], batch_size: int) -> int:
     """
-    Create transaction graph in Neo4j
+    Send rows to an UNWIND query in batches, one explicit transaction per batch
+    
+    Args:
+        session: Open Neo4j session
+        query: Cypher query reading its input from the $rows parameter
+        rows: Parameter maps to send
+        batch_size: Number of rows per transaction
+    
+    Returns:
+        int: Number of rows sent
+    """
+    for start in range(0, len(rows), batch_size):
+        tx = session.begin_transaction()
+        try:
+            tx.run(query, rows=rows[start:start + batch_size]).consume()
+            tx.commit()
+        except Exception:
+            tx.rollback()
+            raise
+    return len(rows)
+
+def bulk_load_transaction_graph(neo4j_conn: Neo4jConnection, data: Dict[str, Any],
+                                batch_size: int = BULK_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Load nodes and relationships into Neo4j with batched UNWIND + labeled MERGE
+    
+    Nodes are merged on (label, account_number), which uses the uniqueness
+    constraints created by neo4j_init.initialize_neo4j. Relationships match
+    both endpoints by label and are merged on transaction_id, so reloading
+    the same data is idempotent.
+    
+    Args:
+        neo4j_conn: Neo4j connection instance
+        data: Dictionary containing nodes and relationships (see load_transaction_data)
+        batch_size: Number of rows per UNWIND query / transaction
+    
+    Returns:
+        dict: Counts of loaded nodes and relationships, elapsed seconds and rows/sec
+    """
+    start_time = time.perf_counter()
+    
+    # Group nodes by label, de-duplicating repeated counterparties
+    nodes_by_label = {}
+    node_labels = {}
+    for node in data['nodes']:
+        label = node['labels'][0]
+        account_number = node['properties']['account_number']
+        previous = node_labels.get(account_number)
+        if previous == 'Customer':
+            continue
+        if previous is not None and previous != label:
+            # The customer's own node takes precedence over a counterparty entry
+            del nodes_by_label[previous][account_number]
+        node_labels[account_number] = label
+        nodes_by_label.setdefault(label, {})[account_number] = node['properties']
+    
+    # Group relationships by the labels of their endpoints
+    rels_by_labels = {}
+    for position, rel in enumerate(data['relationships']):
+        properties = dict(rel['properties'])
+        transaction_id = properties.pop('transaction_id', None) or f"{rel['start_node']}-{rel['end_node']}-{position}"
+        key = (node_labels.get(rel['start_node'], 'Account'), node_labels.get(rel['end_node'], 'Account'))
+        rels_by_labels.setdefault(key, []).append({
+            'start_node': rel['start_node'],
+            'end_node': rel['end_node'],
+            'transaction_id': str(transaction_id),
+            'properties': properties
+        })
+    
+    node_count = 0
+    relationship_count = 0
+    with neo4j_conn.driver.session() as session:
+        for label, nodes in nodes_by_label.items():
+            if not label.isidentifier():
+                raise ValueError(f"Invalid node label: {label}")
+            query = f"""
+            UNWIND $rows AS row
+            MERGE (n:{label} {{account_number: row.account_number}})
+            SET n += row
+            """
+            node_count += _run_in_batches(session, query, list(nodes.values()), batch_size)
+        
+        for (start_label, end_label), rels in rels_by_labels.items():
+            if not (start_label.isidentifier() and end_label.isidentifier()):
+                raise ValueError(f"Invalid node labels: {start_label}, {end_label}")
+            query = f"""
+            UNWIND $rows AS row
+            MATCH (a:{start_label} {{account_number: row.start_node}})
+            MATCH (b:{end_label} {{account_number: row.end_node}})
+            MERGE (a)-[r:TRANSACTION {{transaction_id: row.transaction_id}}]->(b)
+            SET r += row.properties
+            """
+            relationship_count += _run_in_batches(session, query, rels, batch_size)
+    
+    elapsed = time.perf_counter() - start_time
+    rows_per_sec = (node_count + relationship_count) / elapsed if elapsed > 0 else 0
+    print(f"Loaded {node_count} nodes and {relationship_count} relationships in {elapsed:.2f}s ({rows_per_sec:.0f} rows/sec)")
+    return {
+        'nodes': node_count,
+        'relationships': relationship_count,
+        'seconds': elapsed,
+        'rows_per_sec': rows_per_sec
+    }
+
+def _customer_account_number(data: Dict[str, Any]) -> Optional[str]:
+    """Get the account number of the Customer node in graph data"""
+    for node in data['nodes']:
+        if 'Customer' in node['labels']:
+            return node['properties']['account_number']
+    return None
+
+def _fetch_synced_transaction_ids(session, customer_id: str) -> Set[str]:
+    """Get the transaction_ids already stored in Neo4j for a customer"""
+    result = session.run(
+        """
+        MATCH (:Customer {account_number: $customer_id})-[t:TRANSACTION]-()
+        RETURN collect(t.transaction_id) AS transaction_ids
+        """,
+        customer_id=customer_id
+    ).single()
+    return {str(t) for t in result['transaction_ids'] if t is not None} if result else set()
+
+def _delete_customer_subgraph(session, customer_id: str):
+    """Delete a customer's transactions and any counterparties left without relationships"""
+    session.run(
+        """
+        MATCH (:Customer {account_number: $customer_id})-[t:TRANSACTION]-(a:Account)
+        DELETE t
+        WITH DISTINCT a
+        WHERE NOT (a)--()
+        DELETE a
+        """,
+        customer_id=customer_id
+    ).consume()
+
+def create_transaction_graph(neo4j_conn: Neo4jConnection, data: Dict[str, Any], incremental: bool = True) -> bool:
+    """
+    Create or update one customer's transaction graph in Neo4j
+    
+    Only the customer's own subgraph is touched; other customers' data is
+    left alone. In incremental mode the transaction_ids already stored for
+    the customer are read back from Neo4j and only the missing transactions
+    are pushed, so the delta stays correct when other processes or workers
+    write to the graph. Otherwise the customer's existing transactions are
+    replaced.
     
     Args:
         neo4j_conn: Neo4j connection instance
         data: Dictionary containing nodes and relationships
+        incremental: Upsert only new transactions instead of replacing the subgraph
     
     Returns:
         bool: True if successful, False otherwise
     """
     try:
+        customer_id = _customer_account_number(data)
+        if customer_id is None:
+            raise ValueError("Graph data has no Customer node")
+        
+        if not incremental:
+            with neo4j_conn.driver.session() as session:
+                _delete_customer_subgraph(session, customer_id)
+            bulk_load_transaction_graph(neo4j_conn, data)
+            return True
+        
         with neo4j_conn.driver.session() as session:
-            # Clear existing data for this customer
-            session.run("MATCH (n) DETACH DELETE n")
-            
-            # Create nodes
-            for node in data['nodes']:
-                labels = ':'.join(node['labels'])
-                properties = ', '.join([f"{k}: ${k}" for k in node['properties'].keys()])
-                query = f"CREATE (n:{labels} {{ {properties} }})"
-                session.run(query, node['properties'])
-            
-            # Create relationships
-            for rel in data['relationships']:
-                query = """
-                MATCH (a {account_number: $start_node})
-                MATCH (b {account_number: $end_node})
-                CREATE (a)-[r:TRANSACTION {
-                    amount: $amount,
-                    currency: $currency,
-                    method: $method,
-                    location: $location,
-                    is_fraud: $is_fraud,
-                    timestamp: $timestamp
-                }]->(b)
-                """
-                # Create parameters dictionary with all required values
-                params = {
-                    'start_node': rel['start_node'],
-                    'end_node': rel['end_node'],
-                    **rel['properties']
-                }
-                session.run(query, params)
-            
+            synced = _fetch_synced_transaction_ids(session, customer_id)
+        
+        new_relationships = [
+            rel for rel in data['relationships']
+            if rel['properties'].get('transaction_id') is None
+            or str(rel['properties']['transaction_id']) not in synced
+        ]
+        if not new_relationships and synced:
+            # Nothing new since the last sync
             return True
+        
+        # Push the customer node plus only the counterparties of new transactions
+        endpoints = {rel['start_node'] for rel in new_relationships} | {rel['end_node'] for rel in new_relationships}
+        new_nodes = [
+            node for node in data['nodes']
+            if 'Customer' in node['labels'] or node['properties']['account_number'] in endpoints
+        ]
+        bulk_load_transaction_graph(neo4j_conn, {'nodes': new_nodes, 'relationships': new_relationships})
+        return True
     
     except Exception as e:
         print(f"Error creating transaction graph: {str(e)}")
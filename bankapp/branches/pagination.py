@@ -0,0 +1,160 @@
+import base64
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .transaction_store import parse_timestamps
+
+# Rows per chunk served by the JSON endpoints, and the largest chunk a client may ask for
+DEFAULT_CHUNK_SIZE = 500
+MAX_CHUNK_SIZE = 2000
+
+# Sort key of rows with a missing timestamp, so they come after every dated row
+_MISSING_TIME = np.iinfo(np.int64).max
+
+
+def records(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Convert rows to dicts with missing values as None, so they serialize to valid JSON"""
+    return frame.astype(object).where(frame.notna(), None).to_dict('records')
+
+
+class RecordWindow:
+    """
+    Sequence view of a DataFrame for Django's Paginator
+
+    Paginator only needs len() and slicing, so wrapping the frame means a
+    page turns just its own rows into dicts, and page N costs the same as
+    page 1 instead of converting the whole frame up front.
+    """
+
+    def __init__(self, frame: pd.DataFrame):
+        self.frame = frame
+
+    def __len__(self):
+        return len(self.frame)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.frame.iloc[key].to_dict('records')
+        return self.frame.iloc[key].to_dict()
+
+
+def encode_cursor(state: Dict[str, Any]) -> str:
+    """Encode pagination state as an opaque URL-safe cursor"""
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Decode a cursor from encode_cursor, or None if it is missing, malformed or out of range"""
+    if not cursor:
+        return None
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(state, dict):
+        return None
+    skip = state.get('skip', 0)
+    if isinstance(skip, bool) or not isinstance(skip, int) or skip < 0:
+        return None
+    after = state.get('after')
+    if isinstance(after, bool) or not isinstance(after, (str, int, float, type(None))):
+        return None
+    return state
+
+
+def _sort_keys(frame: pd.DataFrame, key: str) -> Tuple[str, np.ndarray]:
+    """
+    Get a key column as sortable values
+
+    Timestamps sort chronologically (as nanoseconds, day-first formats
+    included), all-numeric columns such as transaction_id numerically, and
+    anything else as text. Missing values sort last.
+
+    Returns:
+        tuple: (kind: 'time', 'number' or 'text'; key values in row order)
+    """
+    column = frame[key]
+    if key == 'timestamp' or pd.api.types.is_datetime64_any_dtype(column):
+        parsed = column if pd.api.types.is_datetime64_any_dtype(column) else \
+            parse_timestamps(column.astype(object).where(column.notna(), None))
+        values = parsed.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+        return 'time', np.where(parsed.isna().to_numpy(), _MISSING_TIME, values)
+
+    numbers = pd.to_numeric(column, errors='coerce')
+    if column.notna().any() and numbers.notna().sum() == column.notna().sum():
+        return 'number', numbers.fillna(np.inf).to_numpy(dtype=float)
+
+    return 'text', column.fillna('').astype(str).to_numpy(dtype=object)
+
+
+def _cursor_value(kind: str, value) -> Any:
+    """Encode a sort key as a JSON value (None for a missing key)"""
+    if kind == 'time':
+        return None if value == _MISSING_TIME else pd.Timestamp(int(value)).isoformat()
+    if kind == 'number':
+        if np.isinf(value):
+            return None
+        return int(value) if float(value).is_integer() else float(value)
+    return str(value)
+
+
+def _key_value(kind: str, value) -> Any:
+    """Decode a cursor's JSON value back into a sort key; raises ValueError or TypeError if it does not fit"""
+    if kind == 'time':
+        return _MISSING_TIME if value is None else pd.Timestamp(value).value
+    if kind == 'number':
+        return np.inf if value is None else float(value)
+    return '' if value is None else str(value)
+
+
+def keyset_page(frame: pd.DataFrame, key: str = 'transaction_id', cursor: Optional[str] = None,
+                limit: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Get the chunk of rows following a cursor, ordered by a key column
+
+    The cursor records the last key served rather than an offset, so the
+    next chunk is found by binary search and rows appended in between do not
+    shift or repeat what the client has already seen.
+
+    Args:
+        frame: Rows to paginate
+        key: Column to order and resume by (e.g. transaction_id or timestamp)
+        cursor: Cursor from a previous call, or None for the first chunk
+        limit: Maximum rows to return (capped at MAX_CHUNK_SIZE)
+
+    Returns:
+        dict: rows (list of dicts), next_cursor (None on the last chunk) and total
+    """
+    limit = max(1, min(int(limit), MAX_CHUNK_SIZE))
+    kind, keys = _sort_keys(frame, key)
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+
+    # Rows sharing the last key are resumed by how many of them were already served.
+    # A cursor that does not fit this key or column restarts from the first chunk.
+    start = 0
+    state = decode_cursor(cursor)
+    if state and state.get('key') == key and state.get('kind') == kind and 'after' in state:
+        try:
+            after = _key_value(kind, state['after'])
+        except (ValueError, TypeError, OverflowError):
+            after = None
+        if after is not None:
+            first = int(np.searchsorted(sorted_keys, after, side='left'))
+            start = min(first + state.get('skip', 0), len(order))
+
+    end = min(start + limit, len(order))
+    next_cursor = None
+    if end < len(order):
+        last = sorted_keys[end - 1]
+        skip = end - int(np.searchsorted(sorted_keys, last, side='left'))
+        next_cursor = encode_cursor({'key': key, 'kind': kind, 'after': _cursor_value(kind, last), 'skip': skip})
+
+    return {
+        'rows': records(frame.take(order[start:end])),
+        'next_cursor': next_cursor,
+        'total': len(order)
+    }
@@ -0,0 +1,169 @@
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from .risk_profiling.utils.state_paths import state_path
+
+TRANSACTIONS = 'TRANSACTIONS'
+NO_TRANSACTIONS = 'NO_TRANSACTIONS'
+
+# Phrases indicating the user wants their own transaction data analysed. Single words
+# also match their plural and inflected forms ('transfers', 'analyzed', 'spending')
+TRANSACTION_KEYWORDS = (
+    'transaction', 'spend', 'spent', 'expense', 'expenditure', 'purchase', 'bought', 'shopping',
+    'bill', 'cost', 'payment', 'deposit', 'withdraw', 'withdrawal', 'transfer', 'income', 'balance',
+    'received', 'paid', 'money flow', 'account activity', 'recent activity', 'show me', 'analyze',
+    'analysis', 'chart', 'graph', 'plot', 'visualization', 'report', 'summary', 'statistics',
+    'trend', 'pattern', 'compare', 'filter', 'categorize', 'group', 'total',
+    'how much did i', 'my account', 'last month', 'this month', 'merchant', 'largest', 'highest'
+)
+
+# Phrases typical of general banking, fraud or security questions
+GENERAL_KEYWORDS = (
+    'what is', 'what are', 'how does', 'how do i', 'how can i', 'explain', 'define', 'meaning of',
+    'tips', 'advice', 'protect', 'prevent', 'safe', 'secure', 'security', 'password', 'otp', 'pin',
+    'phishing', 'scam', 'fraud', 'hacked', 'stolen', 'report a', 'kyc', 'interest rate', 'loan',
+    'credit score', 'open an account', 'close my account', 'branch', 'customer care', 'hello', 'hi',
+    'thanks', 'thank you', 'who are you', 'help'
+)
+
+# Queries classified by the LLM, replayed into the cache on start-up so a restart does not pay
+# for them again. They are raw customer text, so the log is kept outside the source tree; set
+# CHAT_QUERY_LOG empty to disable it
+QUERY_LOG = os.environ.get('CHAT_QUERY_LOG', state_path('chat_queries', 'labels.jsonl')) or None
+CACHE_SIZE = int(os.environ.get('CHAT_CLASSIFICATION_CACHE_SIZE', '4096'))
+# Local labels at or below this confidence are treated as ambiguous and sent to the LLM
+MIN_CONFIDENCE = float(os.environ.get('CHAT_CLASSIFIER_MIN_CONFIDENCE', '0.5'))
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase a query and collapse punctuation and whitespace, so rephrasings share a cache key"""
+    return ' '.join(re.sub(r"[^\w\s']", ' ', query.lower()).split())
+
+
+def _keyword_patterns(keywords) -> Tuple[re.Pattern, ...]:
+    """Compile whole-word patterns for keywords, letting single words take inflection suffixes"""
+    return tuple(
+        re.compile(r'\b' + re.escape(keyword) + (r'(?:s|es|ed|d|ing|al|als)?' if ' ' not in keyword else '') + r'\b')
+        for keyword in keywords
+    )
+
+
+_TRANSACTION_PATTERNS = _keyword_patterns(TRANSACTION_KEYWORDS)
+_GENERAL_PATTERNS = _keyword_patterns(GENERAL_KEYWORDS)
+
+
+def _keyword_hits(text: str, patterns) -> int:
+    """Count the keywords found in normalized query text"""
+    return sum(1 for pattern in patterns if pattern.search(text))
+
+
+def classify_locally(query: str) -> Tuple[Optional[str], float]:
+    """
+    Classify a query with keyword evidence alone
+
+    Both keyword sets are matched the same way, and the label is the side
+    with more hits. Confidence is that side's share of all hits, so mixed
+    wording ("how do I report a fraudulent transaction") lowers it, and a
+    tie is ambiguous. A single keyword is weak evidence, so its confidence
+    is capped at MIN_CONFIDENCE and the query goes to the cache or the LLM.
+
+    Returns:
+        tuple: (label or None if ambiguous, confidence between 0 and 1)
+    """
+    text = normalize_query(query)
+    transaction_hits = _keyword_hits(text, _TRANSACTION_PATTERNS)
+    general_hits = _keyword_hits(text, _GENERAL_PATTERNS)
+    total = transaction_hits + general_hits
+    if transaction_hits == general_hits:
+        return None, 0.5 if total else 0.0
+    label = TRANSACTIONS if transaction_hits > general_hits else NO_TRANSACTIONS
+    confidence = max(transaction_hits, general_hits) / total
+    if total == 1:
+        confidence = min(confidence, MIN_CONFIDENCE)
+    return label, confidence
+
+
+class QueryClassificationCache:
+    """
+    LRU cache of query labels, keyed by normalized query text
+
+    Labels from the LLM are appended to a JSON lines query log, which is
+    replayed into the cache on start-up.
+    """
+
+    def __init__(self, maxsize: int = CACHE_SIZE, log_path: Optional[str] = QUERY_LOG):
+        self.maxsize = maxsize
+        self.log_path = log_path
+        self.lock = threading.Lock()
+        self.labels: "OrderedDict[str, str]" = OrderedDict()
+        self.stats = {'local': 0, 'cached': 0, 'llm': 0}
+        self._load()
+
+    def _load(self):
+        if not self.log_path or not os.path.exists(self.log_path):
+            return
+        try:
+            with open(self.log_path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get('label') in (TRANSACTIONS, NO_TRANSACTIONS):
+                        self._store(normalize_query(entry.get('query', '')), entry['label'])
+        except OSError as e:
+            print(f"Error loading classified queries: {e}")
+
+    def _store(self, key: str, label: str):
+        self.labels[key] = label
+        self.labels.move_to_end(key)
+        while len(self.labels) > self.maxsize:
+            self.labels.popitem(last=False)
+
+    def get(self, query: str) -> Optional[str]:
+        key = normalize_query(query)
+        with self.lock:
+            label = self.labels.get(key)
+            if label is not None:
+                self.labels.move_to_end(key)
+            return label
+
+    def put(self, query: str, label: str):
+        """Cache a label from the LLM and append it to the query log"""
+        with self.lock:
+            self._store(normalize_query(query), label)
+            if not self.log_path:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+                with open(self.log_path, 'a') as f:
+                    f.write(json.dumps({'query': query, 'label': label}) + '\n')
+            except OSError as e:
+                print(f"Error logging classified query: {e}")
+
+    def record(self, source: str):
+        """Count a classification answered locally, from the cache or by the LLM"""
+        with self.lock:
+            self.stats[source] += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self.lock:
+            return {**self.stats, 'cached_queries': len(self.labels)}
+
+
+_cache: Optional[QueryClassificationCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_classification_cache() -> QueryClassificationCache:
+    """Get the process-wide query classification cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = QueryClassificationCache()
+    return _cache
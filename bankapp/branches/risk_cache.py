@@ -0,0 +1,246 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+try:
+    from .risk_profiling.utils.state_paths import state_path
+except ImportError:
+    # Imported by the scripts from the branches directory
+    from risk_profiling.utils.state_paths import state_path
+
+# Risk explanations describe customers' transactions, so the cache lives outside the source tree
+RISK_CACHE_DB = os.environ.get('RISK_CACHE_DB') or state_path('risk_cache', 'assessments.sqlite3')
+
+# Entries older than the TTL are dropped, and the least recently used beyond the size limit
+RISK_CACHE_TTL = float(os.environ.get('RISK_CACHE_TTL_SECONDS', str(7 * 24 * 3600)))
+RISK_CACHE_MAX_ENTRIES = int(os.environ.get('RISK_CACHE_MAX_ENTRIES', '200000'))
+# Expired entries are swept at most this often; get_many ignores them in between
+RISK_CACHE_SWEEP_INTERVAL = float(os.environ.get('RISK_CACHE_SWEEP_SECONDS', '3600'))
+
+# Fields written by the risk assessment itself, never part of a row's fingerprint
+RISK_FIELDS = ('risk_score', 'risk_category', 'risk_explanation', 'risk_fallback')
+
+# SQLite limits the number of bound parameters per statement
+_QUERY_CHUNK = 500
+
+
+def fingerprint(transaction: Dict[str, Any], rules: str) -> str:
+    """
+    Hash a transaction's contents together with the rule set used to assess it
+
+    Args:
+        transaction: Transaction row
+        rules: Rule text given to the risk model
+
+    Returns:
+        str: Hex sha256 digest; changes if any field or rule changes
+    """
+    row = {k: v for k, v in transaction.items() if k not in RISK_FIELDS}
+    payload = json.dumps(row, sort_keys=True, default=str) + '\n' + rules
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class RiskAssessmentCache:
+    """
+    SQLite cache of per-transaction risk assessments
+
+    Entries are keyed by transaction_id and the fingerprint of the row and
+    rule set, so an edited row or changed rule is a miss rather than a stale
+    hit, and inserting rows elsewhere in the file does not affect any entry.
+    Triggers keep running totals over the cached scores, so dashboard
+    aggregates are a single-row read however many transactions are scored.
+    """
+
+    def __init__(self, path: str = RISK_CACHE_DB, ttl: float = RISK_CACHE_TTL,
+                 max_entries: int = RISK_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._next_sweep = 0.0
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS risk_assessments (
+                    transaction_id TEXT NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    risk_score NUMERIC,
+                    risk_category TEXT,
+                    risk_explanation TEXT,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (transaction_id, fingerprint)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_risk_last_used ON risk_assessments (last_used)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_risk_created_at ON risk_assessments (created_at)")
+        # Readable by the app's user only
+        os.chmod(path, 0o600)
+        self._create_totals()
+
+    def _create_totals(self):
+        """Create the running totals table, backfilled once from any existing entries"""
+        self._connect().executescript("""
+            BEGIN IMMEDIATE;
+            CREATE TABLE IF NOT EXISTS risk_totals (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                scored INTEGER NOT NULL,
+                risk_sum REAL NOT NULL,
+                high_risk INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO risk_totals
+                SELECT 1, COUNT(*), COALESCE(SUM(risk_score), 0), COALESCE(SUM(risk_score >= 70), 0)
+                FROM risk_assessments;
+            CREATE TRIGGER IF NOT EXISTS risk_totals_insert AFTER INSERT ON risk_assessments BEGIN
+                UPDATE risk_totals SET scored = scored + 1,
+                                       risk_sum = risk_sum + COALESCE(NEW.risk_score, 0),
+                                       high_risk = high_risk + (NEW.risk_score >= 70)
+                WHERE id = 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS risk_totals_delete AFTER DELETE ON risk_assessments BEGIN
+                UPDATE risk_totals SET scored = scored - 1,
+                                       risk_sum = risk_sum - COALESCE(OLD.risk_score, 0),
+                                       high_risk = high_risk - (OLD.risk_score >= 70)
+                WHERE id = 1;
+            END;
+            COMMIT;
+        """)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get this thread's connection (SQLite connections are not shared across threads)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            # WAL lets several web workers read while one writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, fingerprints: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Look up cached assessments
+
+        Args:
+            fingerprints: transaction_id -> fingerprint of the current row
+
+        Returns:
+            dict: transaction_id -> {risk_score, risk_category, risk_explanation}
+            for every unexpired hit
+        """
+        hits = {}
+        if not fingerprints:
+            return hits
+        now = time.time()
+        conn = self._connect()
+        items = list(fingerprints.items())
+        for i in range(0, len(items), _QUERY_CHUNK):
+            chunk = items[i:i + _QUERY_CHUNK]
+            rows = conn.execute(
+                "SELECT transaction_id, fingerprint, risk_score, risk_category, risk_explanation "
+                "FROM risk_assessments WHERE created_at >= ? AND fingerprint IN ({})".format(
+                    ','.join('?' * len(chunk))),
+                [now - self.ttl] + [fp for _, fp in chunk]
+            ).fetchall()
+            for transaction_id, fp, score, category, explanation in rows:
+                if fingerprints.get(transaction_id) == fp:
+                    hits[transaction_id] = {
+                        'risk_score': score,
+                        'risk_category': category,
+                        'risk_explanation': explanation
+                    }
+        if hits:
+            with conn:
+                conn.executemany(
+                    "UPDATE risk_assessments SET last_used = ? WHERE transaction_id = ? AND fingerprint = ?",
+                    [(now, transaction_id, fingerprints[transaction_id]) for transaction_id in hits]
+                )
+        return hits
+
+    def put_many(self, fingerprints: Dict[str, str], transactions: Iterable[Dict[str, Any]]) -> int:
+        """
+        Store assessed transactions; fallback (unassessed) results are skipped
+
+        Args:
+            fingerprints: transaction_id -> fingerprint computed before assessment
+            transactions: Transactions carrying risk_score, risk_category and risk_explanation
+
+        Returns:
+            int: Number of entries written
+        """
+        now = time.time()
+        rows = []
+        for transaction in transactions:
+            transaction_id = str(transaction.get('transaction_id', ''))
+            if transaction.get('risk_fallback') or transaction.get('risk_score') is None:
+                continue
+            if transaction_id not in fingerprints:
+                continue
+            rows.append((transaction_id, fingerprints[transaction_id], transaction['risk_score'],
+                         transaction.get('risk_category'), transaction.get('risk_explanation'), now, now))
+        if rows:
+            conn = self._connect()
+            with conn:
+                # Keep one version per transaction; explicit deletes (unlike REPLACE) fire the totals trigger
+                conn.executemany("DELETE FROM risk_assessments WHERE transaction_id = ?", [(r[0],) for r in rows])
+                conn.executemany("INSERT INTO risk_assessments VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            # The totals row already holds the entry count, so checking the size limit costs no scan
+            if now >= self._next_sweep or self.totals()['scored'] > self.max_entries:
+                self.evict()
+        return len(rows)
+
+    def invalidate(self, transaction_ids: Iterable[str]):
+        """Drop every cached version of the given transactions"""
+        ids = [(str(transaction_id),) for transaction_id in transaction_ids]
+        conn = self._connect()
+        with conn:
+            conn.executemany("DELETE FROM risk_assessments WHERE transaction_id = ?", ids)
+
+    def totals(self) -> Dict[str, float]:
+        """
+        Get running totals over the cached assessments
+
+        Returns:
+            dict: scored (count), risk_sum and high_risk (scores >= 70)
+        """
+        scored, risk_sum, high_risk = self._connect().execute(
+            "SELECT scored, risk_sum, high_risk FROM risk_totals WHERE id = 1"
+        ).fetchone()
+        return {'scored': scored, 'risk_sum': risk_sum, 'high_risk': high_risk}
+
+    def evict(self):
+        """Remove expired entries and trim the cache to max_entries, least recently used first"""
+        now = time.time()
+        self._next_sweep = now + RISK_CACHE_SWEEP_INTERVAL
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM risk_assessments WHERE created_at < ?", (now - self.ttl,))
+            count = conn.execute("SELECT scored FROM risk_totals WHERE id = 1").fetchone()[0]
+            if count > self.max_entries:
+                conn.execute(
+                    "DELETE FROM risk_assessments WHERE rowid IN "
+                    "(SELECT rowid FROM risk_assessments ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+
+
+_cache: Optional[RiskAssessmentCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_risk_cache() -> RiskAssessmentCache:
+    """Get the process-wide risk assessment cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = RiskAssessmentCache()
+    return _cache
+
+
+def transaction_fingerprints(transactions: List[Dict[str, Any]], rules: str) -> Dict[str, str]:
+    """Fingerprint a list of transactions, keyed by transaction_id"""
+    return {str(t.get('transaction_id', '')): fingerprint(t, rules) for t in transactions}
@@ -0,0 +1,142 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+# Transactions per Gemini request, parallel requests, and the request rate the API key allows
+RISK_CHUNK_SIZE = int(os.environ.get('RISK_CHUNK_SIZE', '10'))
+RISK_MAX_WORKERS = int(os.environ.get('RISK_MAX_WORKERS', '4'))
+RISK_REQUESTS_PER_MINUTE = float(os.environ.get('RISK_REQUESTS_PER_MINUTE', '60'))
+RISK_MAX_RETRIES = int(os.environ.get('RISK_MAX_RETRIES', '5'))
+RISK_BACKOFF_BASE = 2.0
+RISK_BACKOFF_MAX = 60.0
+
+# Neutral assessment given when the model returned nothing usable for a transaction
+FALLBACK_RISK_SCORE = 50
+FALLBACK_RISK_CATEGORY = "Medium"
+
+
+class RateLimiter:
+    """Token bucket shared by all worker threads"""
+
+    def __init__(self, per_minute: float, burst: Optional[int] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or max(1, int(self.rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    """Check whether an API error is a 429 / quota exhaustion"""
+    code = getattr(error, 'code', None) or getattr(error, 'status_code', None)
+    message = str(error)
+    return code == 429 or '429' in message or 'RESOURCE_EXHAUSTED' in message
+
+
+def apply_fallback(transactions: List[Dict[str, Any]], explanation: str):
+    """Give transactions the neutral fallback assessment, marked risk_fallback so it is never cached"""
+    for transaction in transactions:
+        transaction['risk_score'] = FALLBACK_RISK_SCORE
+        transaction['risk_category'] = FALLBACK_RISK_CATEGORY
+        transaction['risk_explanation'] = explanation
+        transaction['risk_fallback'] = True
+
+
+def apply_assessments(transactions: List[Dict[str, Any]], risk_mapping: Dict[str, Dict[str, Any]]):
+    """Copy assessments onto their transactions, marking any the model skipped as fallbacks"""
+    skipped = []
+    for transaction in transactions:
+        assessment = risk_mapping.get(str(transaction.get('transaction_id', '')))
+        if assessment:
+            transaction['risk_score'] = assessment.get('risk_score', 0)
+            transaction['risk_category'] = assessment.get('risk_category', 'Low')
+            transaction['risk_explanation'] = assessment.get('risk_explanation', '')
+        else:
+            skipped.append(transaction)
+    apply_fallback(skipped, "Risk assessment not available for this transaction.")
+
+
+def _assess_chunk(agent, chunk, limiter: RateLimiter, max_retries: int):
+    """Assess one chunk, retrying rate-limited requests with exponential backoff and jitter"""
+    for attempt in range(max_retries + 1):
+        limiter.acquire()
+        try:
+            return agent.request_risk_assessments(chunk)
+        except Exception as e:
+            if not _is_rate_limited(e) or attempt == max_retries:
+                raise
+            delay = min(RISK_BACKOFF_MAX, RISK_BACKOFF_BASE ** attempt) * (0.5 + random.random())
+            print(f"Rate limited by Gemini, retrying chunk in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+            time.sleep(delay)
+
+
+def assess_transactions(transactions: List[Dict[str, Any]], agent, cache=None,
+                        fingerprints: Optional[Dict[str, str]] = None,
+                        chunk_size: int = RISK_CHUNK_SIZE, max_workers: int = RISK_MAX_WORKERS,
+                        requests_per_minute: float = RISK_REQUESTS_PER_MINUTE,
+                        max_retries: int = RISK_MAX_RETRIES) -> Dict[str, Any]:
+    """
+    Assess transactions in parallel chunks under a shared rate limit
+
+    Transactions are updated in place with risk_score, risk_category and
+    risk_explanation. Each chunk is written to the cache as soon as it
+    completes, so an interrupted run keeps everything scored so far.
+    Chunks that still fail after retries get fallback scores (marked
+    risk_fallback) which are never cached.
+
+    Args:
+        transactions: Transactions to assess
+        agent: GeminiRiskAssessmentAgent (anything with request_risk_assessments)
+        cache: RiskAssessmentCache to persist results to (optional)
+        fingerprints: transaction_id -> fingerprint, required when cache is given
+        chunk_size: Transactions per Gemini request
+        max_workers: Maximum concurrent requests
+        requests_per_minute: Request rate limit across all workers
+        max_retries: Retries per chunk after a 429
+
+    Returns:
+        dict: assessed, failed and cached transaction counts, chunks and seconds
+    """
+    start_time = time.perf_counter()
+    chunks = [transactions[i:i + chunk_size] for i in range(0, len(transactions), chunk_size)]
+    limiter = RateLimiter(requests_per_minute, burst=max_workers)
+    summary = {'assessed': 0, 'failed': 0, 'cached': 0, 'chunks': len(chunks), 'seconds': 0.0}
+    if not chunks:
+        return summary
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as executor:
+        futures = {executor.submit(_assess_chunk, agent, chunk, limiter, max_retries): chunk for chunk in chunks}
+        for future in as_completed(futures):
+            chunk = futures[future]
+            try:
+                apply_assessments(chunk, future.result())
+                summary['assessed'] += len(chunk)
+            except Exception as e:
+                print(f"Error assessing transaction chunk: {e}")
+                apply_fallback(chunk, f"Unable to generate risk assessment due to an error: {str(e)[:100]}")
+                summary['failed'] += len(chunk)
+                continue
+            if cache is not None:
+                try:
+                    summary['cached'] += cache.put_many(fingerprints, chunk)
+                except Exception as e:
+                    print(f"Error caching risk assessments: {e}")
+
+    summary['seconds'] = time.perf_counter() - start_time
+    return summary
@@ -1,50 +1,81 @@
 import os
 import base64
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from mistralai import Mistral, ImageURLChunk, TextChunk
+from mistralai import ImageURLChunk, TextChunk
 from dotenv import load_dotenv
 
+try:
+    from ..utils.llm_clients import get_mistral_client
+    from ..utils.kyc_cache import EXTRACTION, OCR, ONBOARDING, document_digest, get_kyc_cache
+except ImportError:
+    from utils.llm_clients import get_mistral_client
+    from utils.kyc_cache import EXTRACTION, OCR, ONBOARDING, document_digest, get_kyc_cache
+
 # Load environment variables
 load_dotenv()
 
+# Models used per processing stage; part of the cache key, so changing one re-processes documents
+OCR_MODEL = "mistral-ocr-latest"
+EXTRACTION_MODEL = "pixtral-12b-latest"
+ONBOARDING_MODEL = "mistral-large-latest"
+
+KYC_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "kycdata")
+DOCUMENT_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.pdf')
+# Documents of one customer processed at once, and customers profiled at once in batch mode
+KYC_DOCUMENT_WORKERS = int(os.getenv("KYC_DOCUMENT_WORKERS", "4"))
+KYC_BATCH_WORKERS = int(os.getenv("KYC_BATCH_WORKERS", "4"))
+
 class KYCAgent:
     def __init__(self):
         self.api_key = os.getenv("MISTRAL_API_KEY")
-        self.client = Mistral(api_key=self.api_key)
+        self.client = get_mistral_client(self.api_key)
+        self.cache = get_kyc_cache()
         
     def process_document(self, image_path):
-        """Process a KYC document using Mistral OCR"""
+        """Process a KYC document using Mistral OCR, reusing earlier results for an unchanged file"""
         # Validate input file
         image_file = Path(image_path)
         if not image_file.is_file():
             raise FileNotFoundError(f"The provided image path does not exist: {image_path}")
 
+        image_bytes = image_file.read_bytes()
+        digest = document_digest(image_bytes)
+        cached = self.cache.get(digest, EXTRACTION_MODEL, EXTRACTION)
+        if cached is not None:
+            print(f"Using cached extraction for document: {image_path}")
+            return cached
+
         # Read and encode the image file
-        encoded_image = base64.b64encode(image_file.read_bytes()).decode()
+        encoded_image = base64.b64encode(image_bytes).decode()
         base64_data_url = f"data:image/jpeg;base64,{encoded_image}"
 
-        # Process the image using OCR
-        print(f"\nProcessing document: {image_path}")
-        image_response = self.client.ocr.process(
-            document=ImageURLChunk(image_url=base64_data_url),
-            model="mistral-ocr-latest"
-        )
-        
-        if not image_response.pages:
-            print("No OCR results found")
-            return {"error": "No OCR results found"}
-            
-        image_ocr_markdown = image_response.pages[0].markdown
-        
-        # Print OCR results for debugging
-        print("\n--- OCR RESULTS ---")
-        print(image_ocr_markdown)
-        print("--- END OCR RESULTS ---\n")
+        image_ocr_markdown = self.cache.get(digest, OCR_MODEL, OCR)
+        if image_ocr_markdown is None:
+            # Process the image using OCR
+            print(f"\nProcessing document: {image_path}")
+            image_response = self.client.ocr.process(
+                document=ImageURLChunk(image_url=base64_data_url),
+                model=OCR_MODEL
+            )
+
+            if not image_response.pages:
+                print("No OCR results found")
+                return {"error": "No OCR results found"}
+
+            image_ocr_markdown = image_response.pages[0].markdown
+            self.cache.put(digest, OCR_MODEL, OCR, image_ocr_markdown)
+
+            # Print OCR results for debugging
+            print("\n--- OCR RESULTS ---")
+            print(image_ocr_markdown)
+            print("--- END OCR RESULTS ---\n")
 
         # Parse the OCR result into a structured JSON response
         chat_response = self.client.chat.complete(
-            model="pixtral-12b-latest",
+            model=EXTRACTION_MODEL,
             messages=[
                 {
                     "role": "user",
@@ -66,25 +97,31 @@ class KYCAgent:
         )
 
         result = json.loads(chat_response.choices[0].message.content)
+        self.cache.put(digest, EXTRACTION_MODEL, EXTRACTION, result)
         print(f"Extracted data: {json.dumps(result, indent=2)}")
         return result
     
     def process_onboarding_data(self, file_path):
-        """Process customer onboarding data from a text file"""
+        """Process customer onboarding data from a text file, reusing the earlier result for an unchanged file"""
         # Validate input file
         file_path = Path(file_path)
         if not file_path.is_file():
             return {"error": f"Onboarding data file not found: {file_path}"}
         
         # Read the onboarding data file
-        with open(file_path, 'r') as f:
-            onboarding_text = f.read()
+        onboarding_bytes = file_path.read_bytes()
+        digest = document_digest(onboarding_bytes)
+        cached = self.cache.get(digest, ONBOARDING_MODEL, ONBOARDING)
+        if cached is not None:
+            print(f"Using cached onboarding data: {file_path}")
+            return cached
+        onboarding_text = onboarding_bytes.decode()
         
         print(f"\nProcessing onboarding data: {file_path}")
         
         # Use Mistral to parse the onboarding data into structured format
         chat_response = self.client.chat.complete(
-            model="mistral-large-latest",
+            model=ONBOARDING_MODEL,
             messages=[
                 {
                     "role": "user",
@@ -103,38 +140,76 @@ class KYCAgent:
         )
         
         result = json.loads(chat_response.choices[0].message.content)
+        self.cache.put(digest, ONBOARDING_MODEL, ONBOARDING, result)
         print(f"Extracted onboarding data: {json.dumps(result, indent=2)}")
         return result
     
-    def analyze_customer_profile(self, customer_id):
+    def _timed(self, process, path):
+        """Run one document through a processing step, returning (result, error, seconds)"""
+        start = time.perf_counter()
+        try:
+            return process(path), None, time.perf_counter() - start
+        except Exception as e:
+            return None, str(e), time.perf_counter() - start
+
+    def extract_kyc_data(self, kyc_dir, max_workers=KYC_DOCUMENT_WORKERS):
+        """
+        Process the onboarding data and every document image in a customer's KYC directory
+        
+        The documents are independent Mistral calls, so they run concurrently
+        and the wall time approaches that of the slowest document.
+        
+        Args:
+            kyc_dir: Directory holding customer_onboarding.txt and the document images
+            max_workers: Documents processed at once
+            
+        Returns:
+            tuple: (kyc_data keyed by onboarding/aadhar/pan, timings with the
+            seconds per document file and the wall time of the whole step)
+        """
+        tasks = []
+        onboarding_file = os.path.join(kyc_dir, "customer_onboarding.txt")
+        if os.path.exists(onboarding_file):
+            tasks.append(("onboarding", onboarding_file, self.process_onboarding_data))
+        for doc_file in os.listdir(kyc_dir):
+            if doc_file.lower().endswith(DOCUMENT_EXTENSIONS):
+                doc_type = "aadhar" if "aadhar" in doc_file.lower() else "pan"
+                tasks.append((doc_type, os.path.join(kyc_dir, doc_file), self.process_document))
+        
+        start = time.perf_counter()
+        results = [None] * len(tasks)
+        if tasks:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tasks)))) as executor:
+                futures = {executor.submit(self._timed, process, path): i for i, (_, path, process) in enumerate(tasks)}
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+        
+        kyc_data = {}
+        documents = {}
+        # Assign in directory order, so a later file of the same type wins as it did sequentially
+        for (doc_type, path, _), (result, error, seconds) in zip(tasks, results):
+            if error is not None:
+                print(f"Error processing {doc_type} document: {error}")
+                result = {"error": error}
+            kyc_data[doc_type] = result
+            documents[os.path.basename(path)] = round(seconds, 3)
+            print(f"Processed {os.path.basename(path)} in {seconds:.2f}s")
+        
+        timings = {
+            "documents": documents,
+            "extraction_seconds": round(time.perf_counter() - start, 3),
+        }
+        return kyc_data, timings
+    
+    def analyze_customer_profile(self, customer_id, max_workers=KYC_DOCUMENT_WORKERS):
         """Analyze a customer's KYC documents and create a risk profile"""
         try:
-            kyc_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "kycdata", str(customer_id))
+            kyc_dir = os.path.join(KYC_DATA_DIR, str(customer_id))
             if not os.path.exists(kyc_dir):
                 print(f"No KYC data found for customer {customer_id}, using synthetic data")
                 return self._generate_mock_profile_assessment(customer_id)
             
-            kyc_data = {}
-            
-            # Process onboarding data if available
-            onboarding_file = os.path.join(kyc_dir, "customer_onboarding.txt")
-            if os.path.exists(onboarding_file):
-                try:
-                    kyc_data["onboarding"] = self.process_onboarding_data(onboarding_file)
-                except Exception as e:
-                    print(f"Error processing onboarding data: {str(e)}")
-                    kyc_data["onboarding"] = {"error": str(e)}
-            
-            # Process all document images in the customer's KYC directory
-            for doc_file in os.listdir(kyc_dir):
-                doc_path = os.path.join(kyc_dir, doc_file)
-                if doc_file.lower().endswith(('.jpg', '.jpeg', '.png', '.pdf')) and doc_file != "customer_onboarding.txt":
-                    doc_type = "aadhar" if "aadhar" in doc_file.lower() else "pan"
-                    try:
-                        kyc_data[doc_type] = self.process_document(doc_path)
-                    except Exception as e:
-                        print(f"Error processing {doc_type} document: {str(e)}")
-                        kyc_data[doc_type] = {"error": str(e)}
+            kyc_data, timings = self.extract_kyc_data(kyc_dir, max_workers)
             
             # Use LLM to assess profile risk
             risk_assessment_prompt = """
@@ -179,9 +254,10 @@ class KYCAgent:
             # If Mistral API key is not available or there's an error, return mock data
             if not self.api_key:
                 print("No API key available for Mistral - returning mock profile assessment")
-                return self._generate_mock_profile_assessment(customer_id, kyc_data)
+                return {**self._generate_mock_profile_assessment(customer_id, kyc_data), "timings": timings}
             
             try:
+                assessment_start = time.perf_counter()
                 chat_response = self.client.chat.complete(
                     model="mistral-large-latest",
                     messages=[
@@ -197,22 +273,55 @@ class KYCAgent:
                 )
                 
                 profile_risk = json.loads(chat_response.choices[0].message.content)
+                timings["assessment_seconds"] = round(time.perf_counter() - assessment_start, 3)
                 print(f"\nRisk Assessment Results: {json.dumps(profile_risk, indent=2)}")
                 
                 return {
                     "customer_id": customer_id,
                     "kyc_data": kyc_data,
-                    "profile_risk": profile_risk
+                    "profile_risk": profile_risk,
+                    "timings": timings
                 }
                 
             except Exception as e:
                 print(f"Error in Mistral API call: {str(e)}")
-                return self._generate_mock_profile_assessment(customer_id, kyc_data)
+                return {**self._generate_mock_profile_assessment(customer_id, kyc_data), "timings": timings}
         
         except Exception as e:
             print(f"Error analyzing customer profile: {str(e)}")
             return self._generate_mock_profile_assessment(customer_id)
 
+    def analyze_customers(self, customer_ids=None, max_workers=KYC_BATCH_WORKERS,
+                          document_workers=KYC_DOCUMENT_WORKERS):
+        """
+        Profile many customers in parallel, e.g. for a nightly re-KYC run
+        
+        Unchanged documents are served from the KYC cache, so a re-run only
+        pays for new or edited documents and the risk assessment calls.
+        
+        Args:
+            customer_ids: Customers to profile (default: every directory in kycdata)
+            max_workers: Customers profiled at once
+            document_workers: Documents processed at once per customer
+            
+        Returns:
+            dict: Profile assessment per customer id, in the order given
+        """
+        if customer_ids is None:
+            customer_ids = sorted(name for name in os.listdir(KYC_DATA_DIR)
+                                  if os.path.isdir(os.path.join(KYC_DATA_DIR, name)))
+        customer_ids = [str(customer_id) for customer_id in customer_ids]
+        if not customer_ids:
+            return {}
+        
+        profiles = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(customer_ids)))) as executor:
+            futures = {executor.submit(self.analyze_customer_profile, customer_id, document_workers): customer_id
+                       for customer_id in customer_ids}
+            for future in as_completed(futures):
+                profiles[futures[future]] = future.result()
+        return {customer_id: profiles[customer_id] for customer_id in customer_ids}
+
     def _generate_mock_profile_assessment(self, customer_id, kyc_data=None):
         """Generate a mock profile assessment when API is unavailable"""
         if kyc_data is None:
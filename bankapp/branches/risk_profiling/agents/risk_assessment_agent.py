@@ -1,17 +1,112 @@
 import os
 from groq import Groq
-from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
-import json
+import time
+import threading
 
-class RiskAssessmentAgent:
+try:
+    from ..utils.rule_engine import load_rule_set
+    from ..utils.llm_clients import get_chat_groq
+    from ..utils.prompt_encoder import RISK_PROMPT_COLUMNS, compact_json, encode_record, encode_table, estimate_tokens, split_batches
+except ImportError:
+    # Imported as a top-level agents package (main.py / app.py)
+    from utils.rule_engine import load_rule_set
+    from utils.llm_clients import get_chat_groq
+    from utils.prompt_encoder import RISK_PROMPT_COLUMNS, compact_json, encode_record, encode_table, estimate_tokens, split_batches
+
+# Uncertainty band: only rule scores in [RISK_LLM_BAND_MIN, RISK_LLM_BAND_MAX) are sent to the LLM.
+# Below it the rules found nothing notable, at or above it they are already decisive.
+RISK_LLM_BAND_MIN = float(os.environ.get('RISK_LLM_BAND_MIN', '30'))
+RISK_LLM_BAND_MAX = float(os.environ.get('RISK_LLM_BAND_MAX', '90'))
+
+
+def score_category(score):
+    """Map a 0-100 risk score to its risk category, with the same bounds as the rules (e.g. 90 is "Very High")"""
+    if score >= 90:
+        return "Very High"
+    if score >= 70:
+        return "High"
+    if score >= 30:
+        return "Medium"
+    return "Low"
+
+
+class TierStats:
+    """Process-wide counters of which scoring tier decided each assessment"""
+    
     def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self.tiers = {}
+            self.llm_assessments = 0
+            self.llm_seconds = 0.0
+    
+    def record(self, tier, count=1):
+        with self._lock:
+            self.tiers[tier] = self.tiers.get(tier, 0) + count
+    
+    def record_llm(self, seconds, assessments=1):
+        """Record LLM wall time spent on a number of assessments"""
+        with self._lock:
+            self.llm_assessments += assessments
+            self.llm_seconds += seconds
+    
+    def snapshot(self):
+        """
+        Get the counters
+        
+        Returns:
+            dict: Count per tier, LLM calls avoided, average LLM latency per
+            assessment and the latency saved by the avoided calls (estimated
+            from that average)
+        """
+        with self._lock:
+            tiers = dict(self.tiers)
+            avoided = sum(count for tier, count in tiers.items() if tier.startswith('rules'))
+            avg_latency = self.llm_seconds / self.llm_assessments if self.llm_assessments else 0.0
+            return {
+                "tiers": tiers,
+                "llm_calls_avoided": avoided,
+                "avg_llm_latency_ms": avg_latency * 1000,
+                "latency_saved_seconds": avoided * avg_latency
+            }
+
+
+TIER_STATS = TierStats()
+
+
+def get_tier_stats():
+    """Get the scoring tier counters of this process"""
+    return TIER_STATS.snapshot()
+
+
+class RiskAssessmentAgent:
+    # Transactions per batched LLM prompt, and prompts in flight at once
+    BATCH_SIZE = 10
+    MAX_CONCURRENCY = 4
+    # Groq limits: the model's context window and the response tokens allowed per call
+    CONTEXT_TOKENS = 8192
+    MAX_OUTPUT_TOKENS = 1024
+    # Response tokens one batched assessment takes, and the batch prompt's own instructions
+    OUTPUT_TOKENS_PER_TRANSACTION = 100
+    PROMPT_OVERHEAD_TOKENS = 400
+    
+    def __init__(self, llm_band=None):
+        """
+        Args:
+            llm_band: (min, max) rule scores that need LLM judgment
+                      (default RISK_LLM_BAND_MIN, RISK_LLM_BAND_MAX)
+        """
+        self.llm_band = llm_band or (RISK_LLM_BAND_MIN, RISK_LLM_BAND_MAX)
         # Initialize Groq LLM with Gemma model
-        self.llm = ChatGroq(
+        self.llm = get_chat_groq(
             model="gemma2-9b-it",
             temperature=0.2,
-            max_tokens=1024,
+            max_tokens=self.MAX_OUTPUT_TOKENS,
         )
         
         # Create risk assessment prompt with a completely revised format to avoid JSON parsing issues
@@ -42,97 +137,71 @@ note: give the json response without any addional headers like ``` or ```json.
         
         # Create the chain
         self.chain = self.risk_assessment_prompt | self.llm | JsonOutputParser()
+        
+        # Batch prompt: several transactions per request, one assessment per row_id
+        self.batch_assessment_prompt = ChatPromptTemplate.from_template("""
+You are an expert financial risk assessment agent. Your task is to analyze a batch of transactions and provide a risk assessment for each one.
+
+Current Rule Base:
+{rule_base}
+
+Please analyze the following transactions (CSV, header first). Each has a row_id:
+{transactions}
+
+Provide a JSON array with exactly one object per transaction, each with the following fields:
+- row_id: The row_id of the transaction, unchanged
+- risk_score: A number from 0-100
+- risk_category: One of "Low", "Medium", "High", or "Very High"
+- risk_factors: A list of specific risk factors identified
+- explanation: A brief explanation of the risk assessment
+
+Consider all aspects of each transaction including amount, timing, account history, and any anomalies.
+
+Your response should be a valid JSON array.
+note: give the json response without any addional headers like ``` or ```json.
+""")
+        self.batch_chain = self.batch_assessment_prompt | self.llm | JsonOutputParser()
+        self.last_batch_stats = {}
+    
+    def _rules_file(self):
+        """
+        Get the path to the rules file
+        """
+        return os.path.join(os.path.dirname(os.path.dirname(__file__)), "rules", "rules.txt")
+    
+    def _prompt_columns(self, rule_set=None):
+        """Transaction fields sent to the LLM: the standard risk fields plus any other field a rule uses"""
+        rule_set = rule_set or load_rule_set(self._rules_file())
+        return RISK_PROMPT_COLUMNS + tuple(sorted(rule_set.fields - set(RISK_PROMPT_COLUMNS)))
     
     def _get_rules(self):
         """
-        Get rules from the text file
+        Get rules from the text file (cached until the file changes)
         """
-        rules_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), "rules", "rules.txt")
-        
-        
-        
-        # Read rules from file
-        with open(rules_file, 'r') as f:
-            return f.read()
+        return load_rule_set(self._rules_file()).text
     
     def _apply_rules(self, transaction):
         """
-        Apply simple rule-based checks to the transaction
+        Apply the compiled rule base to the transaction
         """
-        rules = self._get_rules()
-        risk_score = 0
-        risk_factors = []
-        risk_category = "Low"
-        
-        # Convert transaction to dict if it's a pandas Series
-        if hasattr(transaction, 'to_dict'):
-            transaction = transaction.to_dict()
-        
-        # Simple rule parsing and application
-        for line in rules.split('\n'):
-            line = line.strip()
-            if not line or not line.startswith('Rule'):
-                continue
-            
-            try:
-                # Extract condition and actions
-                parts = line.split(':', 1)[1].split(',')
-                condition = parts[0].strip()
-                
-                # Extract risk score
-                risk_score_part = [p for p in parts if 'risk score' in p][0]
-                rule_risk_score = int(risk_score_part.split('risk score')[1].strip())
-                
-                # Extract category
-                category_part = [p for p in parts if 'category' in p][0]
-                rule_category = category_part.split('category')[1].strip().strip('"')
-                
-                # Extract factor
-                factor_part = [p for p in parts if 'factor' in p][0]
-                rule_factor = factor_part.split('factor')[1].strip().strip('"')
-                
-                # Evaluate condition
-                if 'transaction_amount' in condition and '>' in condition:
-                    threshold = float(condition.split('>')[1].strip())
-                    condition_met = transaction['transaction_amount'] > threshold
-                elif 'smurfing_indicator' in condition and '==' in condition:
-                    value = int(condition.split('==')[1].strip())
-                    condition_met = transaction['smurfing_indicator'] == value
-                elif 'previous_fraud_flag' in condition and '==' in condition:
-                    value = int(condition.split('==')[1].strip())
-                    condition_met = transaction['previous_fraud_flag'] == value
-                elif 'account_age_days' in condition and '<' in condition:
-                    threshold = int(condition.split('<')[1].strip())
-                    condition_met = transaction['account_age_days'] < threshold
-                elif 'kyc_status' in condition and '==' in condition:
-                    value = condition.split('==')[1].strip().strip("'")
-                    condition_met = transaction['kyc_status'] == value
-                else:
-                    condition_met = False
-                
-                if condition_met:
-                    # Update risk score if higher
-                    risk_score = max(risk_score, rule_risk_score)
-                    
-                    # Add risk factor
-                    risk_factors.append(rule_factor)
-                    
-                    # Update risk category if higher
-                    category_levels = {"Low": 1, "Medium": 2, "High": 3, "Very High": 4}
-                    if category_levels.get(rule_category, 0) > category_levels.get(risk_category, 0):
-                        risk_category = rule_category
-            
-            except Exception as e:
-                print(f"Error applying rule: {line}. Error: {e}")
-        
+        assessment = load_rule_set(self._rules_file()).evaluate_one(transaction)
         return {
-            "risk_score": risk_score,
-            "risk_category": risk_category,
-            "risk_factors": risk_factors,
-            "explanation": f"Rule-based assessment identified {len(risk_factors)} risk factors.",
+            "risk_score": assessment["risk_score"],
+            "risk_category": assessment["risk_category"],
+            "risk_factors": assessment["risk_factors"],
+            "explanation": f"Rule-based assessment identified {len(assessment['risk_factors'])} risk factors.",
             "rule_update_needed": False
         }
     
+    def _rule_tier(self, score):
+        """Get the deciding rules tier for a rule score, or None if the LLM is needed"""
+        band_min, band_max = self.llm_band
+        if score >= band_max:
+            return "rules_high"
+        if score < band_min:
+            return "rules_low"
+        return None
+    
     def assess_risk(self, transaction):
         """
         Assess the risk of a transaction using the LLM and rule base
@@ -143,15 +212,17 @@ note: give the json response without any addional headers like ``` or ```json.
         # Apply rule-based checks first
         rule_based_assessment = self._apply_rules(transaction)
         
-        # Convert transaction to string representation - handle both pandas Series and dict
+        # Clear-cut cases are decided by the rules alone
+        tier = self._rule_tier(rule_based_assessment["risk_score"])
+        if tier:
+            TIER_STATS.record(tier)
+            rule_based_assessment["assessed_by"] = "rules"
+            return rule_based_assessment
+        
+        # Convert transaction to a compact string with only the fields the assessment needs
         transaction_str = ""
         try:
-            if hasattr(transaction, 'to_dict'):
-                # If transaction is a pandas Series
-                transaction_str = json.dumps(transaction.to_dict(), indent=2)
-            else:
-                # If transaction is already a dict
-                transaction_str = json.dumps(transaction, indent=2)
+            transaction_str = encode_record(transaction, self._prompt_columns())
         except Exception as e:
             print(f"Error converting transaction to string: {e}")
             # Fallback to simple string representation
@@ -161,11 +232,15 @@ note: give the json response without any addional headers like ``` or ```json.
         rule_base_str = self._get_rules()
         
         # Run the LLM chain
+        start_time = time.perf_counter()
         try:
             result = self.chain.invoke({
                 "transaction_data": transaction_str,
                 "rule_base": rule_base_str
             })
+            TIER_STATS.record_llm(time.perf_counter() - start_time)
+            TIER_STATS.record("llm")
+            result["assessed_by"] = "llm"
             
             # Combine rule-based assessment with LLM assessment
             if rule_based_assessment["risk_score"] > result["risk_score"]:
@@ -177,8 +252,129 @@ note: give the json response without any addional headers like ``` or ```json.
         except Exception as e:
             print(f"Error in risk assessment: {e}")
             # Fallback to rule-based assessment if LLM fails
+            TIER_STATS.record("llm_fallback")
+            rule_based_assessment["assessed_by"] = "rules_fallback"
             return rule_based_assessment
 
+    def assess_batch(self, df, batch_size=None, max_concurrency=None):
+        """
+        Assess the risk of a whole DataFrame of transactions
+        
+        The rule base is applied to every row in one vectorized pass. Only rows
+        whose rule score falls in the uncertainty band (self.llm_band) are sent
+        to the LLM, several per prompt, with at most max_concurrency prompts in
+        flight. As in assess_risk, the final score is the higher of the rule and
+        LLM scores, and rows whose LLM batch fails keep their rule assessment.
+        
+        Args:
+            df: DataFrame of transactions
+            batch_size: Transactions per LLM prompt (default BATCH_SIZE)
+            max_concurrency: Concurrent LLM prompts (default MAX_CONCURRENCY)
+            
+        Returns:
+            DataFrame: df with risk_score, risk_category, risk_factors, explanation
+            and assessed_by ("rules", "llm" or "rules_fallback") columns.
+            Throughput is stored in self.last_batch_stats.
+        """
+        batch_size = batch_size or self.BATCH_SIZE
+        max_concurrency = max_concurrency or self.MAX_CONCURRENCY
+        start_time = time.perf_counter()
+        
+        rule_set = load_rule_set(self._rules_file())
+        rules = rule_set.evaluate(df)
+        result = df.copy()
+        result['risk_score'] = rules['risk_score'].to_numpy()
+        result['risk_category'] = rules['risk_category'].to_numpy()
+        result['risk_factors'] = [list(factors) for factors in rules['risk_factors']]
+        result['explanation'] = [f"Rule-based assessment identified {len(factors)} risk factors." for factors in rules['risk_factors']]
+        result['assessed_by'] = 'rules'
+        
+        # Rows needing LLM judgment, by position
+        pending = []
+        for i, score in enumerate(rules['risk_score'].to_numpy()):
+            tier = self._rule_tier(score)
+            if tier:
+                TIER_STATS.record(tier)
+            else:
+                pending.append(i)
+        # Batches are also split so each prompt and response fits the model's limits
+        columns = ('row_id',) + self._prompt_columns(rule_set)
+        records = df.astype(object).where(df.notna(), None).to_dict('records')
+        batches = split_batches(
+            [dict(records[i], row_id=str(i)) for i in pending], columns,
+            max_input_tokens=self.CONTEXT_TOKENS - self.MAX_OUTPUT_TOKENS,
+            max_output_tokens=self.MAX_OUTPUT_TOKENS,
+            output_tokens_per_record=self.OUTPUT_TOKENS_PER_TRANSACTION,
+            max_records=batch_size,
+            overhead_tokens=estimate_tokens(rule_set.text) + self.PROMPT_OVERHEAD_TOKENS
+        )
+        chunks = [[int(row['row_id']) for row in batch] for batch in batches]
+        inputs = [{
+            "rule_base": rule_set.text,
+            "transactions": encode_table(batch, columns)
+        } for batch in batches]
+        
+        llm_start = time.perf_counter()
+        outputs = self.batch_chain.batch(inputs, config={"max_concurrency": max_concurrency}, return_exceptions=True) if inputs else []
+        if pending:
+            TIER_STATS.record_llm(time.perf_counter() - llm_start, len(pending))
+        
+        scores = result['risk_score'].tolist()
+        categories = result['risk_category'].tolist()
+        factors = result['risk_factors'].tolist()
+        explanations = result['explanation'].tolist()
+        assessed_by = result['assessed_by'].tolist()
+        for chunk, output in zip(chunks, outputs):
+            if isinstance(output, Exception) or not isinstance(output, list):
+                print(f"Error in batch risk assessment: {output}")
+                for i in chunk:
+                    assessed_by[i] = 'rules_fallback'
+                continue
+            by_row = {str(item.get('row_id')): item for item in output if isinstance(item, dict)}
+            for i in chunk:
+                item = by_row.get(str(i))
+                if item is None:
+                    assessed_by[i] = 'rules_fallback'
+                    continue
+                try:
+                    llm_score = float(item.get('risk_score', 0))
+                except (TypeError, ValueError):
+                    assessed_by[i] = 'rules_fallback'
+                    continue
+                # Combine rule-based assessment with LLM assessment
+                llm_factors = list(item.get('risk_factors') or [])
+                if scores[i] > llm_score:
+                    factors[i] = llm_factors + factors[i]
+                else:
+                    scores[i] = llm_score
+                    categories[i] = item.get('risk_category', categories[i])
+                    factors[i] = llm_factors
+                explanations[i] = item.get('explanation', explanations[i])
+                assessed_by[i] = 'llm'
+        
+        result['risk_score'] = scores
+        result['risk_category'] = categories
+        result['risk_factors'] = factors
+        result['explanation'] = explanations
+        result['assessed_by'] = assessed_by
+        for tier in ('llm', 'rules_fallback'):
+            count = sum(1 for i in pending if assessed_by[i] == tier)
+            if count:
+                TIER_STATS.record('llm' if tier == 'llm' else 'llm_fallback', count)
+        
+        elapsed = time.perf_counter() - start_time
+        self.last_batch_stats = {
+            "transactions": len(df),
+            "rule_only": len(df) - len(pending),
+            "llm_rows": len(pending),
+            "llm_prompts": len(chunks),
+            "seconds": elapsed,
+            "transactions_per_sec": len(df) / elapsed if elapsed > 0 else 0.0
+        }
+        print(f"Assessed {len(df)} transactions ({len(pending)} via LLM in {len(chunks)} prompts) "
+              f"in {elapsed:.2f}s ({self.last_batch_stats['transactions_per_sec']:.1f} transactions/sec)")
+        return result
+    
     def assess_combined_risk(self, profile_risk, transaction_data):
         """
         Assess combined risk based on profile risk and transaction risk data.
@@ -190,6 +386,12 @@ note: give the json response without any addional headers like ``` or ```json.
         Returns:
             Dictionary containing combined risk assessment
         """
+        # Decide deterministically when both sides agree the case is clear-cut
+        deterministic = self._deterministic_combined_risk(profile_risk, transaction_data)
+        if deterministic:
+            TIER_STATS.record("rules_combined")
+            return deterministic
+        
         # Create a prompt for combined risk assessment
         combined_risk_prompt = ChatPromptTemplate.from_template("""
         You are an expert financial risk assessment agent. Your task is to provide a combined risk assessment based on both profile and transaction risk data.
@@ -216,11 +418,14 @@ note: give the json response without any addional headers like ``` or ```json.
         combined_chain = combined_risk_prompt | self.llm | JsonOutputParser()
         
         # Run the chain
+        start_time = time.perf_counter()
         try:
             result = combined_chain.invoke({
-                "profile_risk": json.dumps(profile_risk, indent=2),
-                "transaction_data": json.dumps(transaction_data, indent=2)
+                "profile_risk": compact_json(profile_risk),
+                "transaction_data": compact_json(transaction_data)
             })
+            TIER_STATS.record_llm(time.perf_counter() - start_time)
+            TIER_STATS.record("llm_combined")
             return result
         except Exception as e:
             print(f"Error in combined risk assessment: {e}")
@@ -230,4 +435,42 @@ note: give the json response without any addional headers like ``` or ```json.
                 "risk_category": "Medium",
                 "risk_factors": ["Error in combined risk assessment"],
                 "recommendation": "Manual review recommended due to assessment error"
-            }
\ No newline at end of file
+            }
+    
+    def _deterministic_combined_risk(self, profile_risk, transaction_data):
+        """
+        Combine profile and transaction risk without the LLM when the outcome is clear
+        
+        If either score is at or above the top of the uncertainty band the
+        higher score wins; if both are below its bottom the case is low risk.
+        
+        Returns:
+            dict: Combined assessment, or None if the LLM should decide
+        """
+        profile_score = profile_risk.get("risk_score")
+        transaction_score = transaction_data.get("risk_score", transaction_data.get("avg_risk_score"))
+        try:
+            profile_score = float(profile_score)
+            transaction_score = float(transaction_score)
+        except (TypeError, ValueError):
+            return None
+        
+        band_min, band_max = self.llm_band
+        factors = list(profile_risk.get("risk_factors") or []) + list(transaction_data.get("risk_factors") or [])
+        if max(profile_score, transaction_score) >= band_max:
+            score = max(profile_score, transaction_score)
+            recommendation = "Escalate for enhanced due diligence; rule-based checks flagged a high-risk indicator"
+        elif profile_score < band_min and transaction_score < band_min:
+            score = (profile_score + transaction_score) / 2
+            recommendation = "No action required; continue routine monitoring"
+        else:
+            return None
+        
+        return {
+            "risk_score": score,
+            "risk_category": score_category(score),
+            "risk_factors": factors,
+            "recommendation": recommendation,
+            "explanation": f"Deterministic combination of profile risk ({profile_score:g}) and transaction risk ({transaction_score:g}).",
+            "assessed_by": "rules"
+        }
@@ -1,14 +1,41 @@
 import os
-import json
 import logging
-from google import genai
-from google.genai import types
+
+try:
+    from ..utils.llm_clients import generate, get_gemini_client
+    from ..utils.prompt_encoder import RISK_PROMPT_COLUMNS, encode_table, estimate_tokens, split_batches
+except ImportError:
+    from utils.llm_clients import generate, get_gemini_client
+    from utils.prompt_encoder import RISK_PROMPT_COLUMNS, encode_table, estimate_tokens, split_batches
+
+try:
+    from ...risk_dispatcher import apply_assessments, apply_fallback
+except ImportError:
+    # Imported by the scripts with the branches directory on sys.path
+    from risk_dispatcher import apply_assessments, apply_fallback
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Rules given to the model; also part of the risk cache key, so editing them invalidates cached scores
+RISK_RULES = """
+Rule 1: If transaction_amount > 50000, add risk score 70, category "High", factor "Unusually large transaction amount"
+Rule 2: If smurfing_indicator == 1, add risk score 80, category "High", factor "Potential structuring/smurfing behavior detected"
+Rule 3: If previous_fraud_flag == 1, add risk score 90, category "Very High", factor "Account previously involved in fraudulent activity"
+Rule 4: If account_age_days < 30, add risk score 60, category "Medium", factor "Account is relatively new"
+Rule 5: If kyc_status == 'NONE', add risk score 50, category "Medium", factor "Account has no KYC verification"
+Rule 6: If new_balance < 0, add risk score 70, category "High", factor "Transaction resulted in negative balance"
+Rule 7: If label_for_fraud == 1, add risk score 95, category "Very High", factor "Transaction explicitly flagged as fraudulent"
+"""
+
 class GeminiRiskAssessmentAgent:
+    # Response token limit per call, the response tokens one assessment takes,
+    # and the prompt instructions around the transaction table
+    MAX_OUTPUT_TOKENS = 4096
+    OUTPUT_TOKENS_PER_TRANSACTION = 200
+    PROMPT_OVERHEAD_TOKENS = 500
+    
     def __init__(self):
         """Initialize the risk assessment agent with Gemini API."""
         # Use Google API key from environment
@@ -19,38 +46,47 @@ class GeminiRiskAssessmentAgent:
             
         try:
             logger.info("Initializing Gemini client")
-            self.client = genai.Client(api_key=api_key)
+            self.client = get_gemini_client(api_key)
             self.model = "gemini-1.5-pro"
             logger.info(f"Gemini client initialized with model {self.model}")
         except Exception as e:
             logger.error(f"Error initializing Gemini client: {e}")
             raise
     
-    def assess_transaction_risks_batch(self, transactions):
+    def request_risk_assessments(self, transactions):
         """
-        Assess the risk of a batch of transactions using Gemini LLM
+        Send one batch of transactions to Gemini and parse its assessments
+        
+        Unlike assess_transaction_risks_batch this raises on any API or parse
+        error, so callers can retry (e.g. on rate limiting) instead of
+        receiving default scores. A batch whose prompt or response would not
+        fit the model's limits is sent as several smaller calls.
         
         Args:
             transactions: A list of transaction dictionaries
             
         Returns:
-            List of transaction dictionaries with added risk assessment fields
+            dict: transaction_id -> assessment with risk_score, risk_category and risk_explanation
         """
-        if not transactions:
-            logger.warning("No transactions provided for risk assessment")
-            return transactions
-        
-        # Create a detailed prompt for the LLM
-        transactions_str = json.dumps(transactions, indent=2)
-        
-        # Using the rules as context and guidance for the model
         rules = self._get_rules()
+        assessments = {}
+        for batch in split_batches(transactions, RISK_PROMPT_COLUMNS,
+                                   max_output_tokens=self.MAX_OUTPUT_TOKENS,
+                                   output_tokens_per_record=self.OUTPUT_TOKENS_PER_TRANSACTION,
+                                   overhead_tokens=estimate_tokens(rules) + self.PROMPT_OVERHEAD_TOKENS):
+            assessments.update(self._request_batch(batch, rules))
+        return assessments
+    
+    def _request_batch(self, transactions, rules):
+        """Send one batch that fits the model's limits to Gemini and parse its assessments"""
+        # Only the fields the assessment needs, as a CSV table
+        transactions_str = encode_table(transactions, RISK_PROMPT_COLUMNS)
         
         prompt = f"""You are an expert financial risk assessment agent for a bank's transaction monitoring system.
 
 TASK: Analyze the following batch of banking transactions and provide a risk assessment for each one.
 
-TRANSACTION DATA:
+TRANSACTION DATA (CSV, header first):
 {transactions_str}
 
 RISK ASSESSMENT RULES:
@@ -74,80 +110,52 @@ For EACH transaction, provide a JSON object with the following fields:
 Your response should be a valid JSON array containing one object for each transaction.
 """
         
-        # Generate content using Gemini
-        contents = [
-            types.Content(
-                role="user",
-                parts=[types.Part.from_text(text=prompt)],
-            ),
-        ]
-        
-        generate_content_config = types.GenerateContentConfig(
+        logger.info(f"Sending batch of {len(transactions)} transactions to Gemini for risk assessment")
+        risk_assessments = generate(
+            prompt,
+            schema=True,
+            model=self.model,
             temperature=0.2,
-            max_output_tokens=4096,
+            max_tokens=self.MAX_OUTPUT_TOKENS,
         )
+        logger.info(f"Successfully parsed {len(risk_assessments)} risk assessments from Gemini")
         
-        try:
-            logger.info(f"Sending batch of {len(transactions)} transactions to Gemini for risk assessment")
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=contents,
-                config=generate_content_config,
-            )
-            
-            # Parse the response as JSON
-            result_text = response.text
-            logger.info("Received response from Gemini, processing results")
-            
-            # Clean the response text if it contains markdown code blocks
-            if "```json" in result_text:
-                result_text = result_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in result_text:
-                result_text = result_text.split("```")[1].split("```")[0].strip()
-            
-            # Parse the JSON
-            risk_assessments = json.loads(result_text)
-            logger.info(f"Successfully parsed {len(risk_assessments)} risk assessments from Gemini")
+        # Map the risk assessments back to the original transactions
+        return {str(assessment['transaction_id']): assessment for assessment in risk_assessments}
+    
+    def assess_transaction_risks_batch(self, transactions):
+        """
+        Assess the risk of a batch of transactions using Gemini LLM
+        
+        Args:
+            transactions: A list of transaction dictionaries
             
-            # Map the risk assessments back to the original transactions
-            risk_mapping = {str(assessment['transaction_id']): assessment for assessment in risk_assessments}
+        Returns:
+            List of transaction dictionaries with added risk assessment fields
+        """
+        if not transactions:
+            logger.warning("No transactions provided for risk assessment")
+            return transactions
+        
+        try:
+            risk_mapping = self.request_risk_assessments(transactions)
             
             # Add risk assessments to the original transactions
             for transaction in transactions:
                 transaction_id = str(transaction.get('transaction_id', ''))
-                if transaction_id in risk_mapping:
-                    assessment = risk_mapping[transaction_id]
-                    transaction['risk_score'] = assessment.get('risk_score', 0)
-                    transaction['risk_category'] = assessment.get('risk_category', 'Low')
-                    transaction['risk_explanation'] = assessment.get('risk_explanation', '')
-                    logger.debug(f"Applied risk assessment for transaction {transaction_id}: score={transaction['risk_score']}")
-                else:
+                if transaction_id not in risk_mapping:
                     logger.warning(f"No risk assessment found for transaction ID {transaction_id}")
-                    # Apply default values
-                    transaction['risk_score'] = 50
-                    transaction['risk_category'] = "Medium"
-                    transaction['risk_explanation'] = "Risk assessment not available for this transaction."
+            apply_assessments(transactions, risk_mapping)
             
             return transactions
             
         except Exception as e:
             logger.error(f"Error generating risk assessment: {e}")
             # If there's an error, add default risk values
-            for transaction in transactions:
-                transaction['risk_score'] = 50
-                transaction['risk_category'] = "Medium"
-                transaction['risk_explanation'] = f"Unable to generate risk assessment due to an error: {str(e)[:100]}"
+            apply_fallback(transactions, f"Unable to generate risk assessment due to an error: {str(e)[:100]}")
             
             return transactions
     
     def _get_rules(self):
         """Get the risk assessment rules as a string"""
-        return """
-Rule 1: If transaction_amount > 50000, add risk score 70, category "High", factor "Unusually large transaction amount"
-Rule 2: If smurfing_indicator == 1, add risk score 80, category "High", factor "Potential structuring/smurfing behavior detected"
-Rule 3: If previous_fraud_flag == 1, add risk score 90, category "Very High", factor "Account previously involved in fraudulent activity"
-Rule 4: If account_age_days < 30, add risk score 60, category "Medium", factor "Account is relatively new"
-Rule 5: If kyc_status == 'NONE', add risk score 50, category "Medium", factor "Account has no KYC verification"
-Rule 6: If new_balance < 0, add risk score 70, category "High", factor "Transaction resulted in negative balance"
-Rule 7: If label_for_fraud == 1, add risk score 95, category "Very High", factor "Transaction explicitly flagged as fraudulent"
-""" 
\ No newline at end of file
+        return RISK_RULES
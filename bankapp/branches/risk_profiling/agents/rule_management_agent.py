@@ -1,13 +1,17 @@
 import os
 from groq import Groq
-from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
+try:
+    from ..utils.llm_clients import get_chat_groq
+except ImportError:
+    from utils.llm_clients import get_chat_groq
+
 class RuleManagementAgent:
     def __init__(self):
         # Initialize Groq LLM with Gemma model
-        self.llm = ChatGroq(
+        self.llm = get_chat_groq(
             model="gemma2-9b-it",
             temperature=0.2,
             max_tokens=1024,
@@ -178,18 +178,11 @@ def main():
             total_risk_score = 0
             transaction_risks = []
             
-            # Process each transaction with a progress bar
-            progress_bar = st.progress(0)
+            # Assess all transactions at once: rules first, then batched LLM calls for the rest
+            with st.spinner(f"Analyzing {len(transactions)} transactions..."):
+                assessed = risk_agent.assess_batch(transactions)
             
-            for idx, transaction in transactions.iterrows():
-                # Update progress - Fix: Ensure progress is between 0.0 and 1.0
-                progress = min(1.0, (idx + 1) / len(transactions))
-                progress_bar.progress(progress)
-                
-                # Assess risk
-                with st.spinner(f"Analyzing transaction {idx+1}/{len(transactions)}..."):
-                    risk_profile = risk_agent.assess_risk(transaction)
-                
+            for idx, risk_profile in enumerate(assessed.to_dict('records')):
                 # Update risk counters
                 total_risk_score += risk_profile['risk_score']
                 if risk_profile['risk_category'] in ['High', 'Very High']:
@@ -201,15 +194,17 @@ def main():
                 
                 # Store transaction risk data
                 transaction_risks.append({
-                    "Transaction ID": transaction.get('transaction_id', f'TX-{idx}'),
+                    "Transaction ID": risk_profile.get('transaction_id', f'TX-{idx}'),
                     "Risk Score": risk_profile['risk_score'],
                     "Risk Category": risk_profile['risk_category'],
                     "Risk Factors": risk_profile['risk_factors'],
                     "Explanation": risk_profile['explanation']
                 })
             
-            # Clear progress bar after completion
-            progress_bar.empty()
+            batch_stats = risk_agent.last_batch_stats
+            st.caption(f"Scored {batch_stats['transactions']} transactions in {batch_stats['seconds']:.2f}s "
+                       f"({batch_stats['transactions_per_sec']:.1f} transactions/sec, "
+                       f"{batch_stats['llm_rows']} needed LLM review)")
             
             # Calculate overall transaction risk
             avg_risk_score = total_risk_score / len(transactions)
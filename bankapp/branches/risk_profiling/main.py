@@ -74,15 +74,15 @@ def main():
         low_risk_count = 0
         total_risk_score = 0
         
+        # Assess all transactions at once: rules first, then batched LLM calls for the rest
+        assessed = risk_agent.assess_batch(transactions)
+        
         # Process each transaction
-        for idx, transaction in transactions.iterrows():
+        for idx, risk_profile in enumerate(assessed.to_dict('records')):
             print(f"\n{'-'*80}")
-            print(f"Processing transaction {idx+1}/{len(transactions)}: {transaction.get('transaction_id', f'TX-{idx}')}")
+            print(f"Transaction {idx+1}/{len(assessed)}: {risk_profile.get('transaction_id', f'TX-{idx}')}")
             print(f"{'-'*80}")
             
-            # Assess risk
-            risk_profile = risk_agent.assess_risk(transaction)
-            
             # Update risk counters
             total_risk_score += risk_profile['risk_score']
             if risk_profile['risk_category'] == 'High' or risk_profile['risk_category'] == 'Very High':
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from .state_paths import state_path
+
+# Extracted Aadhaar/PAN fields are personal data, so the cache lives outside the source tree
+KYC_CACHE_DB = os.environ.get('KYC_CACHE_DB') or state_path('kyc_cache', 'documents.sqlite3')
+
+# Stages of KYC document processing whose results are cached
+OCR = 'ocr'
+EXTRACTION = 'extraction'
+ONBOARDING = 'onboarding'
+
+
+def document_digest(data: bytes) -> str:
+    """Hex sha256 of a document's bytes; any edit to the file changes it"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class KYCDocumentCache:
+    """
+    SQLite cache of KYC document processing results
+
+    Entries are keyed by the sha256 of the document, the model and the stage
+    (OCR markdown, extracted document fields, parsed onboarding data), so a
+    document is only sent to Mistral again when its contents or the model
+    change. Failed calls are never cached.
+    """
+
+    def __init__(self, path: str = KYC_CACHE_DB):
+        self.path = path
+        self._local = threading.local()
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS kyc_results (
+                    digest TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (digest, model, stage)
+                )
+            """)
+        # Readable by the app's user only
+        os.chmod(path, 0o600)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get this thread's connection (SQLite connections are not shared across threads)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, digest: str, model: str, stage: str) -> Optional[Any]:
+        """
+        Look up a cached result
+
+        Args:
+            digest: document_digest of the document
+            model: Model that produced the result
+            stage: OCR, EXTRACTION or ONBOARDING
+
+        Returns:
+            The cached markdown or JSON value, or None on a miss
+        """
+        row = self._connect().execute(
+            "SELECT result FROM kyc_results WHERE digest = ? AND model = ? AND stage = ?",
+            (digest, model, stage)
+        ).fetchone()
+        with self.lock:
+            self.stats['hits' if row else 'misses'] += 1
+        return json.loads(row[0]) if row else None
+
+    def put(self, digest: str, model: str, stage: str, result: Any):
+        """Store a result for a document, replacing any earlier one for the same model and stage"""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO kyc_results (digest, model, stage, result, created_at) VALUES (?, ?, ?, ?, ?)",
+                (digest, model, stage, json.dumps(result), time.time())
+            )
+
+    def snapshot(self) -> Dict[str, int]:
+        with self.lock:
+            stats = dict(self.stats)
+        stats['entries'] = self._connect().execute("SELECT COUNT(*) FROM kyc_results").fetchone()[0]
+        return stats
+
+
+_cache: Optional[KYCDocumentCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_kyc_cache() -> KYCDocumentCache:
+    """Get the process-wide KYC document cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = KYCDocumentCache()
+    return _cache
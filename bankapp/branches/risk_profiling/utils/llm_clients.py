@@ -0,0 +1,189 @@
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# Gemini models in order of preference when discovering what the API key can use
+PREFERRED_GEMINI_MODELS = (
+    "gemini-2.0-pro-exp-02-05",
+    "gemini-1.5-pro",
+    "gemini-1.0-pro",
+)
+DEFAULT_GEMINI_MODEL = "gemini-1.5-pro"
+DEFAULT_GROQ_MODEL = "gemma2-9b-it"
+
+# Seconds allowed per generate() call unless the caller says otherwise
+DEFAULT_TIMEOUT = float(os.environ.get("LLM_TIMEOUT_SECONDS", "60"))
+
+_clients: Dict[Tuple, Any] = {}
+_models: Dict[str, Tuple[str, ...]] = {}
+_lock = threading.Lock()
+
+
+def _get_or_create(key: Tuple, factory):
+    """Get a process-wide client, creating it on first use"""
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = factory()
+    return client
+
+
+def _api_key(name: str, api_key: Optional[str]) -> str:
+    api_key = api_key or os.environ.get(name)
+    if not api_key:
+        raise ValueError(f"{name} environment variable is required")
+    return api_key
+
+
+def get_gemini_client(api_key: Optional[str] = None):
+    """
+    Get the shared Gemini client, so every agent reuses its HTTP session
+
+    Args:
+        api_key: API key (default GOOGLE_API_KEY)
+
+    Returns:
+        genai.Client shared by the whole process
+    """
+    api_key = _api_key("GOOGLE_API_KEY", api_key)
+
+    def create():
+        from google import genai
+        return genai.Client(api_key=api_key)
+
+    return _get_or_create(("gemini", api_key), create)
+
+
+def get_mistral_client(api_key: Optional[str] = None):
+    """
+    Get the shared Mistral client
+
+    Args:
+        api_key: API key (default MISTRAL_API_KEY)
+
+    Returns:
+        Mistral client shared by the whole process
+    """
+    api_key = api_key or os.environ.get("MISTRAL_API_KEY")
+
+    def create():
+        from mistralai import Mistral
+        return Mistral(api_key=api_key)
+
+    return _get_or_create(("mistral", api_key), create)
+
+
+def get_chat_groq(model: str = DEFAULT_GROQ_MODEL, temperature: float = 0.2, max_tokens: int = 1024,
+                  timeout: Optional[float] = None):
+    """
+    Get a shared ChatGroq model; chat models are stateless, so one per configuration is enough
+
+    Args:
+        model: Groq model name
+        temperature: Sampling temperature
+        max_tokens: Maximum tokens in a response
+        timeout: Request timeout in seconds (default: the client's own)
+
+    Returns:
+        ChatGroq shared by every caller with the same configuration
+    """
+    def create():
+        from langchain_groq import ChatGroq
+        options = {"timeout": timeout} if timeout is not None else {}
+        return ChatGroq(model=model, temperature=temperature, max_tokens=max_tokens, **options)
+
+    return _get_or_create(("groq", model, temperature, max_tokens, timeout), create)
+
+
+def list_gemini_models(api_key: Optional[str] = None) -> Tuple[str, ...]:
+    """Get the names of the Gemini models available to an API key (discovered once per process)"""
+    api_key = _api_key("GOOGLE_API_KEY", api_key)
+    names = _models.get(api_key)
+    if names is not None:
+        return names
+    try:
+        names = tuple(model.name for model in get_gemini_client(api_key).models.list())
+    except Exception as e:
+        print(f"Warning: Could not list models: {e}")
+        names = ()
+    _models[api_key] = names
+    return names
+
+
+def pick_gemini_model(preferred: Iterable[str] = PREFERRED_GEMINI_MODELS, default: str = DEFAULT_GEMINI_MODEL,
+                      api_key: Optional[str] = None) -> str:
+    """
+    Choose the first preferred Gemini model the API key can use
+
+    Returns:
+        str: The model name, or default if none is listed or discovery failed
+    """
+    names = list_gemini_models(api_key)
+    for model_name in preferred:
+        if any(model_name in name for name in names):
+            return model_name
+    return default
+
+
+def generate(prompt: str, schema: Optional[Any] = None, timeout: Optional[float] = None,
+             provider: str = "gemini", model: Optional[str] = None, temperature: float = 0.2,
+             max_tokens: int = 8192) -> Any:
+    """
+    Send one prompt to an LLM through the shared clients
+
+    Args:
+        prompt: Prompt text
+        schema: Expected JSON response; a response schema (Gemini) or True for
+                any JSON. None returns plain text
+        timeout: Seconds to wait for the response (default LLM_TIMEOUT_SECONDS)
+        provider: "gemini" or "groq"
+        model: Model name (default DEFAULT_GEMINI_MODEL / DEFAULT_GROQ_MODEL)
+        temperature: Sampling temperature
+        max_tokens: Maximum tokens in the response
+
+    Returns:
+        The response text, or the parsed JSON if a schema was given
+    """
+    timeout = DEFAULT_TIMEOUT if timeout is None else timeout
+
+    if provider == "gemini":
+        from google.genai import types
+        config = {
+            "temperature": temperature,
+            "max_output_tokens": max_tokens,
+            "response_mime_type": "application/json" if schema is not None else "text/plain",
+            "http_options": types.HttpOptions(timeout=int(timeout * 1000)),
+        }
+        if schema is not None and schema is not True:
+            config["response_schema"] = schema
+        response = get_gemini_client().models.generate_content(
+            model=model or DEFAULT_GEMINI_MODEL,
+            contents=[types.Content(role="user", parts=[types.Part.from_text(text=prompt)])],
+            config=types.GenerateContentConfig(**config),
+        )
+        text = response.text
+    elif provider == "groq":
+        llm = get_chat_groq(model or DEFAULT_GROQ_MODEL, temperature, max_tokens, timeout)
+        text = llm.invoke(prompt).content
+    else:
+        raise ValueError(f"Unknown LLM provider: {provider}")
+
+    if schema is None:
+        return text
+    # Models sometimes wrap JSON in a markdown code block despite the mime type
+    if "```json" in text:
+        text = text.split("```json")[1].split("```")[0]
+    elif "```" in text:
+        text = text.split("```")[1].split("```")[0]
+    return json.loads(text.strip())
+
+
+def reset_clients():
+    """Drop the shared clients and discovered models, e.g. after rotating API keys"""
+    with _lock:
+        _clients.clear()
+        _models.clear()
@@ -0,0 +1,158 @@
+import csv
+import io
+import json
+import math
+import os
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+# Transaction fields the risk prompts need: rule inputs, the additional risk factors and the id.
+# Everything else (blank CSV columns, IPs, MAC addresses, narration) only costs tokens.
+RISK_PROMPT_COLUMNS = (
+    'transaction_id', 'timestamp', 'transaction_amount', 'old_balance', 'new_balance',
+    'average_transaction_amount', 'transaction_frequency', 'account_age_days', 'kyc_status',
+    'method_of_transaction', 'transaction_currency', 'location_data', 'device_used',
+    'smurfing_indicator', 'previous_fraud_flag', 'label_for_fraud',
+)
+
+# Rough size of a token for English text and CSV/JSON (used when no tokenizer is at hand)
+CHARS_PER_TOKEN = 4
+
+# Prompt and response budgets per model call
+MAX_INPUT_TOKENS = int(os.environ.get('LLM_MAX_INPUT_TOKENS', '6000'))
+MAX_OUTPUT_TOKENS = int(os.environ.get('LLM_MAX_OUTPUT_TOKENS', '4096'))
+
+
+def _is_missing(value: Any) -> bool:
+    if value is None:
+        return True
+    if isinstance(value, float) and math.isnan(value):
+        return True
+    if isinstance(value, str) and value.strip() in ('', 'nan', 'NaN', 'null', 'None'):
+        return True
+    return False
+
+
+def _plain(value: Any) -> Any:
+    """Turn numpy/pandas scalars into plain Python values, and whole floats into ints"""
+    if hasattr(value, 'item') and not isinstance(value, (list, dict, str)):
+        try:
+            value = value.item()
+        except (ValueError, AttributeError):
+            pass
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def compact_record(record: Any, columns: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """
+    Strip a record down to what a prompt needs
+
+    Args:
+        record: A dict or pandas Series
+        columns: Whitelist of keys to keep, in order (default: all keys)
+
+    Returns:
+        dict: The kept keys with missing values (None, NaN, blanks) and
+        unnamed CSV columns dropped
+    """
+    if hasattr(record, 'to_dict'):
+        record = record.to_dict()
+    keys = columns if columns is not None else record.keys()
+    compact = {}
+    for key in keys:
+        if key not in record or not str(key).strip() or str(key).startswith('Unnamed:'):
+            continue
+        value = record[key]
+        if not _is_missing(value):
+            compact[key] = _plain(value)
+    return compact
+
+
+def compact_json(value: Any) -> str:
+    """Serialize nested data as single-line JSON, dropping null fields at every level"""
+    def strip(item):
+        if isinstance(item, dict):
+            return {k: strip(v) for k, v in item.items() if not _is_missing(v)}
+        if isinstance(item, (list, tuple)):
+            return [strip(v) for v in item]
+        return _plain(item)
+    return json.dumps(strip(value), separators=(',', ':'), ensure_ascii=False, default=str)
+
+
+def encode_record(record: Any, columns: Optional[Sequence[str]] = None) -> str:
+    """Encode one record as compact JSON with only the whitelisted, non-missing fields"""
+    return json.dumps(compact_record(record, columns), separators=(',', ':'), ensure_ascii=False, default=str)
+
+
+def encode_table(records: Iterable[Any], columns: Optional[Sequence[str]] = None) -> str:
+    """
+    Encode records as CSV with one header line, the most compact layout for a batch
+
+    Only columns with a value in at least one record are included; missing
+    values are left empty.
+
+    Args:
+        records: Dicts or pandas Series
+        columns: Whitelist of columns, in output order (default: keys in first-seen order)
+
+    Returns:
+        str: CSV text, header first
+    """
+    rows = [compact_record(record, columns) for record in records]
+    if columns is None:
+        header = list(dict.fromkeys(key for row in rows for key in row))
+    else:
+        present = set().union(*rows) if rows else set()
+        header = [column for column in columns if column in present]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(['' if row.get(column) is None else row[column] for column in header])
+    return buffer.getvalue()
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of text at CHARS_PER_TOKEN characters per token"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def split_batches(records: Sequence[Any], columns: Optional[Sequence[str]] = None,
+                  max_input_tokens: int = MAX_INPUT_TOKENS, max_output_tokens: int = MAX_OUTPUT_TOKENS,
+                  output_tokens_per_record: int = 150, max_records: Optional[int] = None,
+                  overhead_tokens: int = 0) -> List[List[Any]]:
+    """
+    Split records into batches whose prompts and responses fit a model's limits
+
+    Args:
+        records: Records to send
+        columns: Column whitelist used to encode them (as for encode_table)
+        max_input_tokens: Token budget for the encoded records of one batch
+        max_output_tokens: Response token limit of one call
+        output_tokens_per_record: Expected response tokens per record
+        max_records: Upper bound on records per batch, if any
+        overhead_tokens: Tokens of the rest of the prompt (instructions, rules)
+
+    Returns:
+        list: Batches of the original records, in order
+    """
+    per_batch = max(1, max_output_tokens // max(1, output_tokens_per_record))
+    if max_records:
+        per_batch = min(per_batch, max_records)
+    budget = max_input_tokens - overhead_tokens
+
+    batches: List[List[Any]] = []
+    batch: List[Any] = []
+    batch_tokens = 0
+    header_tokens = estimate_tokens(','.join(columns)) if columns else 0
+    for record in records:
+        tokens = estimate_tokens(encode_table([record], columns).split('\n', 1)[1])
+        if batch and (len(batch) >= per_batch or header_tokens + batch_tokens + tokens > budget):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(record)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
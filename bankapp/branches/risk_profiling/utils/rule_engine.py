@@ -0,0 +1,371 @@
+import logging
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Risk categories in increasing order of severity
+CATEGORY_LEVELS = {"Low": 1, "Medium": 2, "High": 3, "Very High": 4}
+CATEGORY_NAMES = {level: name for name, level in CATEGORY_LEVELS.items()}
+
+DEFAULT_RULES_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rules", "rules.txt")
+
+# Rule N: If <condition>, add risk score <score>, category "<category>", factor "<factor>"
+RULE_PATTERN = re.compile(
+    r'^Rule\s+(?P<number>\d+)\s*:\s*If\s+(?P<condition>.+?)\s*,\s*add\s+risk\s+score\s+(?P<score>\d+(?:\.\d+)?)\s*,'
+    r'\s*category\s+"(?P<category>[^"]+)"\s*,\s*factor\s+"(?P<factor>[^"]*)"\s*\.?\s*$',
+    re.IGNORECASE
+)
+
+TOKEN_PATTERN = re.compile(r"""
+    \s*(?:
+        (?P<number>-?\d+(?:\.\d+)?)
+      | (?P<string>'[^']*'|"[^"]*")
+      | (?P<op>==|!=|>=|<=|>|<|=)
+      | (?P<paren>[()])
+      | (?P<word>[A-Za-z_][A-Za-z0-9_]*)
+    )""", re.VERBOSE)
+
+
+class RuleSyntaxError(ValueError):
+    """Raised when a rule or condition cannot be parsed"""
+
+
+class Comparison:
+    """Leaf condition: <field> <op> <value>"""
+
+    OPERATORS = {
+        '==': np.equal, '=': np.equal, '!=': np.not_equal,
+        '>': np.greater, '>=': np.greater_equal, '<': np.less, '<=': np.less_equal,
+    }
+
+    def __init__(self, field: str, op: str, value: Any):
+        if op not in self.OPERATORS:
+            raise RuleSyntaxError(f"Unsupported operator: {op}")
+        if isinstance(value, str) and op not in ('==', '=', '!='):
+            raise RuleSyntaxError(f"Operator {op} needs a numeric value, got '{value}'")
+        self.field = field
+        self.op = op
+        self.value = value
+
+    @property
+    def fields(self):
+        return {self.field}
+
+    def evaluate(self, frame: pd.DataFrame) -> np.ndarray:
+        if self.field not in frame.columns:
+            return np.zeros(len(frame), dtype=bool)
+        column = frame[self.field]
+        if isinstance(self.value, str):
+            # Missing values match neither == nor !=
+            values = column.astype(str).str.strip().to_numpy(dtype=object)
+            result = values == self.value
+            return (~result if self.op == '!=' else result) & column.notna().to_numpy()
+        # Numeric comparison; missing or non-numeric values never match
+        values = pd.to_numeric(column, errors='coerce').to_numpy(dtype=float)
+        with np.errstate(invalid='ignore'):
+            result = self.OPERATORS[self.op](values, float(self.value))
+        return result & ~np.isnan(values)
+
+    def __repr__(self):
+        return f"{self.field} {self.op} {self.value!r}"
+
+
+class BoolOp:
+    """Compound condition: all (and) or any (or) of its operands"""
+
+    def __init__(self, op: str, operands: List[Any]):
+        self.op = op
+        self.operands = operands
+
+    @property
+    def fields(self):
+        return set().union(*(operand.fields for operand in self.operands))
+
+    def evaluate(self, frame: pd.DataFrame) -> np.ndarray:
+        combine = np.logical_and if self.op == 'and' else np.logical_or
+        result = self.operands[0].evaluate(frame)
+        for operand in self.operands[1:]:
+            result = combine(result, operand.evaluate(frame))
+        return result
+
+    def __repr__(self):
+        return '(' + f' {self.op} '.join(repr(operand) for operand in self.operands) + ')'
+
+
+class Not:
+    """Negated condition"""
+
+    def __init__(self, operand):
+        self.operand = operand
+
+    @property
+    def fields(self):
+        return self.operand.fields
+
+    def evaluate(self, frame: pd.DataFrame) -> np.ndarray:
+        # A row missing any field the operand reads is unknown, and its negation does not match either
+        known = np.ones(len(frame), dtype=bool)
+        for field in self.operand.fields:
+            if field not in frame.columns:
+                return np.zeros(len(frame), dtype=bool)
+            known &= frame[field].notna().to_numpy()
+        return ~self.operand.evaluate(frame) & known
+
+    def __repr__(self):
+        return f"not {self.operand!r}"
+
+
+def _tokenize(text: str) -> List[Tuple[str, str]]:
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN_PATTERN.match(text, position)
+        if not match or match.end() == position:
+            raise RuleSyntaxError(f"Unexpected input at '{text[position:]}'")
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        position = match.end()
+    return tokens
+
+
+class _ConditionParser:
+    """
+    Recursive-descent parser for rule conditions
+
+        condition  := and_expr ('or' and_expr)*
+        and_expr   := unary ('and' unary)*
+        unary      := 'not' unary | '(' condition ')' | comparison
+        comparison := field op value
+    """
+
+    def __init__(self, text: str):
+        self.tokens = _tokenize(text)
+        self.position = 0
+
+    def _peek(self) -> Tuple[Optional[str], Optional[str]]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def _next(self) -> Tuple[str, str]:
+        token = self._peek()
+        if token[0] is None:
+            raise RuleSyntaxError("Unexpected end of condition")
+        self.position += 1
+        return token
+
+    def _keyword(self, word: str) -> bool:
+        kind, value = self._peek()
+        if kind == 'word' and value.lower() == word:
+            self.position += 1
+            return True
+        return False
+
+    def parse(self):
+        node = self._condition()
+        if self.position != len(self.tokens):
+            raise RuleSyntaxError(f"Unexpected token '{self._peek()[1]}'")
+        return node
+
+    def _condition(self):
+        operands = [self._and_expr()]
+        while self._keyword('or'):
+            operands.append(self._and_expr())
+        return operands[0] if len(operands) == 1 else BoolOp('or', operands)
+
+    def _and_expr(self):
+        operands = [self._unary()]
+        while self._keyword('and'):
+            operands.append(self._unary())
+        return operands[0] if len(operands) == 1 else BoolOp('and', operands)
+
+    def _unary(self):
+        if self._keyword('not'):
+            return Not(self._unary())
+        if self._peek() == ('paren', '('):
+            self._next()
+            node = self._condition()
+            if self._next() != ('paren', ')'):
+                raise RuleSyntaxError("Missing closing parenthesis")
+            return node
+        return self._comparison()
+
+    def _comparison(self):
+        kind, field = self._next()
+        if kind != 'word':
+            raise RuleSyntaxError(f"Expected a field name, got '{field}'")
+        kind, op = self._next()
+        if kind != 'op':
+            raise RuleSyntaxError(f"Expected a comparison operator after {field}, got '{op}'")
+        kind, raw = self._next()
+        if kind == 'number':
+            value = float(raw)
+        elif kind == 'string':
+            value = raw[1:-1]
+        elif kind == 'word' and raw.lower() in ('true', 'false'):
+            value = 1.0 if raw.lower() == 'true' else 0.0
+        elif kind == 'word':
+            # Bare words are compared as strings, e.g. kyc_status == FULL
+            value = raw
+        else:
+            raise RuleSyntaxError(f"Expected a value after {field} {op}, got '{raw}'")
+        return Comparison(field, op, value)
+
+
+def parse_condition(text: str):
+    """
+    Compile a rule condition such as "transaction_amount > 75000 and account_age_days < 60"
+
+    Returns:
+        The condition's AST; call .evaluate(frame) for a boolean mask
+    """
+    return _ConditionParser(text).parse()
+
+
+class Rule:
+    """One compiled rule: a condition and the score, category and factor it adds"""
+
+    def __init__(self, number: int, condition, score: float, category: str, factor: str, text: str):
+        self.number = number
+        self.condition = condition
+        self.score = score
+        self.category = category
+        self.factor = factor
+        self.text = text
+
+    def __repr__(self):
+        return f"Rule {self.number}: {self.condition!r} -> {self.score} {self.category}"
+
+
+def parse_rule(line: str) -> Rule:
+    """Compile one rule line, raising RuleSyntaxError if it is malformed"""
+    match = RULE_PATTERN.match(line.strip())
+    if not match:
+        raise RuleSyntaxError(f"Not a valid rule: {line.strip()}")
+    category = match.group('category').strip()
+    if category not in CATEGORY_LEVELS:
+        raise RuleSyntaxError(f"Unknown risk category '{category}'")
+    score = float(match.group('score'))
+    return Rule(
+        number=int(match.group('number')),
+        condition=parse_condition(match.group('condition')),
+        score=int(score) if score.is_integer() else score,
+        category=category,
+        factor=match.group('factor'),
+        text=line.strip()
+    )
+
+
+class RuleSet:
+    """Compiled rule base, evaluated over whole DataFrames"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.rules: List[Rule] = []
+        self.errors: List[Tuple[str, str]] = []
+        for line in text.split('\n'):
+            line = line.strip()
+            if not line or not line.lower().startswith('rule'):
+                continue
+            try:
+                self.rules.append(parse_rule(line))
+            except RuleSyntaxError as e:
+                logger.warning("Skipping rule that failed to compile: %s (%s)", line, e)
+                self.errors.append((line, str(e)))
+
+    @property
+    def fields(self):
+        """Columns referenced by any rule"""
+        return set().union(*(rule.condition.fields for rule in self.rules)) if self.rules else set()
+
+    def evaluate(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """
+        Apply every rule to every row in one vectorized pass
+
+        Each row gets the highest score and most severe category of the
+        rules it matches, and the factors of all of them in rule order.
+
+        Args:
+            frame: Transactions
+
+        Returns:
+            DataFrame: risk_score, risk_category, risk_factors and
+            rules_matched columns, indexed like frame
+        """
+        n = len(frame)
+        scores = np.zeros(n)
+        levels = np.full(n, CATEGORY_LEVELS["Low"])
+        matched = np.zeros(n, dtype=int)
+        factors: List[List[str]] = [[] for _ in range(n)]
+        for rule in self.rules:
+            mask = rule.condition.evaluate(frame)
+            if not mask.any():
+                continue
+            scores = np.where(mask, np.maximum(scores, rule.score), scores)
+            levels = np.where(mask, np.maximum(levels, CATEGORY_LEVELS[rule.category]), levels)
+            matched += mask
+            for i in np.flatnonzero(mask):
+                factors[i].append(rule.factor)
+
+        if len(scores) and np.all(np.mod(scores, 1) == 0):
+            scores = scores.astype(int)
+        return pd.DataFrame({
+            'risk_score': scores,
+            'risk_category': [CATEGORY_NAMES[level] for level in levels],
+            'risk_factors': factors,
+            'rules_matched': matched
+        }, index=frame.index)
+
+    def evaluate_one(self, transaction) -> Dict[str, Any]:
+        """
+        Apply the rules to a single transaction
+
+        Args:
+            transaction: A transaction as a dict or pandas Series
+
+        Returns:
+            dict: risk_score, risk_category, risk_factors and rules_matched
+        """
+        if hasattr(transaction, 'to_dict'):
+            transaction = transaction.to_dict()
+        row = self.evaluate(pd.DataFrame([transaction])).iloc[0]
+        score = row['risk_score']
+        return {
+            'risk_score': score.item() if hasattr(score, 'item') else score,
+            'risk_category': row['risk_category'],
+            'risk_factors': list(row['risk_factors']),
+            'rules_matched': int(row['rules_matched'])
+        }
+
+
+_rule_sets: Dict[str, Tuple[float, RuleSet]] = {}
+_rule_sets_lock = threading.Lock()
+
+
+def load_rule_set(path: str = DEFAULT_RULES_FILE) -> RuleSet:
+    """
+    Get the compiled rules of a rule file, recompiling only when the file changes
+
+    Args:
+        path: Rule file (defaults to rules/rules.txt)
+
+    Returns:
+        RuleSet: Compiled rules, shared until the file's mtime changes
+    """
+    path = os.path.abspath(path)
+    mtime = os.path.getmtime(path)
+    cached = _rule_sets.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with _rule_sets_lock:
+        cached = _rule_sets.get(path)
+        if cached is None or cached[0] != mtime:
+            with open(path, 'r') as f:
+                cached = (mtime, RuleSet(f.read()))
+            _rule_sets[path] = cached
+    return cached[1]
@@ -0,0 +1,18 @@
+import os
+
+
+def state_path(*parts: str) -> str:
+    """
+    Get a path under the app's state directory
+
+    Caches and logs holding customer data are kept in $XDG_STATE_HOME/bankapp
+    (~/.local/state/bankapp by default) rather than in the source tree.
+
+    Args:
+        *parts: Path components below the state directory
+
+    Returns:
+        str: The joined path (directories are not created)
+    """
+    base = os.environ.get('XDG_STATE_HOME') or os.path.expanduser(os.path.join('~', '.local', 'state'))
+    return os.path.join(base, 'bankapp', *parts)
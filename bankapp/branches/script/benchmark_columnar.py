@@ -0,0 +1,77 @@
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+# Make the branches package modules importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from transaction_store import (
+    TRANSACTIONS_CSV, PRODTEST_CSV, STATISTICS_COLUMNS, COMPLIANCE_COLUMNS, columnar_path, convert_to_columnar
+)
+
+
+def _load(mode, csv_path, columns, queue):
+    """Load a table in a fresh process and report wall time and peak RSS growth"""
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if mode == 'csv':
+        frame = pd.read_csv(csv_path)
+    elif mode == 'csv-usecols':
+        wanted = set(columns)
+        frame = pd.read_csv(csv_path, usecols=lambda c: c in wanted)
+    else:
+        frame = pd.read_feather(columnar_path(csv_path), columns=columns)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in KB on Linux
+    queue.put((elapsed, (peak - baseline) / 1024, len(frame)))
+
+
+def measure(mode, csv_path, columns, repeat):
+    """Run a loader `repeat` times in separate processes and return the best run"""
+    runs = []
+    for _ in range(repeat):
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_load, args=(mode, csv_path, columns, queue))
+        process.start()
+        runs.append(queue.get())
+        process.join()
+    return min(runs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare CSV and Feather load time and memory")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per loader (best is reported)")
+    args = parser.parse_args()
+
+    cases = [
+        ("get_transaction_statistics", TRANSACTIONS_CSV, STATISTICS_COLUMNS),
+        ("compliance_dashboard", PRODTEST_CSV, COMPLIANCE_COLUMNS),
+    ]
+
+    print(f"{'view':<28} {'loader':<14} {'rows':>10} {'time (s)':>10} {'RSS (MB)':>10}")
+    for name, csv_path, columns in cases:
+        if not os.path.exists(csv_path):
+            print(f"{name:<28} skipped: {csv_path} not found")
+            continue
+        if not os.path.exists(columnar_path(csv_path)):
+            convert_to_columnar(csv_path)
+
+        results = {}
+        for mode in ('csv', 'csv-usecols', 'feather'):
+            elapsed, rss, rows = measure(mode, csv_path, columns, args.repeat)
+            results[mode] = (elapsed, rss)
+            print(f"{name:<28} {mode:<14} {rows:>10} {elapsed:>10.3f} {rss:>10.1f}")
+
+        csv_time, csv_rss = results['csv']
+        feather_time, feather_rss = results['feather']
+        print(f"{name:<28} {'speedup':<14} {'':>10} {csv_time / max(feather_time, 1e-9):>9.1f}x "
+              f"{csv_rss / max(feather_rss, 1e-9):>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
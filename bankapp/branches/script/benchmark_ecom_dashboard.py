@@ -0,0 +1,79 @@
+import argparse
+import os
+import sys
+import time
+
+# Make the branches package modules importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from ecommerce_utils import ecommerce_dashboard_stats
+
+
+def generate_orders(n_rows, seed=0):
+    """Generate synthetic orders with the columns of generated_ecommerce_data.csv"""
+    rng = np.random.default_rng(seed)
+    order_amount = rng.uniform(100, 12000, n_rows).round(2)
+    timestamps = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365 * 24 * 3600, n_rows), unit='s')
+    return pd.DataFrame({
+        'transaction_id': np.arange(n_rows),
+        'customer_id': rng.integers(10000, 99999, n_rows),
+        'timestamp': timestamps.strftime('%Y-%m-%d %H:%M:%S'),
+        'order_amount': order_amount,
+        'new_amount': (order_amount * rng.uniform(0.7, 1.0, n_rows)).round(2),
+        'payment_method': rng.integers(0, 5, n_rows),
+        'ip_address': np.where(rng.random(n_rows) < 0.05, '200.1.1.1', '10.0.0.1'),
+        'country': np.where(rng.random(n_rows) < 0.8, 'India', 'Russia'),
+        'coupon_used': np.where(rng.random(n_rows) < 0.3, 'YES', 'NO'),
+    })
+
+
+def legacy_dashboard_stats(df):
+    """The ecom_dashboard implementation before vectorization (row-wise apply and full sorts)"""
+    df = df.copy()
+    df['is_fraud'] = (df['payment_method'] == 0) | (df['ip_address'].str.startswith('200.')) | \
+                     ((df['order_amount'] > 9000) & (df['country'] != 'India'))
+    total_transactions = len(df)
+    fraud_transactions = df[df['is_fraud']].shape[0]
+    avg_risk_score = df.apply(lambda row: 80 if row['is_fraud'] else 25 + (row['order_amount'] / 10000 * 30), axis=1).mean()
+    df['is_chargeback'] = ((df['order_amount'] - df['new_amount']) / df['order_amount'] > 0.1) & (df['coupon_used'] == 'YES')
+    chargebacks = df[df['is_chargeback']].shape[0]
+    df['risk_score'] = df.apply(lambda row: 85 + np.random.randint(0, 15) if row['is_fraud']
+                                else 20 + np.random.randint(0, 40), axis=1)
+    high_risk_alerts = []
+    for _, row in df.sort_values(by='risk_score', ascending=False).head(3).iterrows():
+        high_risk_alerts.append({'transaction_id': row['transaction_id'], 'risk_score': int(row['risk_score'])})
+    recent_transactions = []
+    for _, row in df.sort_values(by='timestamp', ascending=False).head(10).iterrows():
+        recent_transactions.append({'transaction_id': row['transaction_id'], 'risk_score': int(row['risk_score'])})
+    return total_transactions, fraud_transactions, avg_risk_score, chargebacks, high_risk_alerts, recent_transactions
+
+
+def timed(func, *args):
+    """Run func once and return the elapsed wall time in seconds"""
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare legacy and vectorized ecom_dashboard scoring")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Number of synthetic orders")
+    parser.add_argument("--skip-legacy", action="store_true", help="Only time the vectorized implementation")
+    args = parser.parse_args()
+
+    df = generate_orders(args.rows)
+    print(f"Generated {len(df):,} orders")
+
+    vectorized = timed(ecommerce_dashboard_stats, df)
+    print(f"vectorized: {vectorized * 1000:10.1f} ms")
+
+    if not args.skip_legacy:
+        legacy = timed(legacy_dashboard_stats, df)
+        print(f"legacy:     {legacy * 1000:10.1f} ms")
+        print(f"speedup:    {legacy / max(vectorized, 1e-9):10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import argparse
+import os
+import sys
+import time
+
+# Make the branches package modules importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transaction_store import (
+    TRANSACTIONS_CSV, PRODTEST_CSV, ECOMMERCE_CSV, CHAT_TRANSACTIONS_CSV, convert_to_columnar
+)
+
+DEFAULT_FILES = [TRANSACTIONS_CSV, PRODTEST_CSV, ECOMMERCE_CSV, CHAT_TRANSACTIONS_CSV]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write typed Feather copies of the branch transaction CSVs")
+    parser.add_argument("csv_files", nargs="*", default=DEFAULT_FILES,
+                        help="CSV files to convert (defaults to all branch data files)")
+    args = parser.parse_args()
+
+    for csv_path in args.csv_files:
+        if not os.path.exists(csv_path):
+            print(f"[skip] {csv_path} not found")
+            continue
+
+        start = time.perf_counter()
+        output_path = convert_to_columnar(csv_path)
+        elapsed = time.perf_counter() - start
+
+        csv_size = os.path.getsize(csv_path) / 1e6
+        columnar_size = os.path.getsize(output_path) / 1e6
+        print(f"[ok] {csv_path} ({csv_size:.1f} MB) -> {output_path} ({columnar_size:.1f} MB) in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
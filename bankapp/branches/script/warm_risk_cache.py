@@ -0,0 +1,56 @@
+import argparse
+import os
+import sys
+import time
+
+# Make the branches package modules importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transaction_store import PRODTEST_CSV, COMPLIANCE_COLUMNS, load_transactions
+from risk_cache import get_risk_cache, transaction_fingerprints
+from risk_dispatcher import (
+    assess_transactions, RISK_CHUNK_SIZE, RISK_MAX_WORKERS, RISK_REQUESTS_PER_MINUTE, RISK_MAX_RETRIES
+)
+from risk_profiling.agents.risk_assessment_gemini import GeminiRiskAssessmentAgent, RISK_RULES
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Assess every uncached compliance transaction with Gemini")
+    parser.add_argument("--csv", default=PRODTEST_CSV, help="Transactions CSV (default: prodtest.csv)")
+    parser.add_argument("--limit", type=int, default=None, help="Only warm the first N transactions")
+    parser.add_argument("--chunk-size", type=int, default=RISK_CHUNK_SIZE, help="Transactions per Gemini request")
+    parser.add_argument("--workers", type=int, default=RISK_MAX_WORKERS, help="Concurrent Gemini requests")
+    parser.add_argument("--rpm", type=float, default=RISK_REQUESTS_PER_MINUTE, help="Gemini requests per minute")
+    parser.add_argument("--retries", type=int, default=RISK_MAX_RETRIES, help="Retries per chunk after a 429")
+    args = parser.parse_args()
+
+    # Build rows exactly as compliance_dashboard does, so fingerprints match
+    transactions_df = load_transactions(args.csv, columns=COMPLIANCE_COLUMNS)
+    if 'transaction_id' not in transactions_df.columns:
+        transactions_df['transaction_id'] = transactions_df.index.astype(str)
+    transactions = transactions_df.to_dict('records')
+    if args.limit is not None:
+        transactions = transactions[:args.limit]
+
+    risk_cache = get_risk_cache()
+    fingerprints = transaction_fingerprints(transactions, RISK_RULES)
+    cached = risk_cache.get_many(fingerprints)
+    pending = [t for t in transactions if str(t.get('transaction_id', '')) not in cached]
+    print(f"{len(transactions)} transactions: {len(cached)} already cached, {len(pending)} to assess")
+    if not pending:
+        return
+
+    start = time.perf_counter()
+    summary = assess_transactions(
+        pending, GeminiRiskAssessmentAgent(), risk_cache, fingerprints,
+        chunk_size=args.chunk_size, max_workers=args.workers,
+        requests_per_minute=args.rpm, max_retries=args.retries
+    )
+    elapsed = time.perf_counter() - start
+    print(f"Assessed {summary['assessed']} ({summary['failed']} failed, {summary['cached']} cached) "
+          f"in {summary['chunks']} chunks over {elapsed:.1f}s "
+          f"({summary['assessed'] / max(elapsed, 1e-9):.1f} transactions/sec)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,837 @@
-from django.test import TestCase
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+
+from . import risk_dispatcher, transaction_store
+from .chat_analytics import AnalyticsCube, get_cube, match_intent
+from .code_sandbox import SandboxPool, check_code
+from .compliance_stats import AppendedRowCounter
+from .ecommerce_utils import ecommerce_dashboard_stats, score_orders
+from .formatting import format_compliance_page
+from .middleware import has_staff_role
+from .neo4j_pool import InstrumentedDriver
+from .neo4j_utils import _transaction_key, bulk_load_transaction_graph, create_transaction_graph, load_transaction_data
+from .pagination import decode_cursor, encode_cursor, keyset_page
+from .query_classifier import NO_TRANSACTIONS, TRANSACTIONS, QueryClassificationCache, classify_locally
+from .risk_cache import RiskAssessmentCache, transaction_fingerprints
+from .risk_profiling.utils.prompt_encoder import compact_record, encode_table, estimate_tokens, split_batches
+from .risk_profiling.utils.rule_engine import RuleSet, RuleSyntaxError, parse_condition, parse_rule
+from .transaction_store import (COLUMNAR_AVAILABLE, columnar_path, convert_to_columnar, get_store,
+                                load_customer_transactions, load_transactions, read_table, shared_store)
+
+
+class TransactionStoreTestCase(SimpleTestCase):
+    """Writes a small transactions CSV to a temporary directory"""
+
+    rows = {
+        'transaction_id': ['T1', 'T2', 'T3', 'T4'],
+        'customer_id': [1, 2, 1, 3],
+        'transaction_amount': [10.0, 20.0, 30.0, 40.0],
+        'timestamp': ['01-01-2024 10:00', '02-01-2024 11:30', '03-01-2024 09:15', '04-01-2024 18:45'],
+    }
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.csv_path = os.path.join(directory.name, 'transactions.csv')
+        self.write(self.rows)
+        self.addCleanup(self.forget_stores)
+
+    def write(self, rows, mtime=None):
+        pd.DataFrame(rows).to_csv(self.csv_path, index=False)
+        if mtime is not None:
+            os.utime(self.csv_path, (mtime, mtime))
+
+    def forget_stores(self):
+        with transaction_store._stores_lock:
+            for key in [k for k in transaction_store._stores if k[0] == self.csv_path]:
+                del transaction_store._stores[key]
+
+
+class TransactionStoreSharingTests(TransactionStoreTestCase):
+    def test_subset_store_used_until_full_file_is_loaded(self):
+        store, project = shared_store(self.csv_path, ['transaction_amount', 'transaction_id'])
+        self.assertIsNone(project)
+        self.assertEqual(list(store.frame().columns), ['transaction_id', 'transaction_amount'])
+
+    def test_subset_projected_from_full_store(self):
+        subset = get_store(self.csv_path, ['transaction_id'])
+        full = get_store(self.csv_path)
+        self.assertNotIn((self.csv_path, ('transaction_id',)), transaction_store._stores)
+
+        store, project = shared_store(self.csv_path, ['transaction_amount', 'transaction_id'])
+        self.assertIs(store, full)
+        self.assertIsNot(store, subset)
+        # Columns come back in file order, as a subset read would return them
+        frame = load_transactions(self.csv_path, columns=['transaction_amount', 'transaction_id'])
+        self.assertEqual(list(frame.columns), ['transaction_id', 'transaction_amount'])
+        self.assertEqual(frame['transaction_amount'].tolist(), [10.0, 20.0, 30.0, 40.0])
+
+    def test_frame_reloaded_only_when_file_changes(self):
+        self.write(self.rows, mtime=1_700_000_000)
+        store = get_store(self.csv_path)
+        frame = store.frame()
+        version = store.version
+        self.assertIs(store.frame(), frame)
+
+        rows = {column: values + values[-1:] for column, values in self.rows.items()}
+        self.write(rows, mtime=1_700_000_100)
+        self.assertEqual(len(store.frame()), 5)
+        self.assertNotEqual(store.version, version)
+
+
+class CustomerIndexTests(TransactionStoreTestCase):
+    rows = dict(TransactionStoreTestCase.rows, customer_account_number=['A-17', '1002', 'A-17', '1003'])
+
+    def ids(self, frame):
+        return frame['transaction_id'].tolist()
+
+    def test_numeric_column_matches_string_id(self):
+        frame = load_customer_transactions('1', self.csv_path, key_columns=('customer_id',))
+        self.assertEqual(self.ids(frame), ['T1', 'T3'])
+        self.assertEqual(self.ids(load_customer_transactions(1, self.csv_path, key_columns=('customer_id',))),
+                         ['T1', 'T3'])
+
+    def test_string_column_matched_on_raw_key(self):
+        # '1002' must not be coerced to 1002 before looking in a string column
+        self.assertEqual(self.ids(load_customer_transactions('1002', self.csv_path)), ['T2'])
+        self.assertEqual(self.ids(load_customer_transactions('A-17', self.csv_path)), ['T1', 'T3'])
+
+    def test_falls_back_to_next_key_column(self):
+        self.assertEqual(self.ids(load_customer_transactions('3', self.csv_path)), ['T4'])
+
+    def test_unknown_customer_and_projection(self):
+        frame = load_customer_transactions('A-17', self.csv_path,
+                                           columns=['transaction_amount', 'transaction_id', 'customer_account_number'])
+        self.assertEqual(list(frame.columns), ['transaction_id', 'transaction_amount', 'customer_account_number'])
+        self.assertEqual(frame['transaction_amount'].tolist(), [10.0, 30.0])
+        self.assertTrue(load_customer_transactions('nobody', self.csv_path).empty)
+
+    def test_index_rebuilt_after_reload(self):
+        self.write(self.rows, mtime=1_700_000_000)
+        self.assertEqual(self.ids(load_customer_transactions('1003', self.csv_path)), ['T4'])
+        rows = {column: values + values[-1:] for column, values in self.rows.items()}
+        rows['transaction_id'][-1] = 'T5'
+        self.write(rows, mtime=1_700_000_100)
+        self.assertEqual(self.ids(load_customer_transactions('1003', self.csv_path)), ['T4', 'T5'])
+
+
+@unittest.skipUnless(COLUMNAR_AVAILABLE, "pyarrow is not installed")
+class ColumnarCopyTests(TransactionStoreTestCase):
+    def setUp(self):
+        super().setUp()
+        frame = pd.DataFrame(self.rows)
+        frame['Unnamed: 4'] = np.nan
+        frame.to_csv(self.csv_path, index=False)
+        os.utime(self.csv_path, (1_700_000_000, 1_700_000_000))
+
+    def test_convert_drops_blank_columns_and_sorts_stably(self):
+        path = convert_to_columnar(self.csv_path, sort_by='customer_id')
+        self.assertEqual(path, columnar_path(self.csv_path))
+        frame = pd.read_feather(path)
+        self.assertNotIn('Unnamed: 4', frame.columns)
+        self.assertEqual(frame['transaction_id'].tolist(), ['T1', 'T3', 'T2', 'T4'])
+
+    def test_fresh_copy_preferred_and_projected(self):
+        convert_to_columnar(self.csv_path, sort_by='customer_id')
+        frame = read_table(self.csv_path, columns=['transaction_id', 'no_such_column'])
+        self.assertEqual(list(frame.columns), ['transaction_id'])
+        self.assertEqual(frame['transaction_id'].tolist(), ['T1', 'T3', 'T2', 'T4'])
+
+    def test_stale_copy_ignored(self):
+        path = convert_to_columnar(self.csv_path, sort_by='customer_id')
+        os.utime(path, (1_600_000_000, 1_600_000_000))
+        frame = read_table(self.csv_path, columns=['transaction_id', 'no_such_column'])
+        self.assertEqual(frame['transaction_id'].tolist(), ['T1', 'T2', 'T3', 'T4'])
+
+
+@unittest.skipUnless(COLUMNAR_AVAILABLE and hasattr(pd, 'ArrowDtype'), "pyarrow or pandas.ArrowDtype is unavailable")
+class MemoryMappedStoreTests(TransactionStoreTestCase):
+    def test_mapped_read_matches_in_memory_read(self):
+        convert_to_columnar(self.csv_path)
+        mapped = read_table(self.csv_path, memory_map=True)
+        self.assertIsInstance(mapped['transaction_id'].dtype, pd.ArrowDtype)
+        pd.testing.assert_frame_equal(mapped.astype({'transaction_id': object, 'timestamp': object}),
+                                      read_table(self.csv_path), check_dtype=False)
+
+    def test_store_uses_mapped_copy_and_its_indexes(self):
+        convert_to_columnar(self.csv_path)
+        with mock.patch.object(transaction_store, 'STORE_BACKEND', 'mmap'):
+            store = get_store(self.csv_path)
+            frame = store.frame()
+        self.assertIsInstance(frame['timestamp'].dtype, pd.ArrowDtype)
+        self.assertEqual(store.version[1], os.path.getmtime(columnar_path(self.csv_path)))
+        self.assertEqual(store.customer_transactions('1', key_columns=('customer_id',))['transaction_id'].tolist(),
+                         ['T1', 'T3'])
+        self.assertEqual(store.timestamps().dt.day.tolist(), [1, 2, 3, 4])
+
+
+class EcommerceScoringTests(SimpleTestCase):
+    def orders(self, n, start=0):
+        ids = range(start, start + n)
+        return pd.DataFrame({
+            'transaction_id': [f'ORD{i:05d}' for i in ids],
+            'customer_id': [10000 + i for i in ids],
+            'timestamp': [f'2024-01-{1 + i % 28:02d} 10:00:00' for i in ids],
+            'order_amount': [100.0 + i for i in ids],
+            'new_amount': [95.0 + i for i in ids],
+            'payment_method': [i % 3 for i in ids],
+            'ip_address': ['10.0.0.1'] * n,
+            'country': ['India'] * n,
+            'coupon_used': ['NO'] * n,
+        })
+
+    def test_scores_stable_when_orders_are_added_or_reordered(self):
+        orders = self.orders(20)
+        before = score_orders(orders).set_index('transaction_id')['risk_score']
+        grown = pd.concat([self.orders(5, start=100), orders.iloc[::-1]], ignore_index=True)
+        after = score_orders(grown).set_index('transaction_id')['risk_score']
+        pd.testing.assert_series_equal(after.loc[before.index], before)
+
+    def test_scores_within_simulated_ranges(self):
+        scored = score_orders(self.orders(200))
+        fraud = scored['is_fraud']
+        self.assertTrue(scored.loc[fraud, 'risk_score'].between(85, 99).all())
+        self.assertTrue(scored.loc[~fraud, 'risk_score'].between(20, 59).all())
+        self.assertFalse(score_orders(self.orders(200), seed=7)['risk_score'].equals(scored['risk_score']))
+
+    def test_recent_orders_parse_mixed_timestamp_layouts(self):
+        orders = self.orders(12)
+        orders.loc[0, 'timestamp'] = '31-12-2024 23:00'
+        orders.loc[1, 'timestamp'] = '30/12/2024 08:00:00'
+        recent = ecommerce_dashboard_stats(orders)['recent_transactions']
+        self.assertEqual([r['transaction_id'] for r in recent[:2]], ['ORD00000', 'ORD00001'])
+
+
+class RecordingTransaction:
+    def __init__(self, session):
+        self.session = session
+
+    def run(self, query, **parameters):
+        self.session.batches.append((' '.join(query.split()), parameters['rows']))
+        return mock.Mock()
+
+    def commit(self):
+        self.session.commits += 1
+
+    def rollback(self):
+        pass
+
+
+class RecordingSession:
+    """Stands in for a Neo4j session, recording the UNWIND batches it is sent"""
+
+    def __init__(self, stored_ids=()):
+        self.batches = []
+        self.commits = 0
+        self.stored_ids = list(stored_ids)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def begin_transaction(self):
+        return RecordingTransaction(self)
+
+    def run(self, query, **parameters):
+        # Only the synced transaction_id lookup reads results
+        return mock.Mock(single=mock.Mock(return_value={'transaction_ids': self.stored_ids}))
+
+
+class GraphBulkLoadTests(TransactionStoreTestCase):
+    rows = {
+        'transaction_id': ['T1', None, None, 'T4'],
+        'customer_account_number': [500, 500, 500, 600],
+        'counterparty_account_number': [900, None, None, 900],
+        'transaction_amount': [-10.0, 20.0, 20.0, 5.0],
+        'transaction_currency': ['INR'] * 4,
+        'method_of_transaction': ['UPI'] * 4,
+        'location_data': ['Pune'] * 4,
+        'label_for_fraud': [0, 1, 1, 0],
+        'timestamp': ['01-01-2024 10:00'] * 4,
+    }
+
+    def connection(self, stored_ids=()):
+        session = RecordingSession(stored_ids)
+        return mock.Mock(driver=mock.Mock(session=mock.Mock(return_value=session))), session
+
+    def test_transaction_key_derives_stable_ids_for_missing_ids(self):
+        row = pd.Series({'transaction_id': np.nan, 'transaction_amount': 20.0})
+        seen = {}
+        first, second = _transaction_key(row, seen), _transaction_key(row, seen)
+        self.assertTrue(first.startswith('DERIVED_'))
+        self.assertEqual(second, f"{first}_2")
+        self.assertEqual(_transaction_key(row, {}), first)
+        self.assertEqual(_transaction_key(pd.Series({'transaction_id': 'T9'}), seen), 'T9')
+
+    def test_rows_without_ids_get_distinct_relationships(self):
+        data = load_transaction_data(500, self.csv_path)
+        ids = [rel['properties']['transaction_id'] for rel in data['relationships']]
+        self.assertEqual(ids[0], 'T1')
+        self.assertEqual(len(set(ids)), 3)
+        # Missing counterparties get a per-transaction placeholder account
+        self.assertEqual(data['relationships'][1]['start_node'], f"ACC_{ids[1]}")
+        self.assertEqual(data['statistics']['fraud_transactions'], 2)
+
+    def test_bulk_load_batches_by_label(self):
+        data = load_transaction_data(500, self.csv_path)
+        # The customer also appearing as a counterparty keeps its Customer label
+        data['nodes'].append({'id': '500', 'labels': ['Account'], 'properties': {'account_number': '500'}})
+        conn, session = self.connection()
+        result = bulk_load_transaction_graph(conn, data, batch_size=2)
+        self.assertEqual((result['nodes'], result['relationships']), (4, 3))
+
+        node_batches = [(q, rows) for q, rows in session.batches if 'MERGE (n:' in q]
+        self.assertEqual([len(rows) for _, rows in node_batches], [1, 2, 1])
+        self.assertIn('MERGE (n:Customer', node_batches[0][0])
+        self.assertEqual(node_batches[0][1][0]['account_number'], '500')
+        rel_rows = [row for q, rows in session.batches if 'MERGE (a)-[r:TRANSACTION' in q for row in rows]
+        self.assertEqual(sorted(row['transaction_id'] for row in rel_rows)[-1], 'T1')
+        self.assertTrue(all('transaction_id' not in row['properties'] for row in rel_rows))
+        self.assertEqual(session.commits, len(session.batches))
+
+    def pushed_ids(self, session):
+        return sorted(row['transaction_id'] for q, rows in session.batches if 'TRANSACTION' in q for row in rows)
+
+    def test_incremental_sync_pushes_what_neo4j_lacks(self):
+        data = load_transaction_data(500, self.csv_path)
+        ids = sorted(rel['properties']['transaction_id'] for rel in data['relationships'])
+
+        conn, session = self.connection(stored_ids=ids)
+        self.assertTrue(create_transaction_graph(conn, data))
+        self.assertEqual(session.batches, [])
+
+        # The delta is read from Neo4j on every sync, so deletions elsewhere are noticed
+        conn, session = self.connection(stored_ids=['T1'])
+        self.assertTrue(create_transaction_graph(conn, data))
+        self.assertEqual(self.pushed_ids(session), [i for i in ids if i != 'T1'])
+
+
+class InstrumentedDriverTests(SimpleTestCase):
+    def test_sessions_and_transaction_starts_are_counted(self):
+        driver = InstrumentedDriver(mock.Mock())
+        with driver.session(database='neo4j') as session:
+            session.begin_transaction()
+            session.begin_transaction()
+            self.assertEqual(driver.snapshot()['open_sessions'], 1)
+        session.close()
+        stats = driver.snapshot()
+        self.assertEqual((stats['sessions'], stats['open_sessions'], stats['transactions']), (1, 0, 2))
+        driver.driver.session.assert_called_once_with(database='neo4j')
+        driver.verify_connectivity()
+        driver.driver.verify_connectivity.assert_called_once_with()
+
+    def test_counters_consistent_across_threads(self):
+        driver = InstrumentedDriver(mock.Mock())
+
+        def work():
+            for _ in range(200):
+                with driver.session() as session:
+                    session.begin_transaction()
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = driver.snapshot()
+        self.assertEqual((stats['sessions'], stats['open_sessions'], stats['transactions']), (1600, 0, 1600))
+
+
+class RiskAssessmentCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache', 'assessments.sqlite3')
+
+    def transactions(self, scores):
+        return [{'transaction_id': f'T{i}', 'transaction_amount': 100 + i, 'risk_score': score,
+                 'risk_category': 'High' if score >= 70 else 'Low', 'risk_explanation': 'x'}
+                for i, score in enumerate(scores)]
+
+    def store(self, cache, transactions):
+        fingerprints = transaction_fingerprints(transactions, 'rules')
+        cache.put_many(fingerprints, transactions)
+        return fingerprints
+
+    def test_hits_require_matching_fingerprint(self):
+        cache = RiskAssessmentCache(self.path)
+        transactions = self.transactions([80, 20])
+        fingerprints = self.store(cache, transactions)
+        self.assertEqual(cache.get_many(fingerprints)['T0']['risk_score'], 80)
+        edited = dict(transactions[0], transaction_amount=999)
+        self.assertEqual(cache.get_many(transaction_fingerprints([edited], 'rules')), {})
+        self.assertEqual(cache.get_many(transaction_fingerprints(transactions, 'new rules')), {})
+
+    def test_expired_entries_missed_and_swept(self):
+        cache = RiskAssessmentCache(self.path, ttl=60)
+        fingerprints = self.store(cache, self.transactions([80, 20]))
+        with mock.patch('time.time', return_value=time.time() + 120):
+            self.assertEqual(cache.get_many(fingerprints), {})
+            cache.evict()
+        self.assertEqual(cache.totals()['scored'], 0)
+
+    def test_least_recently_used_evicted_past_max_entries(self):
+        cache = RiskAssessmentCache(self.path, max_entries=3)
+        now = time.time()
+        with mock.patch('time.time', return_value=now - 30):
+            fingerprints = self.store(cache, self.transactions([10, 20, 30]))
+        with mock.patch('time.time', return_value=now - 20):
+            cache.get_many({'T0': fingerprints['T0']})
+
+        # Below the limit and between sweeps, writes never run the eviction queries
+        with mock.patch.object(cache, 'evict', wraps=cache.evict) as evict:
+            self.store(cache, self.transactions([10, 20, 35])[2:])
+            evict.assert_not_called()
+
+        more = [dict(t, transaction_id=f'N{i}') for i, t in enumerate(self.transactions([40]))]
+        fingerprints.update(self.store(cache, more))
+        self.assertEqual(cache.totals()['scored'], 3)
+        self.assertEqual(sorted(cache.get_many(fingerprints)), ['N0', 'T0', 'T2'])
+
+    def test_totals_follow_replacements_and_invalidation(self):
+        cache = RiskAssessmentCache(self.path)
+        self.store(cache, self.transactions([80, 20, 75]))
+        self.assertEqual(cache.totals(), {'scored': 3, 'risk_sum': 175, 'high_risk': 2})
+        # A re-assessed transaction replaces its earlier entry
+        self.store(cache, self.transactions([10]))
+        self.assertEqual(cache.totals(), {'scored': 3, 'risk_sum': 105, 'high_risk': 1})
+        cache.invalidate(['T1'])
+        self.assertEqual(cache.totals(), {'scored': 2, 'risk_sum': 85, 'high_risk': 1})
+        fallback = [dict(t, risk_fallback=True) for t in self.transactions([50])]
+        self.assertEqual(cache.put_many(transaction_fingerprints(fallback, 'rules'), fallback), 0)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(round(seconds, 6))
+        self.now += seconds
+
+
+class RateLimitedError(Exception):
+    code = 429
+
+
+class RiskDispatcherTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        for name in ('monotonic', 'sleep'):
+            patcher = mock.patch.object(risk_dispatcher.time, name, getattr(self.clock, name))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def transactions(self, n):
+        return [{'transaction_id': f'T{i}'} for i in range(n)]
+
+    def test_rate_limiter_allows_burst_then_paces(self):
+        limiter = risk_dispatcher.RateLimiter(per_minute=60, burst=2)
+        for _ in range(4):
+            limiter.acquire()
+        self.assertEqual(self.clock.sleeps, [1.0, 1.0])
+
+    def test_rate_limited_chunks_retried_with_backoff(self):
+        agent = mock.Mock()
+        agent.request_risk_assessments.side_effect = [
+            RateLimitedError('429 RESOURCE_EXHAUSTED'), RateLimitedError('quota'),
+            {'T0': {'risk_score': 80, 'risk_category': 'High', 'risk_explanation': 'x'}},
+        ]
+        transactions = self.transactions(2)
+        with mock.patch.object(risk_dispatcher.random, 'random', return_value=0.5):
+            summary = risk_dispatcher.assess_transactions(transactions, agent, chunk_size=10,
+                                                          requests_per_minute=6000, max_retries=3)
+        self.assertEqual(self.clock.sleeps, [1.0, 2.0])
+        self.assertEqual((summary['assessed'], summary['failed']), (2, 0))
+        self.assertEqual(transactions[0]['risk_score'], 80)
+        # The transaction the model skipped gets the fallback assessment
+        self.assertEqual((transactions[1]['risk_score'], transactions[1]['risk_category']),
+                         (risk_dispatcher.FALLBACK_RISK_SCORE, risk_dispatcher.FALLBACK_RISK_CATEGORY))
+        self.assertTrue(transactions[1]['risk_fallback'])
+
+    def test_failed_chunks_fall_back_and_are_not_cached(self):
+        agent = mock.Mock()
+        agent.request_risk_assessments.side_effect = ValueError('bad response')
+        cache = mock.Mock()
+        transactions = self.transactions(3)
+        summary = risk_dispatcher.assess_transactions(transactions, agent, cache, {}, chunk_size=2,
+                                                      requests_per_minute=6000)
+        self.assertEqual((summary['chunks'], summary['failed'], summary['cached']), (2, 3, 0))
+        self.assertEqual(agent.request_risk_assessments.call_count, 2)
+        self.assertTrue(all(t['risk_fallback'] and 'bad response' in t['risk_explanation'] for t in transactions))
+        cache.put_many.assert_not_called()
+
+
+class AppendedRowCounterTests(SimpleTestCase):
+    header = 'transaction_id,smurfing_indicator,previous_fraud_flag,note\n'
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'prodtest.csv')
+        self.write(self.header + 'T1,1,0,a\nT2,0,1,b\n')
+        self.counter = AppendedRowCounter(self.path)
+
+    def write(self, text, mode='w'):
+        with open(self.path, mode) as f:
+            f.write(text)
+
+    def test_only_appended_rows_are_parsed(self):
+        self.assertEqual(self.counter.update(), {'rows': 2, 'smurfing_indicator': 1, 'previous_fraud_flag': 1})
+        # Appended rows may leave out trailing empty fields
+        self.write('T3,1,1\nT4,1,0,d\n', mode='a')
+        with mock.patch.object(self.counter, '_count', wraps=self.counter._count) as count:
+            self.assertEqual(self.counter.update(), {'rows': 4, 'smurfing_indicator': 3, 'previous_fraud_flag': 2})
+        self.assertEqual(count.call_args.args[0], b'T3,1,1\nT4,1,0,d\n')
+
+    def test_partial_line_counted_once_complete(self):
+        self.counter.update()
+        self.write('T3,1,', mode='a')
+        self.assertEqual(self.counter.update()['rows'], 2)
+        self.write('1,c\n', mode='a')
+        self.assertEqual(self.counter.update(), {'rows': 3, 'smurfing_indicator': 2, 'previous_fraud_flag': 2})
+
+    def test_rewritten_file_is_recounted(self):
+        self.counter.update()
+        self.write(self.header + 'T1,0,0,a\nT2,0,1,b\nT3,0,0,c\n')
+        self.assertEqual(self.counter.update(), {'rows': 3, 'smurfing_indicator': 0, 'previous_fraud_flag': 1})
+        self.write(self.header + 'T9,1,1,z\n')
+        self.assertEqual(self.counter.update(), {'rows': 1, 'smurfing_indicator': 1, 'previous_fraud_flag': 1})
+
+
+class KeysetPaginationTests(SimpleTestCase):
+    def pages(self, frame, key, limit):
+        """Walk every chunk, returning the key values in the order served"""
+        served, cursor = [], None
+        while True:
+            page = keyset_page(frame, key, cursor, limit)
+            served += [row[key] for row in page['rows']]
+            cursor = page['next_cursor']
+            if cursor is None:
+                return served
+
+    def test_cursor_round_trip(self):
+        state = {'key': 'transaction_id', 'kind': 'number', 'after': 12, 'skip': 1}
+        self.assertEqual(decode_cursor(encode_cursor(state)), state)
+
+    def test_malformed_cursors_are_rejected(self):
+        for cursor in ('not base64!', encode_cursor({'after': 1, 'skip': 'x'}),
+                       encode_cursor({'after': [1], 'skip': 0}), encode_cursor({'after': 1, 'skip': -1})):
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(decode_cursor(cursor))
+
+    def test_invalid_cursor_restarts_from_first_chunk(self):
+        frame = pd.DataFrame({'transaction_id': ['1', '2', '3']})
+        cursor = encode_cursor({'key': 'transaction_id', 'kind': 'number', 'after': 'x', 'skip': 0})
+        self.assertEqual(keyset_page(frame, 'transaction_id', cursor, 2)['rows'][0]['transaction_id'], '1')
+
+    def test_numeric_ids_sort_numerically(self):
+        frame = pd.DataFrame({'transaction_id': [str(i) for i in range(12, 0, -1)]})
+        self.assertEqual(self.pages(frame, 'transaction_id', 5), [str(i) for i in range(1, 13)])
+
+    def test_day_first_timestamps_sort_chronologically(self):
+        frame = pd.DataFrame({'timestamp': ['02-01-2023 10:00', '01-02-2023 10:00', '15-01-2023 10:00', None]})
+        self.assertEqual(self.pages(frame, 'timestamp', 1),
+                         ['02-01-2023 10:00', '15-01-2023 10:00', '01-02-2023 10:00', None])
+
+    def test_duplicate_keys_are_resumed_without_repeats(self):
+        frame = pd.DataFrame({'transaction_id': [1, 2, 2, 2, 3], 'row': range(5)})
+        served, cursor = [], None
+        while True:
+            page = keyset_page(frame, 'transaction_id', cursor, 2)
+            served += [row['row'] for row in page['rows']]
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(served, [0, 1, 2, 3, 4])
+
+    def test_appended_rows_do_not_shift_pages(self):
+        frame = pd.DataFrame({'transaction_id': [str(i) for i in range(1, 7)]})
+        first = keyset_page(frame, 'transaction_id', None, 3)
+        appended = pd.concat([frame, pd.DataFrame({'transaction_id': ['0', '7']})], ignore_index=True)
+        second = keyset_page(appended, 'transaction_id', first['next_cursor'], 3)
+        self.assertEqual([row['transaction_id'] for row in second['rows']], ['4', '5', '6'])
+        self.assertEqual(second['total'], 8)
+
+
+class StaffRoleTests(SimpleTestCase):
+    def test_only_staff_sessions_see_customer_data(self):
+        for role, allowed in (('compliance', True), ('employee', True), ('customer', False), (None, False)):
+            with self.subTest(role=role):
+                request = mock.Mock(session={'user_role': role} if role else {})
+                self.assertEqual(has_staff_role(request), allowed)
+
+
+class ComplianceFormattingTests(SimpleTestCase):
+    def test_page_display_fields(self):
+        now = pd.Timestamp('2024-03-10 12:00')
+        transactions = [
+            {'risk_score': 85, 'transaction_amount': 1234567.891},
+            {'risk_score': 30, 'transaction_amount': '12.5'},
+            {'risk_score': None, 'transaction_amount': 'n/a'},
+            {'risk_score': '29', 'transaction_amount': None},
+        ]
+        timestamps = pd.Series(pd.to_datetime(['2024-03-07 10:00', '2024-03-10 07:30', None, '2024-03-10 11:45']))
+        format_compliance_page(transactions, timestamps, now)
+        self.assertEqual([t['status'] for t in transactions], ['Frozen', 'Under Review', 'Validated', 'Validated'])
+        self.assertEqual(transactions[0]['status_class'], 'bg-red-100 text-red-800')
+        self.assertEqual([t['formatted_date'] for t in transactions], ['Mar 07, 2024', 'Mar 10, 2024', 'N/A', 'Mar 10, 2024'])
+        self.assertEqual([t['time_ago'] for t in transactions], ['3d ago', '4h ago', 'N/A', '15m ago'])
+        self.assertEqual([t['formatted_amount'] for t in transactions], ['₹1,234,567.89', '₹12.50', 'N/A', 'N/A'])
+
+    def test_empty_page(self):
+        self.assertEqual(format_compliance_page([], pd.Series([], dtype='datetime64[ns]')), [])
+
+
+class RuleConditionParserTests(SimpleTestCase):
+    def setUp(self):
+        self.frame = pd.DataFrame({
+            'transaction_amount': [100000, 100, 100, np.nan],
+            'account_age_days': [10, 10, 400, 10],
+            'kyc_status': ['FULL', 'NONE', 'FULL', None],
+        })
+
+    def mask(self, condition):
+        return parse_condition(condition).evaluate(self.frame).tolist()
+
+    def test_and_binds_tighter_than_or(self):
+        # a or (b and c), not (a or b) and c
+        self.assertEqual(
+            self.mask("kyc_status == 'NONE' or transaction_amount > 50000 and account_age_days > 100"),
+            [False, True, False, False]
+        )
+
+    def test_parentheses_override_precedence(self):
+        self.assertEqual(
+            self.mask("(kyc_status == 'NONE' or transaction_amount > 50000) and account_age_days < 30"),
+            [True, True, False, False]
+        )
+
+    def test_not_negates_nested_condition(self):
+        self.assertEqual(self.mask("not (transaction_amount > 50000 or kyc_status == NONE)"), [False, False, True, False])
+
+    def test_missing_values_never_match(self):
+        self.assertEqual(self.mask("transaction_amount <= 100"), [False, True, True, False])
+        self.assertEqual(self.mask("kyc_status != 'FULL'"), [False, True, False, False])
+        self.assertEqual(self.mask("not transaction_amount > 50000"), [False, True, True, False])
+
+    def test_not_on_missing_field_matches_nothing(self):
+        self.assertEqual(self.mask("smurfing_indicator == 1"), [False] * 4)
+        self.assertEqual(self.mask("not smurfing_indicator == 1"), [False] * 4)
+
+    def test_syntax_errors(self):
+        for condition in ("transaction_amount >", "(kyc_status == 'FULL'", "kyc_status == 'FULL' and",
+                          "transaction_amount > 'high'", "transaction_amount ~ 5"):
+            with self.subTest(condition=condition):
+                with self.assertRaises(RuleSyntaxError):
+                    parse_condition(condition)
+
+    def test_parse_rule(self):
+        rule = parse_rule('Rule 3: If previous_fraud_flag == 1, add risk score 90, category "Very High", '
+                          'factor "Account previously involved in fraudulent activity"')
+        self.assertEqual((rule.number, rule.score, rule.category), (3, 90, "Very High"))
+        with self.assertRaises(RuleSyntaxError):
+            parse_rule('Rule 1: If transaction_amount > 5, add risk score 10, category "Severe", factor "x"')
+
+    def test_rule_set_takes_highest_score_and_category(self):
+        rules = RuleSet(
+            'Rule 1: If transaction_amount > 50000, add risk score 70, category "High", factor "Large"\n'
+            'Rule 2: If account_age_days < 30, add risk score 60, category "Medium", factor "New"\n'
+            'Rule 3: If nonsense, add risk score 10, category "Low", factor "Broken"'
+        )
+        self.assertEqual(len(rules.rules), 2)
+        self.assertEqual(len(rules.errors), 1)
+        result = rules.evaluate(self.frame)
+        self.assertEqual(result['risk_score'].tolist(), [70, 60, 0, 60])
+        self.assertEqual(result['risk_category'].tolist(), ['High', 'Medium', 'Low', 'Medium'])
+        self.assertEqual(result['risk_factors'].iloc[0], ['Large', 'New'])
+        self.assertEqual(rules.evaluate_one(self.frame.iloc[2])['rules_matched'], 0)
+
+
+class QueryClassifierTests(SimpleTestCase):
+    def test_inflected_keywords_match_whole_words_in_both_sets(self):
+        self.assertEqual(classify_locally("Plot my spending by merchant")[0], TRANSACTIONS)
+        self.assertEqual(classify_locally("how much did I pay in bills")[0], TRANSACTIONS)
+        self.assertEqual(classify_locally("Any tips to prevent scams?")[0], NO_TRANSACTIONS)
+        # 'otp' inside another word is not a match
+        self.assertEqual(classify_locally("show me my transactions by hotpot restaurants"), (TRANSACTIONS, 1.0))
+
+    def test_mixed_or_single_keyword_queries_are_not_confident(self):
+        self.assertEqual(classify_locally("hi, what did I spend on food"), (None, 0.5))
+        self.assertEqual(classify_locally("hello"), (NO_TRANSACTIONS, 0.5))
+        self.assertEqual(classify_locally("my balance"), (TRANSACTIONS, 0.5))
+        self.assertEqual(classify_locally("good morning"), (None, 0.0))
+        label, confidence = classify_locally("what are my largest expenses this month")
+        self.assertEqual(label, TRANSACTIONS)
+        self.assertLess(confidence, 1.0)
+
+    def test_query_log_replayed_on_start_up(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        log_path = os.path.join(directory.name, 'queries', 'labels.jsonl')
+        cache = QueryClassificationCache(log_path=log_path)
+        cache.put("Hi, what did I spend on food?", TRANSACTIONS)
+        with open(log_path, 'a') as f:
+            f.write('not json\n')
+
+        restarted = QueryClassificationCache(maxsize=10, log_path=log_path)
+        self.assertEqual(restarted.get("hi what did i spend on food"), TRANSACTIONS)
+        self.assertIsNone(QueryClassificationCache(log_path=None).get("hi what did i spend on food"))
+
+
+class AnalyticsCubeTests(SimpleTestCase):
+    def setUp(self):
+        self.frame = pd.DataFrame({
+            'transaction_id': ['T1', 'T2', 'T3', 'T4', 'T5'],
+            'transaction_amount': [100.0, 250.0, 50.0, 400.0, 'bad'],
+            'label_for_fraud': [0, 1, 0, 1, 0],
+            'method_of_transaction': ['UPI', 'NEFT', 'UPI', 'NEFT', None],
+            'location_data': ['Pune', 'Delhi', 'Pune', 'Pune', 'Delhi'],
+            'timestamp': ['05-01-2024 10:00', '20/02/2024 09:00:00', '2024-01-30 12:00', 'garbage', '10-02-2024 08:00'],
+        })
+        patcher = mock.patch.object(AnalyticsCube, '_chart', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_match_intent(self):
+        self.assertEqual(match_intent("Break down my spending by payment method"), 'method')
+        self.assertEqual(match_intent("How many suspicious transactions do I have?"), 'fraud')
+        self.assertEqual(match_intent("Show my monthly trend"), 'month')
+        # Rankings, time windows, numbers and several dimensions need generated code
+        for query in ("Which method did I use most", "fraud by location", "payment methods last month",
+                      "transactions above 5000 by method", "methods used in March", "hello"):
+            with self.subTest(query=query):
+                self.assertIsNone(match_intent(query))
+
+    def test_dimension_tables(self):
+        cube = AnalyticsCube(self.frame)
+        self.assertEqual((cube.count, cube.fraud_count, cube.total_amount), (5, 2, 800.0))
+        method = cube.tables['method']
+        self.assertEqual(list(method.index), ['NEFT', 'UPI', 'Unknown'])
+        self.assertEqual(method.loc['NEFT'].tolist(), [2, 650.0, 325.0, 2])
+        self.assertEqual(cube.counts('location'), {'Pune': 3, 'Delhi': 2})
+        # Months are parsed from every timestamp layout and listed in calendar order
+        self.assertEqual(cube.tables['month']['transactions'].to_dict(), {'2024-01': 2, '2024-02': 2, 'Unknown': 1})
+        self.assertFalse(cube.supports('category'))
+        self.assertEqual(cube.counts('category'), {})
+
+    def test_answers_and_prompt_summary(self):
+        cube = AnalyticsCube(self.frame)
+        answer = cube.answer('fraud')
+        self.assertEqual(answer['summary'], "2 of your 5 transactions are flagged as suspicious, totalling ₹650.00.")
+        self.assertIn('₹325.00', answer['dataframe_html'])
+        self.assertTrue(cube.answer('method')['summary'].startswith("Across 3 payment methods, NEFT accounts for the most"))
+        self.assertIn("- UPI: 2", cube.prompt_summary())
+        self.assertIs(cube.prompt_summary(), cube.prompt_summary())
+
+    def test_cubes_reused_until_data_changes(self):
+        cube = get_cube('c1', self.frame)
+        self.assertIs(get_cube('c1', self.frame.copy()), cube)
+        self.assertIsNot(get_cube('c2', self.frame), cube)
+        changed = self.frame.assign(transaction_amount=[1.0] * 5)
+        self.assertIsNot(get_cube('c1', changed), cube)
+        self.assertIs(get_cube('c1', changed, version=(1.0, None)), get_cube('c1', self.frame, version=(1.0, None)))
+
+
+class CodeSandboxTests(SimpleTestCase):
+    """Runs snippets in a one-worker pool with tight limits"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.pool = SandboxPool(workers=1, cpu_seconds=2, memory_mb=1536)
+        cls.df = pd.DataFrame({'transaction_amount': [10.0, 20.0, 30.0]})
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+        super().tearDownClass()
+
+    def test_returns_output_dict(self):
+        code = (
+            "import io\n"
+            "import pandas as pd\n"
+            "total = df['transaction_amount'].sum()\n"
+            "output = {'summary': f'Total {total:.0f}', 'visualization': img_str if 'img_str' in locals() else None}"
+        )
+        output, error = self.pool.run(code, self.df, timeout=10)
+        self.assertIsNone(error)
+        self.assertEqual(output, {'summary': 'Total 60', 'visualization': None})
+
+    def test_rejects_private_attributes_and_file_io(self):
+        self.assertIn("private attribute", check_code("x = ().__class__.__bases__"))
+        self.assertIn('to_csv', check_code("df.to_csv('/tmp/out.csv')"))
+        self.assertIn('read_csv', check_code("pd.read_csv('/etc/passwd')"))
+        self.assertIsNotNone(check_code("'{0.__class__}'.format(df)"))
+        self.assertIsNone(check_code("plt.savefig(buffer, format='png')"))
+
+    def test_builtins_and_imports_are_restricted(self):
+        output, error = self.pool.run("text = open('/etc/passwd').read()", self.df, timeout=10)
+        self.assertIsNone(output)
+        self.assertIn("'open' is not defined", error)
+        output, error = self.pool.run("import os", self.df, timeout=10)
+        self.assertIsNone(output)
+        self.assertIn('ImportError', error)
+
+    def test_wall_clock_timeout(self):
+        started = time.monotonic()
+        output, error = self.pool.run("while True:\n    pass", self.df, timeout=1)
+        self.assertIsNone(output)
+        self.assertIn('Time limit exceeded', error)
+        self.assertLess(time.monotonic() - started, 10)
+
+    @unittest.skipUnless(os.name == 'posix', "rlimits are POSIX only")
+    def test_cpu_limit(self):
+        output, error = self.pool.run("while True:\n    pass", self.df, timeout=30)
+        self.assertIsNone(output)
+        self.assertIn('CPU time limit exceeded', error)
+
+    @unittest.skipUnless(os.name == 'posix', "rlimits are POSIX only")
+    def test_memory_limit(self):
+        output, error = self.pool.run("block = ' ' * (4096 * 1024 * 1024)", self.df, timeout=10)
+        self.assertIsNone(output)
+        self.assertIn('MemoryError', error)
+
+
+class PromptBatchingTests(SimpleTestCase):
+    def setUp(self):
+        self.records = [{'transaction_id': i, 'transaction_amount': 1000 + i, 'note': None} for i in range(10)]
+        self.columns = ['transaction_id', 'transaction_amount']
+
+    def test_compact_record_drops_missing_values(self):
+        self.assertEqual(compact_record({'a': 1.0, 'b': np.nan, 'c': '', 'Unnamed: 3': 5}), {'a': 1})
+        self.assertEqual(encode_table(self.records[:2], ['transaction_id', 'note', 'transaction_amount']),
+                         'transaction_id,transaction_amount\n0,1000\n1,1001\n')
+
+    def test_output_budget_limits_records_per_batch(self):
+        batches = split_batches(self.records, self.columns, max_input_tokens=10000,
+                                max_output_tokens=300, output_tokens_per_record=100)
+        self.assertEqual([len(batch) for batch in batches], [3, 3, 3, 1])
+        self.assertEqual([r for batch in batches for r in batch], self.records)
+
+    def test_input_budget_limits_records_per_batch(self):
+        row_tokens = estimate_tokens('0,1000\n')
+        header_tokens = estimate_tokens(','.join(self.columns))
+        batches = split_batches(self.records, self.columns, max_input_tokens=header_tokens + 4 * row_tokens + 50,
+                                max_output_tokens=10000, output_tokens_per_record=1, overhead_tokens=50)
+        self.assertEqual([len(batch) for batch in batches], [4, 4, 2])
+
+    def test_max_records_and_oversized_records(self):
+        self.assertEqual([len(b) for b in split_batches(self.records, self.columns, max_records=4)], [4, 4, 2])
+        # A record over budget on its own is still sent, alone
+        batches = split_batches(self.records[:3], self.columns, max_input_tokens=1)
+        self.assertEqual([len(batch) for batch in batches], [1, 1, 1])
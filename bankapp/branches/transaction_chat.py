@@ -1,3 +1,4 @@
+import html
 import os
 import json
 import random
@@ -6,8 +7,11 @@ import pandas as pd
 import io
 import base64
 import matplotlib.pyplot as plt
-from google import genai
 from google.genai import types
+from .risk_profiling.utils.llm_clients import generate, get_gemini_client, pick_gemini_model
+from .query_classifier import classify_locally, get_classification_cache, MIN_CONFIDENCE
+from .chat_analytics import get_cube, match_intent, analysis_key, get_cached_analysis, cache_analysis
+from .code_sandbox import run_code
 
 class TransactionChatAssistant:
     def __init__(self):
@@ -16,39 +20,17 @@ class TransactionChatAssistant:
         api_key = os.environ.get("GOOGLE_API_KEY")
         
         self.api_available = False
+        self.classification_cache = get_classification_cache()
         
         if not api_key:
             print("WARNING: No API key found. Using fallback responses.")
             return
         
         try:
-            self.client = genai.Client(api_key=api_key)
-            self.model = "gemini-1.5-pro"  # Fallback to a standard model if 02-05 isn't available
-            
-            # Check available models and use the most appropriate one
-            try:
-                models = self.client.list_models()
-                model_names = [model.name for model in models]
-                
-                # Try to use these models in order of preference
-                preferred_models = [
-                    "gemini-2.0-pro-exp-02-05", 
-                    "gemini-1.5-pro", 
-                    "gemini-1.0-pro"
-                ]
-                
-                for model_name in preferred_models:
-                    if any(model_name in name for name in model_names):
-                        self.model = model_name
-                        break
-                
-                self.api_available = True
-                
-            except Exception as e:
-                print(f"Warning: Could not list models: {e}")
-                # Still consider API available since we were able to create a client
-                self.api_available = True
-            
+            # Shared client; the model list is discovered once per process, not per assistant
+            self.client = get_gemini_client(api_key)
+            self.model = pick_gemini_model()
+            self.api_available = True
         except Exception as e:
             print(f"Error initializing Gemini client: {e}")
     
@@ -66,22 +48,16 @@ class TransactionChatAssistant:
             # Default to NO_TRANSACTIONS for simplicity
             return 'NO_TRANSACTIONS'
         
-        # Keywords indicating transaction-related queries
-        transaction_keywords = [
-            'transaction', 'transactions', 'spending', 'purchase', 'purchases', 'payment', 'payments',
-            'deposit', 'withdraw', 'transfer', 'expense', 'expenses', 'income', 'balance', 'spent',
-            'received', 'paid', 'money flow', 'account activity', 'recent activity', 'show me', 'analyze',
-            'analysis', 'chart', 'graph', 'plot', 'visualization', 'report', 'summary', 'statistics',
-            'trend', 'pattern', 'compare', 'filter', 'categorize', 'group', 'total'
-        ]
-        
-        # Check if any transaction keyword is in the query
-        query_lower = query.lower()
+        # Confident keyword matches and previously labelled queries skip the API call
+        label, confidence = classify_locally(query)
+        if label and confidence > MIN_CONFIDENCE:
+            self.classification_cache.record('local')
+            return label
         
-        # Simple rule-based classification
-        for keyword in transaction_keywords:
-            if keyword in query_lower:
-                return 'TRANSACTIONS'
+        cached_label = self.classification_cache.get(query)
+        if cached_label:
+            self.classification_cache.record('cached')
+            return cached_label
         
         try:
             # Use Gemini for more sophisticated classification
@@ -93,32 +69,16 @@ USER QUERY: {query}
 
 RESPOND WITH ONLY ONE WORD: 'TRANSACTIONS' OR 'NO_TRANSACTIONS'."""
             
-            contents = [
-                types.Content(
-                    role="user",
-                    parts=[types.Part.from_text(text=prompt)],
-                ),
-            ]
-            
-            generate_content_config = types.GenerateContentConfig(
-                temperature=0.0,  # Using lowest temperature for deterministic results
-                max_output_tokens=10,
-                response_mime_type="text/plain",
-            )
-            
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=contents,
-                config=generate_content_config,
-            )
-            
-            result = response.text.strip().upper()
+            # Lowest temperature for deterministic results
+            result = generate(prompt, model=self.model, temperature=0.0, max_tokens=10).strip().upper()
             
             # Ensure valid response
             if result not in ['TRANSACTIONS', 'NO_TRANSACTIONS']:
                 # Default to NO_TRANSACTIONS for invalid responses
                 return 'NO_TRANSACTIONS'
-                
+            
+            self.classification_cache.record('llm')
+            self.classification_cache.put(query, result)
             return result
             
         except Exception as e:
@@ -126,39 +86,71 @@ RESPOND WITH ONLY ONE WORD: 'TRANSACTIONS' OR 'NO_TRANSACTIONS'."""
             # Default to NO_TRANSACTIONS on error
             return 'NO_TRANSACTIONS'
 
-    def generate_response(self, query, transactions_data, customer_id):
+    def generate_response(self, query, transactions_data, customer_id, data_version=None):
         """
         Generate a response to a query about transaction data.
         
         Args:
             query (str): The user's query
-            transactions_data (list): List of transaction dictionaries
+            transactions_data (DataFrame or list): The customer's transactions
             customer_id (str): The ID of the customer
+            data_version: Version of the source data (e.g. TransactionStore.version),
+                          so cached summaries are reused without rehashing the rows
             
         Returns:
             dict: Response containing text, HTML, and visualization data
         """
+        return self._final_response(self.stream_response(query, transactions_data, customer_id, data_version, stream=False))
+    
+    def stream_response(self, query, transactions_data, customer_id, data_version=None, stream=True):
+        """
+        Generate a response as a sequence of events, as soon as each part is available
+        
+        Events are (name, data) pairs:
+        - classification: {'is_transaction_query': bool}
+        - status: {'message': str} while code is generated and run
+        - summary: {'text': str} the analysis summary
+        - token: {'text': str} the next piece of the response text
+        - done: the complete response, as returned by generate_response, including the chart
+        
+        Args:
+            query (str): The user's query
+            transactions_data (DataFrame or list): The customer's transactions
+            customer_id (str): The ID of the customer
+            data_version: Version of the source data, if known
+            stream (bool): Stream LLM text with generate_content_stream (False makes one call per text)
+            
+        Yields:
+            tuple: (event name, event data)
+        """
+        transactions_data = self._as_frame(transactions_data)
+        
         # If API is not available, use fallback response
         if not self.api_available:
-            fallback_response = self._generate_fallback_response(query, transactions_data, customer_id)
-            return {
+            fallback_response = self._generate_fallback_response(query, transactions_data, customer_id, data_version)
+            yield 'classification', {'is_transaction_query': False}
+            yield 'token', {'text': fallback_response}
+            yield 'done', {
                 'response': fallback_response,
                 'html_response': fallback_response,
                 'is_transaction_query': False,
                 'canvas_data': None
             }
+            return
         
         # Determine if this is a transaction-related query
         query_type = self._classify_query(query)
         is_transaction_query = (query_type == 'TRANSACTIONS')
+        yield 'classification', {'is_transaction_query': is_transaction_query}
         
         # Return full response with visualization if transaction data is requested
-        if is_transaction_query and transactions_data:
-            return self._generate_transaction_analysis(query, transactions_data, customer_id)
-        elif is_transaction_query and not transactions_data:
+        if is_transaction_query and not transactions_data.empty:
+            yield from self._transaction_analysis_events(query, transactions_data, customer_id, data_version, stream)
+        elif is_transaction_query:
             # Handle the case where transaction data is requested but not available
             response = "I'd like to analyze your transaction data, but it seems I don't have access to it at the moment. Please try again later or contact customer support if this issue persists."
-            return {
+            yield 'token', {'text': response}
+            yield 'done', {
                 'response': response,
                 'html_response': response,
                 'is_transaction_query': True,
@@ -166,31 +158,108 @@ RESPOND WITH ONLY ONE WORD: 'TRANSACTIONS' OR 'NO_TRANSACTIONS'."""
             }
         else:
             # Non-transaction query
-            direct_response = self._generate_direct_response(query)
-            return {
+            direct_response = ''
+            for text in self._direct_response_tokens(query, stream):
+                direct_response += text
+                yield 'token', {'text': text}
+            yield 'done', {
                 'response': direct_response,
                 'html_response': direct_response,
                 'is_transaction_query': False,
                 'canvas_data': None
             }
     
-    def _generate_transaction_analysis(self, query, transactions_data, customer_id):
+    @staticmethod
+    def _final_response(events):
+        """Run an event sequence to the end and return its complete response"""
+        response = None
+        for name, data in events:
+            if name == 'done':
+                response = data
+        return response
+    
+    def _generate_text(self, prompt, config, stream=False):
+        """
+        Send a prompt to Gemini and yield the response text
+        
+        With stream=True the text is yielded piece by piece as it arrives
+        (generate_content_stream), otherwise in one piece.
+        """
+        contents = [
+            types.Content(
+                role="user",
+                parts=[types.Part.from_text(text=prompt)],
+            ),
+        ]
+        if stream:
+            for chunk in self.client.models.generate_content_stream(
+                model=self.model,
+                contents=contents,
+                config=config,
+            ):
+                if chunk.text:
+                    yield chunk.text
+        else:
+            yield self.client.models.generate_content(
+                model=self.model,
+                contents=contents,
+                config=config,
+            ).text
+    
+    @staticmethod
+    def _as_frame(transactions_data):
+        """Get transactions as a DataFrame, accepting a DataFrame or a list of dicts"""
+        if isinstance(transactions_data, pd.DataFrame):
+            return transactions_data
+        return pd.DataFrame(transactions_data or [])
+    
+    def _generate_transaction_analysis(self, query, transactions_data, customer_id, data_version=None):
         """
         Generate code and analysis for transaction-related queries.
         
         Args:
             query (str): The user's query
-            transactions_data (list): List of transaction dictionaries
+            transactions_data (DataFrame or list): The customer's transactions
             customer_id (str): The ID of the customer
+            data_version: Version of the source data, if known
             
         Returns:
             dict: Response with text, HTML, and visualization data
         """
+        return self._final_response(self._transaction_analysis_events(query, transactions_data, customer_id, data_version))
+    
+    def _transaction_analysis_events(self, query, transactions_data, customer_id, data_version=None, stream=False):
+        """Events of a transaction analysis (see stream_response); the explanation is streamed if stream is set"""
         try:
-            # Create dataframe from transactions
-            df = pd.DataFrame(transactions_data)
+            df = self._as_frame(transactions_data)
+            
+            # Common questions are answered from the precomputed cube without any API call
+            dimension = match_intent(query)
+            if dimension:
+                cube = get_cube(customer_id, df, data_version)
+                if cube.supports(dimension):
+                    canvas_data = cube.answer(dimension)
+                    yield 'summary', {'text': canvas_data['summary']}
+                    yield 'token', {'text': canvas_data['summary']}
+                    yield 'done', {
+                        'response': canvas_data['summary'],
+                        'html_response': f"<h3>Transaction Analysis</h3><p>{html.escape(canvas_data['summary'])}</p>",
+                        'is_transaction_query': True,
+                        'canvas_data': canvas_data
+                    }
+                    return
+            
+            # Repeated questions on unchanged data reuse the earlier code, chart and explanation
+            cache_key = analysis_key(query, customer_id, df, data_version)
+            cached_response = get_cached_analysis(cache_key)
+            if cached_response:
+                yield 'summary', {'text': cached_response['canvas_data'].get('summary')}
+                yield 'token', {'text': cached_response['response']}
+                yield 'done', cached_response
+                return
             
             # Generate Python code to analyze the data
+            yield 'status', {'message': 'Writing the analysis'}
             code_prompt = f"""You are an expert Python developer specializing in financial data analysis with pandas and matplotlib.
 
 TASK: Generate Python code to analyze transaction data based on the user's query.
@@ -269,27 +338,7 @@ output = {{
 RESPOND ONLY WITH PYTHON CODE, NO EXPLANATIONS OR COMMENTS OUTSIDE THE CODE BLOCK.
 """
             
-            contents = [
-                types.Content(
-                    role="user",
-                    parts=[types.Part.from_text(text=code_prompt)],
-                ),
-            ]
-            
-            generate_content_config = types.GenerateContentConfig(
-                temperature=0.2,
-                max_output_tokens=4096,
-                response_mime_type="text/plain",
-            )
-            
-            code_response = self.client.models.generate_content(
-                model=self.model,
-                contents=contents,
-                config=generate_content_config,
-            )
-            
-            # Extract Python code from response
-            code_text = code_response.text
+            code_text = generate(code_prompt, model=self.model, temperature=0.2, max_tokens=4096)
             
             # Clean up code - extract just the Python code if it's within markdown blocks
             if "```python" in code_text and "```" in code_text:
@@ -301,29 +350,20 @@ RESPOND ONLY WITH PYTHON CODE, NO EXPLANATIONS OR COMMENTS OUTSIDE THE CODE BLOC
             # Look for the output dictionary and ensure it's formatted correctly
             code_text = self._fix_output_format(code_text)
             
-            # Create a global/local scope for code execution
-            global_vars = {'df': df, 'pd': pd, 'plt': plt, 'io': io, 'base64': base64}
-            local_vars = {}
-            
-            # Execute the code
+            # Execute the code in a sandboxed worker process, off the request thread
+            yield 'status', {'message': 'Running the analysis'}
             print("Executing generated Python code:")
             print(code_text)
             
-            try:
-                exec(code_text, global_vars, local_vars)
-                
-                # Extract the output
-                if 'output' in local_vars:
-                    analysis_output = local_vars['output']
-                    visualization_b64 = analysis_output.get('visualization')
-                    summary = analysis_output.get('summary', 'Analysis complete, see visualization for details.')
-                else:
-                    # If no output provided, create a fallback visualization
-                    visualization_b64, summary = self._create_fallback_visualization(df, query)
-            except Exception as code_exec_error:
+            analysis_output, code_exec_error = run_code(code_text, df)
+            if analysis_output is not None:
+                visualization_b64 = analysis_output.get('visualization')
+                summary = analysis_output.get('summary') or 'Analysis complete, see visualization for details.'
+            else:
                 print(f"Error executing generated code: {code_exec_error}")
                 # Create fallback visualization if code execution fails
                 visualization_b64, summary = self._create_fallback_visualization(df, query)
+            yield 'summary', {'text': summary}
             
             # Generate a more detailed explanation using the analysis results
             explanation_prompt = f"""You are a financial analyst explaining transaction data to a bank customer.
@@ -343,21 +383,17 @@ Explain the results of the analysis in a clear, concise way that directly answer
 Include specific numbers and insights from the data.
 Your response should be conversational but precise.
 """
-            
-            contents = [
-                types.Content(
-                    role="user",
-                    parts=[types.Part.from_text(text=explanation_prompt)],
-                ),
-            ]
-            
-            explanation_response = self.client.models.generate_content(
-                model=self.model,
-                contents=contents,
-                config=generate_content_config,
+
+            explanation_config = types.GenerateContentConfig(
+                temperature=0.2,
+                max_output_tokens=4096,
+                response_mime_type="text/plain",
             )
-            
-            explanation_text = explanation_response.text
+
+            explanation_text = ''
+            for text in self._generate_text(explanation_prompt, explanation_config, stream):
+                explanation_text += text
+                yield 'token', {'text': text}
             
             # Format the response with markdown for better readability
             html_response = f"<h3>Transaction Analysis</h3><p>{explanation_text}</p>"
@@ -370,15 +406,18 @@ Your response should be conversational but precise.
             }
             
             # If dataframe HTML was generated, include it in the canvas data
-            if 'output' in local_vars and 'dataframe_html' in local_vars['output']:
-                canvas_data['dataframe_html'] = local_vars['output']['dataframe_html']
+            if analysis_output and analysis_output.get('dataframe_html'):
+                canvas_data['dataframe_html'] = analysis_output['dataframe_html']
             
-            return {
+            response = {
                 'response': explanation_text,
                 'html_response': html_response,
                 'is_transaction_query': True,
                 'canvas_data': canvas_data
             }
+            if analysis_output is not None:
+                cache_analysis(cache_key, response)
+            yield 'done', response
             
         except Exception as e:
             error_message = f"I encountered an error while analyzing your transaction data: {str(e)}"
@@ -386,10 +425,10 @@ Your response should be conversational but precise.
             
             # Try to create a basic visualization even when the main function fails
             try:
-                df = pd.DataFrame(transactions_data)
+                df = self._as_frame(transactions_data).copy(deep=False)
                 visualization_b64, summary = self._create_fallback_visualization(df, query)
                 
-                return {
+                yield 'done', {
                     'response': f"I've analyzed your transaction data. {summary}",
                     'html_response': f"<h3>Transaction Analysis</h3><p>{summary}</p>",
                     'is_transaction_query': True,
@@ -400,7 +439,7 @@ Your response should be conversational but precise.
                 }
             except Exception as fallback_error:
                 print(f"Error creating fallback visualization: {fallback_error}")
-                return {
+                yield 'done', {
                     'response': error_message,
                     'html_response': error_message,
                     'is_transaction_query': True,
@@ -682,6 +721,10 @@ output = {
         Returns:
             str: The assistant's response
         """
+        return ''.join(self._direct_response_tokens(query))
+    
+    def _direct_response_tokens(self, query, stream=False):
+        """Yield the text of a direct response, piece by piece if stream is set"""
         try:
             # Create a simple prompt for direct queries
             prompt = f"""You are a banking fraud detection assistant powered by Gemini AI. 
@@ -693,37 +736,25 @@ USER QUERY: {query}
 Provide a helpful, accurate, and concise response focused on banking fraud and security.
 """
             
-            contents = [
-                types.Content(
-                    role="user",
-                    parts=[types.Part.from_text(text=prompt)],
-                ),
-            ]
-            
             generate_content_config = types.GenerateContentConfig(
                 temperature=0.2,
                 max_output_tokens=1024,
                 response_mime_type="text/plain",
             )
             
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=contents,
-                config=generate_content_config,
-            )
-            
-            # Extract text from response
-            return response.text
+            yield from self._generate_text(prompt, generate_content_config, stream)
             
         except Exception as e:
             print(f"Error generating direct response: {e}")
-            return f"I'm sorry, I couldn't process your query. Please try again or ask a different question. Error: {str(e)}"
+            yield f"I'm sorry, I couldn't process your query. Please try again or ask a different question. Error: {str(e)}"
     
-    def _generate_fallback_response(self, query, transactions_data, customer_id):
+    def _generate_fallback_response(self, query, transactions_data, customer_id, data_version=None):
         """Generate a simple fallback response without using the API."""
         try:
+            transactions_data = self._as_frame(transactions_data)
+            
             # If no transaction data, provide generic fraud info
-            if not transactions_data:
+            if transactions_data.empty:
                 fallback_responses = [
                     "To identify fraud, look for unexpected transactions, calls from unknown numbers claiming to be your bank, or requests for personal information.",
                     "Common signs of fraud include unexpected withdrawals, purchases you didn't make, and notifications about password changes you didn't request.",
@@ -732,23 +763,20 @@ Provide a helpful, accurate, and concise response focused on banking fraud and s
                 ]
                 return random.choice(fallback_responses)
             
+            # All statistics come from the customer's memoized analytics cube
+            cube = get_cube(customer_id, transactions_data, data_version)
             query_lower = query.lower()
-            total_count = len(transactions_data)
-            fraud_count = sum(1 for t in transactions_data if t.get('label_for_fraud') == 1)
+            total_count = cube.count
+            fraud_count = cube.fraud_count
             fraud_percentage = (fraud_count / total_count * 100) if total_count > 0 else 0
-            
-            # Calculate total amount and average transaction amount
-            total_amount = sum(float(t.get('transaction_amount', 0)) for t in transactions_data)
-            avg_amount = total_amount / total_count if total_count > 0 else 0
+            total_amount = cube.total_amount
+            avg_amount = cube.avg_amount
             
             # Get transaction methods distribution
-            methods = {}
-            for t in transactions_data:
-                method = t.get('method_of_transaction', 'Unknown')
-                methods[method] = methods.get(method, 0) + 1
+            methods = cube.counts('method')
             
             # Find most common method
-            most_common_method = max(methods.items(), key=lambda x: x[1])[0] if methods else "Unknown"
+            most_common_method = next(iter(methods), "Unknown")
             
             # Generic responses
             generic_responses = [
@@ -784,61 +812,26 @@ Provide a helpful, accurate, and concise response focused on banking fraud and s
             print(f"Error in fallback response: {e}")
             return "I'm sorry, I'm having trouble analyzing your transaction data right now. Please try a simpler query or try again later."
     
-    def _create_transactions_summary(self, transactions):
+    def _create_transactions_summary(self, transactions, customer_id=None, data_version=None):
         """
         Create a summary of transactions to include in the prompt.
         
         Args:
-            transactions (list): List of transaction dictionaries
+            transactions (DataFrame or list): The customer's transactions
+            customer_id (str): The ID of the customer, to reuse its memoized summary
+            data_version: Version of the source data, if known
             
         Returns:
             str: A text summary of the transactions
         """
         try:
+            transactions = self._as_frame(transactions)
+            
             # Check if transactions is empty
-            if not transactions:
+            if transactions.empty:
                 return "No transaction data available for this customer."
-                
-            # Count total transactions
-            total_count = len(transactions)
             
-            # Count fraud transactions
-            fraud_count = sum(1 for t in transactions if t.get('label_for_fraud') == 1)
-            
-            # Calculate total transaction amount
-            total_amount = sum(float(t.get('transaction_amount', 0)) for t in transactions)
-            
-            # Get transaction methods distribution
-            methods = {}
-            for t in transactions:
-                method = t.get('method_of_transaction', 'Unknown')
-                methods[method] = methods.get(method, 0) + 1
-            
-            # Get locations distribution
-            locations = {}
-            for t in transactions:
-                location = t.get('location_data', 'Unknown')
-                locations[location] = locations.get(location, 0) + 1
-            
-            # Format summary
-            summary = f"""Total Transactions: {total_count}
-Fraud Transactions: {fraud_count}
-Total Transaction Amount: {total_amount:.2f}
-
-Transaction Methods:
-{self._format_dict(methods)}
-
-Transaction Locations:
-{self._format_dict(locations)}
-
-Sample Transactions (up to 5):
-{json.dumps(transactions[:5], indent=2)}
-"""
-            return summary
+            return get_cube(customer_id, transactions, data_version).prompt_summary()
         except Exception as e:
             print(f"Error creating transaction summary: {e}")
             return f"Error summarizing transactions: {str(e)}"
-    
-    def _format_dict(self, d):
-        """Format a dictionary as a string with each key-value pair on a new line."""
-        return '\n'.join(f"- {k}: {v}" for k, v in d.items()) 
\ No newline at end of file
@@ -0,0 +1,441 @@
+import os
+import threading
+import pandas as pd
+from typing import Dict, Optional, Sequence, Tuple
+
+try:
+    import pyarrow  # noqa: F401  (required by pandas for Feather I/O)
+    COLUMNAR_AVAILABLE = True
+except ImportError:
+    COLUMNAR_AVAILABLE = False
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+TRANSACTIONS_CSV = os.path.join(DATA_DIR, 'final_synthetic_transactions.csv')
+PRODTEST_CSV = os.path.join(DATA_DIR, 'prodtest.csv')
+ECOMMERCE_CSV = os.path.join(DATA_DIR, 'generated_ecommerce_data.csv')
+CHAT_TRANSACTIONS_CSV = os.path.join(os.path.dirname(DATA_DIR), 'data_sets', 'transaction_data.csv')
+
+# Columns a customer ID is looked up in, in order of preference
+CUSTOMER_KEY_COLUMNS = ('customer_account_number', 'customer_id')
+
+# Columns the data-heavy views read from their transaction files
+COMPLIANCE_COLUMNS = [
+    'customer_account_number', 'to_recipient_customer_account', 'old_balance',
+    'transaction_amount', 'new_balance', 'transaction_frequency', 'average_transaction_amount',
+    'account_age_days', 'method_of_transaction', 'transaction_currency', 'location_data',
+    'device_used', 'kyc_status', 'label_for_fraud', 'smurfing_indicator', 'previous_fraud_flag',
+    'transaction_id', 'timestamp'
+]
+ECOMMERCE_COLUMNS = [
+    'transaction_id', 'customer_id', 'timestamp', 'order_amount', 'new_amount',
+    'payment_method', 'ip_address', 'country', 'coupon_used'
+]
+STATISTICS_COLUMNS = [
+    'customer_account_number', 'label_for_fraud', 'transaction_currency',
+    'transaction_amount', 'method_of_transaction'
+]
+
+# Columnar copies are written next to the CSV with this extension
+COLUMNAR_EXTENSION = '.feather'
+
+# Timestamp layouts in the branch CSVs: prodtest.csv itself, then rows appended by generate_mock_data.py
+TIMESTAMP_FORMATS = ('%d-%m-%Y %H:%M', '%d/%m/%Y %H:%M:%S')
+
+# "memory" reads each file into process memory; "mmap" maps the columnar copy
+# zero-copy so all worker processes share one copy through the page cache
+STORE_BACKEND = os.environ.get('TRANSACTION_STORE_BACKEND', 'memory')
+
+# Columnar copies are sorted by these keys so a customer's rows are contiguous
+COLUMNAR_SORT_KEYS = {
+    TRANSACTIONS_CSV: 'customer_account_number',
+}
+
+
+def columnar_path(csv_path: str) -> str:
+    """Get the path of the columnar copy of a CSV file"""
+    return os.path.splitext(csv_path)[0] + COLUMNAR_EXTENSION
+
+
+def _fresh_columnar_path(csv_path: str) -> Optional[str]:
+    """Get the columnar copy of a CSV file if it exists and is not older than the CSV"""
+    if not COLUMNAR_AVAILABLE:
+        return None
+    path = columnar_path(csv_path)
+    try:
+        if os.path.getmtime(path) >= os.path.getmtime(csv_path):
+            return path
+    except OSError:
+        pass
+    return None
+
+
+def _map_columnar(path: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """
+    Open a Feather file zero-copy on top of a memory map
+
+    Numeric columns without nulls become numpy arrays pointing straight into
+    the mapped file. String columns stay Arrow-backed (pd.ArrowDtype) rather
+    than being materialised as per-process Python objects.
+    """
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    table = feather.read_table(path, columns=columns, memory_map=True)
+    types_mapper = None
+    if hasattr(pd, 'ArrowDtype'):
+        def types_mapper(arrow_type):
+            if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+                return pd.ArrowDtype(arrow_type)
+            return None
+    return table.to_pandas(split_blocks=True, self_destruct=False, types_mapper=types_mapper)
+
+
+def read_table(csv_path: str, columns: Optional[Sequence[str]] = None,
+               memory_map: bool = False) -> pd.DataFrame:
+    """
+    Read a transaction table, preferring its typed columnar copy
+
+    The Feather copy written by convert_to_columnar is used when pyarrow is
+    installed and the copy is at least as new as the CSV; otherwise the CSV
+    is parsed. Either way only the requested columns are read, and columns
+    missing from the file are skipped rather than raising.
+
+    Args:
+        csv_path: Path to the CSV file
+        columns: Optional subset of columns to read
+        memory_map: Map the columnar copy zero-copy instead of reading it
+
+    Returns:
+        DataFrame: The table (or the requested columns of it)
+    """
+    path = _fresh_columnar_path(csv_path)
+    if path is not None:
+        if columns is not None:
+            import pyarrow as pa
+            with pa.memory_map(path) as source:
+                available = set(pa.ipc.open_file(source).schema.names)
+            columns = [c for c in columns if c in available]
+        if memory_map:
+            return _map_columnar(path, columns)
+        return pd.read_feather(path, columns=columns)
+
+    if columns is None:
+        return pd.read_csv(csv_path)
+    wanted = set(columns)
+    return pd.read_csv(csv_path, usecols=lambda c: c in wanted)
+
+
+def convert_to_columnar(csv_path: str, output_path: Optional[str] = None,
+                        sort_by: Optional[str] = None) -> str:
+    """
+    Write a typed columnar (Feather) copy of a CSV file next to it
+
+    Blank trailing columns (pandas names them "Unnamed: N") that hold no
+    values are dropped. The file is written uncompressed so it can be
+    memory-mapped without decompressing into private memory.
+
+    Args:
+        csv_path: Path to the CSV file
+        output_path: Where to write the copy (defaults to columnar_path(csv_path))
+        sort_by: Column to stable-sort rows by (defaults to COLUMNAR_SORT_KEYS)
+
+    Returns:
+        str: Path of the written file
+    """
+    if not COLUMNAR_AVAILABLE:
+        raise ImportError("pyarrow is required to write columnar transaction files")
+
+    frame = pd.read_csv(csv_path)
+    blank = [c for c in frame.columns if str(c).startswith('Unnamed:') and frame[c].isna().all()]
+    frame = frame.drop(columns=blank)
+
+    sort_by = sort_by or COLUMNAR_SORT_KEYS.get(os.path.abspath(csv_path))
+    if sort_by and sort_by in frame.columns:
+        # A stable sort keeps each customer's rows in their original order
+        frame = frame.sort_values(sort_by, kind='stable').reset_index(drop=True)
+
+    output_path = output_path or columnar_path(csv_path)
+    frame.to_feather(output_path, compression='uncompressed')
+    return output_path
+
+
+def parse_timestamps(values: pd.Series, formats: Sequence[str] = TIMESTAMP_FORMATS) -> pd.Series:
+    """
+    Parse a timestamp column with explicit formats, trying each on the rows still unparsed
+
+    Anything no format matches is tried as ISO 8601 and then parsed
+    day-first as a last resort.
+
+    Args:
+        values: Timestamp strings
+        formats: strftime formats to try in order
+
+    Returns:
+        Series: datetime64 values (NaT where unparseable)
+    """
+    parsed = pd.to_datetime(values, format=formats[0], errors='coerce') if formats else \
+        pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    for fmt in list(formats[1:]) + ['ISO8601', None]:
+        missing = parsed.isna() & values.notna()
+        if not missing.any():
+            break
+        if fmt is None:
+            parsed[missing] = pd.to_datetime(values[missing], dayfirst=True, errors='coerce')
+        else:
+            parsed[missing] = pd.to_datetime(values[missing], format=fmt, errors='coerce')
+    return parsed
+
+
+class TransactionStore:
+    """
+    Process-wide cache of a parsed transaction CSV.
+
+    The file (or its columnar copy, see read_table) is parsed once and re-read
+    only when the modification time of either changes. Callers receive
+    shallow copies of the cached frame, so they can add columns or filter
+    freely without re-parsing the file, but they must not modify values in
+    place.
+
+    With TRANSACTION_STORE_BACKEND=mmap the columnar copy is memory-mapped
+    instead of read into private memory, so every gunicorn worker shares the
+    same page-cache pages for it.
+
+    Row positions are grouped by customer key on first use, so a single
+    customer's rows can be fetched without scanning the whole frame.
+    """
+
+    def __init__(self, csv_path: str, columns: Optional[Sequence[str]] = None):
+        self.csv_path = csv_path
+        self.columns = list(columns) if columns is not None else None
+        self._lock = threading.Lock()
+        self._frame = None
+        self._mtime = None
+        self._indexes = {}
+
+    def _signature(self) -> Tuple[float, Optional[float]]:
+        """Modification times of the CSV and its columnar copy (None if absent)"""
+        try:
+            columnar_mtime = os.path.getmtime(columnar_path(self.csv_path))
+        except OSError:
+            columnar_mtime = None
+        return os.path.getmtime(self.csv_path), columnar_mtime
+
+    def _load(self, mtime) -> pd.DataFrame:
+        """Parse the file and remember the modification times it was read at"""
+        frame = read_table(self.csv_path, self.columns, memory_map=STORE_BACKEND == 'mmap')
+        self._frame = frame
+        self._mtime = mtime
+        self._indexes = {}
+        return frame
+
+    def frame(self) -> pd.DataFrame:
+        """
+        Get the cached DataFrame, reloading it if the file changed on disk
+
+        Returns:
+            DataFrame: The shared parsed copy (do not modify in place)
+        """
+        mtime = self._signature()
+        frame = self._frame
+        if frame is not None and self._mtime == mtime:
+            return frame
+
+        with self._lock:
+            # Another thread may have reloaded the file while we waited
+            if self._frame is not None and self._mtime == mtime:
+                return self._frame
+            return self._load(mtime)
+
+    def view(self) -> pd.DataFrame:
+        """
+        Get a read-only view of the transactions
+
+        Returns:
+            DataFrame: A shallow copy sharing data with the cached frame
+        """
+        return self.frame().copy(deep=False)
+
+    def _index(self, frame: pd.DataFrame, column: str) -> Dict:
+        """
+        Get the mapping of key -> row positions for a column of the frame
+
+        The index is built once per loaded frame and dropped on reload.
+        """
+        indexes = self._indexes
+        index = indexes.get(column)
+        if index is None or index[0] is not frame:
+            with self._lock:
+                index = self._indexes.get(column)
+                if index is None or index[0] is not frame:
+                    positions = frame.groupby(column, sort=False).indices
+                    index = (frame, positions)
+                    self._indexes[column] = index
+        return index[1]
+
+    def timestamps(self, column: str = 'timestamp', formats: Sequence[str] = TIMESTAMP_FORMATS,
+                   frame: Optional[pd.DataFrame] = None) -> pd.Series:
+        """
+        Get a timestamp column parsed to datetimes, aligned by position with the frame
+
+        The column is parsed once per loaded frame and dropped on reload.
+        Pass the frame already obtained from frame() to stay aligned with it
+        even if the file is reloaded in between.
+        """
+        frame = self.frame() if frame is None else frame
+        key = (column, tuple(formats))
+        parsed = self._indexes.get(key)
+        if parsed is None or parsed[0] is not frame:
+            with self._lock:
+                parsed = self._indexes.get(key)
+                if parsed is None or parsed[0] is not frame:
+                    parsed = (frame, parse_timestamps(frame[column], formats))
+                    self._indexes[key] = parsed
+        return parsed[1]
+
+    def customer_transactions(self, customer_id, columns: Optional[Sequence[str]] = None,
+                              key_columns: Sequence[str] = CUSTOMER_KEY_COLUMNS) -> pd.DataFrame:
+        """
+        Get one customer's transactions using the precomputed customer index
+
+        The customer is looked up in each of ``key_columns`` in turn and the
+        first column with matching rows wins, mirroring the
+        customer_account_number -> customer_id fallback used by the views.
+        Within a column the id is tried as given, then as an int.
+
+        Args:
+            customer_id: The customer account number or customer ID
+            columns: Optional subset of columns to return
+            key_columns: Columns to look the customer up in, in order
+
+        Returns:
+            DataFrame: The customer's rows in file order (empty if none match)
+        """
+        frame = self.frame()
+        # Ids arrive as strings from URLs and forms, but numeric key columns are parsed as ints
+        keys = [customer_id]
+        try:
+            if int(customer_id) != customer_id:
+                keys.append(int(customer_id))
+        except (TypeError, ValueError):
+            pass
+
+        positions = None
+        for column in key_columns:
+            if column not in frame.columns:
+                continue
+            index = self._index(frame, column)
+            for key in keys:
+                positions = index.get(key)
+                if positions is not None and len(positions):
+                    break
+            if positions is not None and len(positions):
+                break
+
+        if columns is not None:
+            frame = project_columns(frame, columns)
+        if positions is None or not len(positions):
+            return frame.iloc[0:0]
+
+        first, last = positions[0], positions[-1]
+        if last - first + 1 == len(positions):
+            # Contiguous rows (e.g. a file sorted by customer) can be sliced without a copy
+            return frame.iloc[first:last + 1].copy(deep=False)
+        return frame.take(positions)
+
+    @property
+    def version(self) -> Optional[Tuple[float, Optional[float]]]:
+        """Modification times of the files the cached frame was parsed from"""
+        return self._mtime
+
+    def invalidate(self):
+        """Drop the cached frame so the next access re-reads the file"""
+        with self._lock:
+            self._frame = None
+            self._mtime = None
+            self._indexes = {}
+
+
+_stores: Dict[tuple, TransactionStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(csv_path: str = TRANSACTIONS_CSV, columns: Optional[Sequence[str]] = None) -> TransactionStore:
+    """
+    Get the shared store for a CSV file, creating it on first use
+
+    Args:
+        csv_path: Path to the CSV file (defaults to final_synthetic_transactions.csv)
+        columns: Optional subset of columns the store should load
+
+    Returns:
+        TransactionStore: The process-wide store for this file and column set
+    """
+    path = os.path.abspath(csv_path)
+    key = (path, tuple(columns) if columns is not None else None)
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                store = _stores[key] = TransactionStore(path, columns)
+                if columns is None:
+                    # Column subsets are projected from the full store from now on
+                    for other in [k for k in _stores if k[0] == path and k[1] is not None]:
+                        del _stores[other]
+    return store
+
+
+def project_columns(frame: pd.DataFrame, columns: Sequence[str]) -> pd.DataFrame:
+    """Select columns in file order, skipping any the file lacks, as read_table does for CSVs"""
+    wanted = set(columns)
+    return frame[[c for c in frame.columns if c in wanted]]
+
+
+def shared_store(csv_path: str, columns: Optional[Sequence[str]]) -> Tuple[TransactionStore, Optional[Sequence[str]]]:
+    """
+    Get the store to read a column subset from, and the columns still to project
+
+    If the whole file is already held by a store, the subset is projected
+    from it rather than parsing and holding the file a second time. Pass the
+    returned columns to project_columns (None means the frame is already the subset).
+    """
+    if columns is not None and (os.path.abspath(csv_path), None) in _stores:
+        return get_store(csv_path), columns
+    return get_store(csv_path, columns), None
+
+
+def load_transactions(csv_path: str = TRANSACTIONS_CSV, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """
+    Get a read-only view of the transactions in a CSV file
+
+    Args:
+        csv_path: Path to the CSV file (defaults to final_synthetic_transactions.csv)
+        columns: Optional subset of columns to load
+
+    Returns:
+        DataFrame: Shallow copy of the shared parsed data
+    """
+    store, project = shared_store(csv_path, columns)
+    frame = store.view()
+    if project is not None:
+        frame = project_columns(frame, project)
+    return frame
+
+
+def load_customer_transactions(customer_id, csv_path: str = TRANSACTIONS_CSV,
+                               columns: Optional[Sequence[str]] = None,
+                               key_columns: Sequence[str] = CUSTOMER_KEY_COLUMNS) -> pd.DataFrame:
+    """
+    Get one customer's transactions from a CSV file via the shared store
+
+    Args:
+        customer_id: The customer account number or customer ID
+        csv_path: Path to the CSV file (defaults to final_synthetic_transactions.csv)
+        columns: Optional subset of columns to load (must include the key columns)
+        key_columns: Columns to look the customer up in, in order
+
+    Returns:
+        DataFrame: The customer's rows in file order
+    """
+    store, project = shared_store(csv_path, columns)
+    return store.customer_transactions(customer_id, columns=project, key_columns=key_columns)
@@ -6,12 +6,15 @@ app_name = 'branches'  # Define the application namespace
 urlpatterns = [
     path('input/', views.branch_input, name='branch_input'),  # Branch input page
     path('transactions/', views.transactions, name='transactions'),  # Transactions page
+    path('api/transactions/', views.transactions_api, name='transactions_api'),  # Chunked transactions API
     path('risk-scoring/', views.risk_scoring, name='risk_scoring'),  # Risk scoring page
     path('insider-threat/', views.insider_threat, name='insider_threat'),  # Insider threat page
     path('api/risk-assessment/', views.risk_assessment_api, name='risk_assessment_api'),  # Risk assessment API endpoint
+    path('api/risk-assessment/tiers/', views.risk_tier_stats_api, name='risk_tier_stats_api'),  # Risk scoring tier counters
     path('api/insider-threat/logs/', views.insider_threat_logs_api, name='insider_threat_logs_api'),  # Insider threat logs API
     path('api/transaction-chat/', views.transaction_chat, name='transaction_chat_api'),  # Transaction chat API endpoint
     path('chatbot/', views.chat_bot, name='chatbot'),  # Chatbot page
+    path('api/chat/stream/', views.chat_stream_api, name='chat_stream_api'),  # Streaming chatbot API (server-sent events)
     path('fraud-detection/', views.fraud_detection, name='fraud_detection'),
     path('ecom-dashboard/', views.ecom_dashboard, name='ecom_dashboard'),  # Make sure this is present
     path('send-email/', views.send_email, name='send_email'),  # Add this line for the email API endpoint
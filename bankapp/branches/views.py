@@ -1,5 +1,5 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse  # Import JsonResponse from django.http instead
+from django.http import JsonResponse, StreamingHttpResponse  # Import JsonResponse from django.http instead
 from django.db import connection  # Connect to MySQL RDS
 from django.contrib.auth import logout
 from django.contrib.auth.decorators import login_required
@@ -8,13 +8,23 @@ import pandas as pd
 import os
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from .graph_utils import get_transaction_statistics
+from .transaction_store import (get_store, shared_store, project_columns, load_transactions, load_customer_transactions,
+                                COMPLIANCE_COLUMNS, ECOMMERCE_COLUMNS)
+from .ecommerce_utils import cached_dashboard_stats
 from .neo4j_utils import Neo4jConnection, load_transaction_data, create_transaction_graph, get_neo4j_browser_url, generate_static_visualization, generate_standalone_visualization
+from .neo4j_pool import get_pool_metrics
+from .middleware import has_staff_role
 import json
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from .transaction_chat import TransactionChatAssistant
 # Import the new Gemini risk assessment agent
-from .risk_profiling.agents.risk_assessment_gemini import GeminiRiskAssessmentAgent
+from .risk_profiling.agents.risk_assessment_gemini import GeminiRiskAssessmentAgent, RISK_RULES
+from .risk_cache import get_risk_cache, transaction_fingerprints
+from .risk_dispatcher import apply_fallback, assess_transactions
+from .compliance_stats import compliance_dashboard_stats
+from .pagination import RecordWindow, keyset_page, DEFAULT_CHUNK_SIZE
+from .formatting import format_compliance_page
 import markdown
 import bleach
 from django.utils.safestring import mark_safe
@@ -22,7 +32,7 @@ from django.conf import settings
 
 # Import risk profiling modules
 try:
-    from .risk_profiling.agents.risk_assessment_agent import RiskAssessmentAgent
+    from .risk_profiling.agents.risk_assessment_agent import RiskAssessmentAgent, get_tier_stats
     from .risk_profiling.agents.kyc_agent import KYCAgent
     from .risk_profiling.utils.data_processor import load_sample_data
 except ImportError:
@@ -30,7 +40,7 @@ except ImportError:
     import sys
     import os
     sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'branches', 'risk_profiling'))
-    from agents.risk_assessment_agent import RiskAssessmentAgent
+    from agents.risk_assessment_agent import RiskAssessmentAgent, get_tier_stats
     from agents.kyc_agent import KYCAgent
     from utils.data_processor import load_sample_data
 
@@ -101,77 +111,17 @@ def ecom_dashboard(request):
         if not os.path.exists(csv_path):
             raise FileNotFoundError(f"E-commerce data CSV not found at: {csv_path}")
             
-        # Read the CSV data
-        df = pd.read_csv(csv_path)
-        
-        # Import numpy for random number generation
-        import numpy as np
-        
-        # Basic preprocessing - add fraud flag (simulated)
-        df['is_fraud'] = (df['payment_method'] == 0) | (df['ip_address'].str.startswith('200.')) | \
-                         ((df['order_amount'] > 9000) & (df['country'] != 'India'))
-        
-        # Calculate dashboard statistics
-        total_transactions = len(df)
-        fraud_transactions = df[df['is_fraud']].shape[0]
-        fraud_percentage = (fraud_transactions / total_transactions * 100) if total_transactions > 0 else 0
-        avg_risk_score = df.apply(lambda row: 80 if row['is_fraud'] else 25 + (row['order_amount'] / 10000 * 30), axis=1).mean()
-        
-        # Calculate chargebacks (flagged)
-        df['is_chargeback'] = ((df['order_amount'] - df['new_amount']) / df['order_amount'] > 0.1) & (df['coupon_used'] == 'YES')
-        chargebacks = df[df['is_chargeback']].shape[0]
-        
-        # Get high risk alerts (top 3 by risk score)
-        df['risk_score'] = df.apply(lambda row: 85 + np.random.randint(0, 15) if row['is_fraud'] 
-                                   else 20 + np.random.randint(0, 40), axis=1)
-        
-        high_risk_alerts = []
-        high_risk_df = df.sort_values(by='risk_score', ascending=False).head(3)
-        for i, (_, row) in enumerate(high_risk_df.iterrows()):
-            high_risk_alerts.append({
-                'transaction_id': row['transaction_id'],
-                'risk_score': int(row['risk_score']),
-                'amount': float(row['order_amount']),
-                'time_ago': f"{i*3+2} minutes ago"
-            })
-        
-        # Prepare chart data for fraud vs legitimate transactions
-        chart_data = {
-            'labels': ['Legitimate', 'Fraudulent'],
-            'data': [total_transactions - fraud_transactions, fraud_transactions]
-        }
-        
-        # Convert chart data to JSON string
-        import json
-        chart_data_json = json.dumps(chart_data)
-        
-        # Get recent transactions (top 10)
-        recent_transactions = []
-        recent_df = df.sort_values(by='timestamp', ascending=False).head(10)
-        
-        for _, row in recent_df.iterrows():
-            risk_score = int(row['risk_score'])
-            
-            if risk_score >= 70:
-                status = 'Flagged'
-                status_class = 'bg-red-100 text-red-800'
-            elif risk_score >= 40:
-                status = 'Review'
-                status_class = 'bg-yellow-100 text-yellow-800'
-            else:
-                status = 'Approved'
-                status_class = 'bg-green-100 text-green-800'
-            
-            transaction = {
-                'transaction_id': row['transaction_id'],
-                'user_id': f"U{row['customer_id'] % 10000}",
-                'risk_score': risk_score,
-                'country': row['country'],
-                'status': status,
-                'status_class': status_class,
-                'amount': float(row['order_amount'])
-            }
-            recent_transactions.append(transaction)
+        # Score the orders with whole-column operations; results are reused
+        # until the data file changes
+        store, project = shared_store(csv_path, ECOMMERCE_COLUMNS)
+        stats = cached_dashboard_stats(store, columns=project)
+        total_transactions = stats['total_transactions']
+        fraud_percentage = stats['fraud_percentage']
+        avg_risk_score = stats['avg_risk_score']
+        chargebacks = stats['chargebacks']
+        high_risk_alerts = stats['high_risk_alerts']
+        chart_data_json = stats['chart_data_json']
+        recent_transactions = stats['recent_transactions']
         
         # Debug print to see what's being passed to the template
         print(f"Total transactions: {total_transactions}")
@@ -220,13 +170,20 @@ def ecom_dashboard(request):
             }
         })
 
+# Transactions per compliance dashboard page, and the most a client may request with ?per_page=
+COMPLIANCE_PAGE_SIZE = 10
+COMPLIANCE_MAX_PAGE_SIZE = 500
+
 def compliance_dashboard(request):
     # Path to the transactions CSV file
     csv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'prodtest.csv')
     
     try:
-        # Read the CSV file into a DataFrame
-        transactions_df = pd.read_csv(csv_path)
+        # Get the shared data, reading only the columns this dashboard uses
+        # (or projecting them if another view already holds the whole file)
+        store, project = shared_store(csv_path, COMPLIANCE_COLUMNS)
+        frame = store.frame()
+        transactions_df = frame.copy(deep=False) if project is None else project_columns(frame, project)
         # Add transaction_id if not present
         if 'transaction_id' not in transactions_df.columns:
             transactions_df['transaction_id'] = transactions_df.index.astype(str)
@@ -235,60 +192,53 @@ def compliance_dashboard(request):
         
         # Get the requested page and page size
         page = request.GET.get('page', 1)
-        per_page = 10  # Number of transactions per page
+        try:
+            per_page = max(1, min(int(request.GET.get('per_page', COMPLIANCE_PAGE_SIZE)), COMPLIANCE_MAX_PAGE_SIZE))
+        except ValueError:
+            per_page = COMPLIANCE_PAGE_SIZE
         
-        # Create a paginator for the dataframe
-        paginator = Paginator(transactions_df.to_dict('records'), per_page)
+        # Create a paginator over the dataframe; only the requested page becomes dicts
+        paginator = Paginator(RecordWindow(transactions_df), per_page)
         current_page = paginator.get_page(page)
         
         # Get transactions for the current page
         current_transactions = current_page.object_list
         
-        # Setup cache directory for risk assessments
-        risk_cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'risk_cache')
-        os.makedirs(risk_cache_dir, exist_ok=True)
-        page_cache_file = os.path.join(risk_cache_dir, f'transactions_risk_page_{page}.json')
+        # Risk assessments are cached per transaction (keyed by row contents and rule set)
+        risk_cache = get_risk_cache()
+        fingerprints = transaction_fingerprints(current_transactions, RISK_RULES)
         
         # Force regenerate if requested
         regenerate = request.GET.get('regenerate_risk', False)
-        if regenerate and os.path.exists(page_cache_file):
-            os.remove(page_cache_file)
-            
-        # Check if cache exists, otherwise generate risk assessments
-        if os.path.exists(page_cache_file) and not regenerate:
-            try:
-                with open(page_cache_file, 'r') as f:
-                    current_transactions = json.load(f)
-                    # Log successful cache load
-                    print(f"Loaded risk assessments from cache for page {page}")
-            except Exception as e:
-                print(f"Error loading cached risk assessments: {e}")
-                os.remove(page_cache_file)  # Remove corrupted cache file
-                # Fall through to regenerate the risk assessments
+        if regenerate:
+            risk_cache.invalidate(fingerprints.keys())
+        
+        # Apply cached assessments, and only send the misses to Gemini
+        cached = risk_cache.get_many(fingerprints)
+        uncached_transactions = []
+        for transaction in current_transactions:
+            assessment = cached.get(str(transaction.get('transaction_id', '')))
+            if assessment:
+                transaction.update(assessment)
+            else:
+                uncached_transactions.append(transaction)
+        print(f"Risk cache for page {page}: {len(cached)} hits, {len(uncached_transactions)} misses")
         
-        # If we don't have risk assessments (either no cache or corrupt cache), generate them
-        if not os.path.exists(page_cache_file) or regenerate:
+        if uncached_transactions:
             # Initialize risk agent and assess transactions
             try:
                 risk_agent = GeminiRiskAssessmentAgent()
-                print(f"Assessing transactions for page {page} using Gemini")
-                current_transactions = risk_agent.assess_transaction_risks_batch(current_transactions)
-                
-                # Cache the results
-                try:
-                    with open(page_cache_file, 'w') as f:
-                        json.dump(current_transactions, f)
-                        print(f"Cached risk assessments for page {page}")
-                except Exception as e:
-                    print(f"Error caching risk assessments: {e}")
+                print(f"Assessing {len(uncached_transactions)} transactions for page {page} using Gemini")
+                # Chunks are assessed in parallel and cached as each one completes
+                summary = assess_transactions(uncached_transactions, risk_agent, risk_cache, fingerprints)
+                print(f"Assessed {summary['assessed']} transactions for page {page} in {summary['seconds']:.1f}s "
+                      f"({summary['cached']} cached, {summary['failed']} failed)")
             except Exception as e:
                 print(f"Error assessing transaction risks: {e}")
                 # If Gemini fails, use fallback risk assessment
-                for transaction in current_transactions:
-                    if 'risk_score' not in transaction or 'risk_explanation' not in transaction:
-                        transaction['risk_score'] = 50
-                        transaction['risk_category'] = "Medium"
-                        transaction['risk_explanation'] = f"This transaction requires manual review. Risk score assigned by backup system."
+                apply_fallback([t for t in uncached_transactions
+                                if 'risk_score' not in t or 'risk_explanation' not in t],
+                               "This transaction requires manual review. Risk score assigned by backup system.")
         
         # Ensure all transactions have risk scores and explanations
         for transaction in current_transactions:
@@ -297,95 +247,23 @@ def compliance_dashboard(request):
             if 'risk_explanation' not in transaction or not transaction['risk_explanation']:
                 transaction['risk_explanation'] = "Detailed risk explanation not available for this transaction."
         
-        # Format transactions for display
-        for transaction in current_transactions:
-            risk_score = transaction.get('risk_score', 0)
-            
-            # Set status based on risk score
-            if risk_score < 30:
-                transaction['status'] = 'Validated'
-                transaction['status_class'] = 'bg-green-100 text-green-800'
-            elif risk_score < 70:
-                transaction['status'] = 'Under Review'
-                transaction['status_class'] = 'bg-yellow-100 text-yellow-800'
-            else:
-                transaction['status'] = 'Frozen'
-                transaction['status_class'] = 'bg-red-100 text-red-800'
-                
-            # Format date and time
-            try:
-                transaction['formatted_date'] = pd.to_datetime(transaction['timestamp']).strftime('%b %d, %Y')
-                time_diff = pd.Timestamp.now() - pd.to_datetime(transaction['timestamp'])
-                if time_diff.days > 0:
-                    transaction['time_ago'] = f"{time_diff.days}d ago"
-                else:
-                    hours = time_diff.seconds // 3600
-                    if hours > 0:
-                        transaction['time_ago'] = f"{hours}h ago"
-                    else:
-                        minutes = time_diff.seconds // 60
-                        transaction['time_ago'] = f"{minutes}m ago"
-            except:
-                transaction['formatted_date'] = 'N/A'
-                transaction['time_ago'] = 'N/A'
-                
-            # Format amount
-            try:
-                transaction['formatted_amount'] = f"₹{float(transaction['transaction_amount']):,.2f}"
-            except:
-                transaction['formatted_amount'] = 'N/A'
-        
-        # Load or calculate dashboard stats
-        stats_cache_file = os.path.join(risk_cache_dir, 'transaction_stats.json')
-        
-        if os.path.exists(stats_cache_file) and not regenerate:
-            try:
-                with open(stats_cache_file, 'r') as f:
-                    stats = json.load(f)
-                    high_risk_count = stats.get('high_risk_count', 0)
-                    avg_risk_score = stats.get('avg_risk_score', 0)
-                    pattern_anomalies = stats.get('pattern_anomalies', 0)
-                    insider_threats = stats.get('insider_threats', 0)
-            except Exception as e:
-                print(f"Error loading cached stats: {e}")
-                os.remove(stats_cache_file)  # Remove corrupted cache file
-                # Fall through to regenerate the stats
-        
-        # If we don't have stats (either no cache or corrupt cache), calculate them
-        if not os.path.exists(stats_cache_file) or regenerate:
-            # Calculate stats from all transactions (not just current page)
-            # First get risk scores for all transactions
-            all_risks = []
-            for p in range(1, paginator.num_pages + 1):
-                page_cache = os.path.join(risk_cache_dir, f'transactions_risk_page_{p}.json')
-                if os.path.exists(page_cache):
-                    try:
-                        with open(page_cache, 'r') as f:
-                            page_data = json.load(f)
-                            all_risks.extend([t.get('risk_score', 0) for t in page_data])
-                    except:
-                        pass
-            
-            if not all_risks:
-                all_risks = [t.get('risk_score', 0) for t in current_transactions]
-                
-            high_risk_count = sum(1 for score in all_risks if score >= 70)
-            avg_risk_score = sum(all_risks) / len(all_risks) if all_risks else 0
-            pattern_anomalies = sum(1 for t in transactions_df.to_dict('records') if t.get('smurfing_indicator', 0) == 1)
-            insider_threats = sum(1 for t in transactions_df.to_dict('records') if t.get('previous_fraud_flag', 0) == 1)
-            
-            # Cache the stats
-            try:
-                stats = {
-                    'high_risk_count': high_risk_count,
-                    'avg_risk_score': avg_risk_score,
-                    'pattern_anomalies': pattern_anomalies,
-                    'insider_threats': insider_threats
-                }
-                with open(stats_cache_file, 'w') as f:
-                    json.dump(stats, f)
-            except Exception as e:
-                print(f"Error caching stats: {e}")
+        # Format transactions for display, using timestamps parsed once per file load
+        page_start = current_page.start_index() - 1 if current_transactions else 0
+        page_timestamps = store.timestamps(frame=frame).iloc[page_start:page_start + len(current_transactions)]
+        format_compliance_page(current_transactions, page_timestamps)
+        
+        # Header stats come from running aggregates: risk totals kept by the cache,
+        # flag counts updated from rows appended to the CSV since the last request
+        stats = compliance_dashboard_stats(csv_path, risk_cache)
+        high_risk_count = stats['high_risk_count']
+        avg_risk_score = stats['avg_risk_score']
+        pattern_anomalies = stats['pattern_anomalies']
+        insider_threats = stats['insider_threats']
+        if not stats['scored_count']:
+            # Nothing cached yet; fall back to this page's scores
+            page_risks = [t.get('risk_score', 0) for t in current_transactions]
+            high_risk_count = sum(1 for score in page_risks if score >= 70)
+            avg_risk_score = sum(page_risks) / len(page_risks) if page_risks else 0
         
         # Prepare context for template
         context = {
@@ -397,7 +275,8 @@ def compliance_dashboard(request):
             'total_transactions': total_transactions,
             'has_previous': current_page.has_previous(),
             'has_next': current_page.has_next(),
-            'current_page': int(page),
+            'current_page': current_page.number,
+            'per_page': per_page,
             'total_pages': paginator.num_pages,
             'page_range': paginator.page_range
         }
@@ -410,6 +289,85 @@ def compliance_dashboard(request):
         print(f"Error in compliance dashboard: {error_details}")
         return render(request, 'compliance_dashboard.html', {'error': str(e)})
     
+def _chat_transactions(customer_id):
+    """
+    Load the chatbot's transaction data for a customer
+    
+    Returns:
+        tuple: (DataFrame or empty list, version of the source data or None)
+    """
+    try:
+        csv_file_path = os.path.join(settings.BASE_DIR, 'branches', 'data_sets', 'transaction_data.csv')
+        
+        if os.path.exists(csv_file_path):
+            # Filter by customer ID if available, using the shared customer index
+            if customer_id != 'Unknown':
+                df = load_customer_transactions(int(customer_id), csv_file_path, key_columns=('customer_id',))
+            else:
+                df = load_transactions(csv_file_path)
+            
+            # Hand over the frame itself; summaries are memoized per store version
+            return df, get_store(csv_file_path).version
+        print(f"Transaction data file not found: {csv_file_path}")
+    except Exception as e:
+        print(f"Error loading transaction data: {e}")
+    return [], None
+
+def _chat_html(text_response, html_response):
+    """Convert a plain-text (Markdown) chat response to sanitized HTML; HTML responses pass through"""
+    if html_response != text_response:
+        return html_response
+    html_content = markdown.markdown(text_response)
+    allowed_tags = ['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'ul', 'ol', 'li', 'strong', 'em', 'a', 'code', 'pre', 'blockquote']
+    allowed_attributes = {
+        'a': ['href', 'title']
+    }
+    return bleach.clean(html_content, tags=allowed_tags, attributes=allowed_attributes)
+
+def _sse_event(name, data):
+    """Format one server-sent event"""
+    return f"event: {name}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@csrf_exempt
+@require_POST
+def chat_stream_api(request):
+    """
+    Streaming variant of the chatbot API, as server-sent events
+    
+    Emits the query classification first, then status updates, the analysis
+    summary and the response text as Gemini generates it, and finally a done
+    event with the complete response and chart (same fields as chat_bot).
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON in request'}, status=400)
+    user_query = data.get('query', '')
+    customer_id = request.session.get('customer_id', '20917')  # Default to a test customer ID
+    
+    def events():
+        try:
+            chat_assistant = TransactionChatAssistant()
+            transaction_data, data_version = _chat_transactions(customer_id)
+            for name, payload in chat_assistant.stream_response(user_query, transaction_data, customer_id, data_version):
+                if name == 'done':
+                    payload = dict(payload, html_response=_chat_html(payload.get('response', ''), payload.get('html_response', '')))
+                yield _sse_event(name, payload)
+        except Exception as e:
+            print(f"Error in chat stream: {e}")
+            yield _sse_event('done', {
+                'response': "I apologize, but I encountered an error processing your request. Please try again.",
+                'html_response': "<p>I apologize, but I encountered an error processing your request. Please try again.</p>",
+                'is_transaction_query': False,
+                'canvas_data': None
+            })
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @csrf_exempt
 def chat_bot(request):
     """
@@ -426,30 +384,12 @@ def chat_bot(request):
             # Initialize the transaction chat assistant
             chat_assistant = TransactionChatAssistant()
             
-            # Define and load CSV file for transaction data
-            try:
-                csv_file_path = os.path.join(settings.BASE_DIR, 'branches', 'data_sets', 'transaction_data.csv')
-                
-                if os.path.exists(csv_file_path):
-                    df = pd.read_csv(csv_file_path)
-                    
-                    # Filter by customer ID if available
-                    if customer_id != 'Unknown':
-                        customer_id_int = int(customer_id)
-                        df = df[df['customer_id'] == customer_id_int]
-                    
-                    # Convert to list of dictionaries
-                    transaction_data = df.to_dict('records')
-                else:
-                    print(f"Transaction data file not found: {csv_file_path}")
-                    transaction_data = []
-            except Exception as e:
-                print(f"Error loading transaction data: {e}")
-                transaction_data = []
+            # Load this customer's transaction data
+            transaction_data, data_version = _chat_transactions(customer_id)
             
             # Generate response - wrap this in try-except to handle any API errors
             try:
-                response_data = chat_assistant.generate_response(user_query, transaction_data, customer_id)
+                response_data = chat_assistant.generate_response(user_query, transaction_data, customer_id, data_version)
             except Exception as api_error:
                 print(f"Error in chat assistant API: {api_error}")
                 # Return a basic error response
@@ -467,14 +407,7 @@ def chat_bot(request):
             canvas_data = response_data.get('canvas_data', None)
             
             # Sanitize and convert Markdown to HTML if html_response is plain text
-            if html_response == text_response:
-                html_content = markdown.markdown(text_response)
-                allowed_tags = ['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'ul', 'ol', 'li', 'strong', 'em', 'a', 'code', 'pre', 'blockquote']
-                allowed_attributes = {
-                    'a': ['href', 'title']
-                }
-                clean_html = bleach.clean(html_content, tags=allowed_tags, attributes=allowed_attributes)
-                html_response = clean_html
+            html_response = _chat_html(text_response, html_response)
             
             return JsonResponse({
                 'response': text_response,
@@ -609,6 +542,10 @@ def chatbot_view(request):
     return render(request, 'chatbot.html')
 
 def transactions(request):
+    # Customer transactions are only shown to staff, as for the dashboards
+    if not has_staff_role(request):
+        return redirect('/')
+    
     # Path to the CSV file
     csv_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
                            'branches', 'data', 'final_synthetic_transactions.csv')
@@ -617,12 +554,8 @@ def transactions(request):
     customer_id = int(request.GET.get('customer_id', 20917))
     
     try:
-        # Read all transactions data
-        df = pd.read_csv(csv_path)
-        
-        # Filter transactions for the specific customer
-        filtered_df = df[df['customer_account_number'] == customer_id]
-        all_transactions = filtered_df.to_dict('records')
+        # Get the customer's transactions from the shared customer index
+        filtered_df = load_customer_transactions(customer_id, csv_path, key_columns=('customer_account_number',))
         
         # Get transaction statistics
         stats = get_transaction_statistics(customer_id)
@@ -650,9 +583,9 @@ def transactions(request):
         # Graph data statistics
         graph_data = {
             'statistics': {
-                'total_transactions': len(all_transactions),
-                'fraud_transactions': sum(1 for t in all_transactions if t.get('label_for_fraud') == 1),
-                'normal_transactions': sum(1 for t in all_transactions if t.get('label_for_fraud') == 0)
+                'total_transactions': len(filtered_df),
+                'fraud_transactions': int((filtered_df['label_for_fraud'] == 1).sum()),
+                'normal_transactions': int((filtered_df['label_for_fraud'] == 0).sum())
             }
         }
         
@@ -672,8 +605,8 @@ def transactions(request):
         except ValueError:
             page_number = 1
             
-        # Create paginator with 10 items per page
-        paginator = Paginator(all_transactions, 10)
+        # Create paginator with 10 items per page; only the requested page becomes dicts
+        paginator = Paginator(RecordWindow(filtered_df), 10)
         
         try:
             page_obj = paginator.page(page_number)
@@ -683,12 +616,11 @@ def transactions(request):
         
         context = {
             'page_obj': page_obj,
-            'total_transactions': len(all_transactions),
+            'total_transactions': len(filtered_df),
             'customer_id': customer_id,
             'graph_data': graph_data,
             'stats': stats,
-            'chart_data_json': json.dumps(chart_data),
-            'all_transactions_json': json.dumps(all_transactions)
+            'chart_data_json': json.dumps(chart_data)
         }
         
         return render(request, 'transactions.html', context)
@@ -700,6 +632,41 @@ def transactions(request):
         })
     
     
+def transactions_api(request):
+    """
+    API endpoint returning a customer's transactions in chunks
+
+    Query parameters: customer_id, cursor (from the previous chunk's next_cursor),
+    limit and key (transaction_id or timestamp).
+    """
+    if not has_staff_role(request):
+        return JsonResponse({'error': 'Not authorized to view customer transactions'}, status=403)
+    
+    csv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'final_synthetic_transactions.csv')
+    
+    try:
+        customer_id = int(request.GET.get('customer_id', 20917))
+        limit = int(request.GET.get('limit', DEFAULT_CHUNK_SIZE))
+    except ValueError:
+        return JsonResponse({'error': 'customer_id and limit must be integers'}, status=400)
+    key = request.GET.get('key', 'transaction_id')
+    if key not in ('transaction_id', 'timestamp'):
+        return JsonResponse({'error': 'key must be transaction_id or timestamp'}, status=400)
+    
+    try:
+        filtered_df = load_customer_transactions(customer_id, csv_path, key_columns=('customer_account_number',))
+        page = keyset_page(filtered_df, key, request.GET.get('cursor'), limit)
+    except Exception as e:
+        print(f"Error in transactions_api: {str(e)}")
+        return JsonResponse({'error': f'Error reading transactions: {str(e)}'}, status=500)
+    
+    return JsonResponse({
+        'customer_id': customer_id,
+        'transactions': page['rows'],
+        'next_cursor': page['next_cursor'],
+        'total': page['total']
+    })
+
 @csrf_exempt
 @require_POST
 def transaction_chat(request):
@@ -731,28 +698,20 @@ def transaction_chat(request):
             return JsonResponse({'error': f'Transaction data file not found: {transactions_file}'}, status=500)
         
         try:
-            transactions_df = pd.read_csv(transactions_file)
+            # Match on customer_account_number first, then fall back to customer_id
+            customer_transactions = load_customer_transactions(customer_id_int, transactions_file)
         except Exception as e:
             print(f"Error reading CSV: {str(e)}")
             return JsonResponse({'error': f'Error reading transactions: {str(e)}'}, status=500)
         
-        # First try to match on customer_account_number
-        customer_transactions = transactions_df[transactions_df['customer_account_number'] == customer_id_int]
-        
-        # If no results, try matching on customer_id
-        if len(customer_transactions) == 0:
-            customer_transactions = transactions_df[transactions_df['customer_id'] == customer_id_int]
-        
-        # Convert to list of dictionaries for processing
-        transactions_data = customer_transactions.to_dict('records')
-        
-        if not transactions_data:
+        if customer_transactions.empty:
             return JsonResponse({'response': f"I couldn't find any transaction data for customer ID {customer_id}. Please check the customer ID and try again."})
         
         # Initialize chat assistant and generate response
         try:
             chat_assistant = TransactionChatAssistant()
-            response = chat_assistant.generate_response(query, transactions_data, customer_id)
+            response = chat_assistant.generate_response(query, customer_transactions, customer_id,
+                                                        get_store(transactions_file).version)
             return JsonResponse({'response': response})
         except ValueError as e:
             # Handle missing API key
@@ -813,15 +772,9 @@ def risk_assessment_api(request):
                 'error': 'Transaction data file not found. Tried: ' + ', '.join(possible_paths)
             }, status=500)
         
-        # Load and filter transaction data
-        transactions_df = pd.read_csv(transactions_file)
-        
-        # Try to match on customer_account_number
-        customer_transactions = transactions_df[transactions_df['customer_account_number'] == int(customer_id)]
-        
-        # If no results, try matching on customer_id
-        if len(customer_transactions) == 0:
-            customer_transactions = transactions_df[transactions_df['customer_id'] == int(customer_id)]
+        # Load the customer's transactions, matching on customer_account_number
+        # first and falling back to customer_id
+        customer_transactions = load_customer_transactions(int(customer_id), transactions_file)
         
         if len(customer_transactions) == 0:
             return JsonResponse({
@@ -879,6 +832,7 @@ def risk_assessment_api(request):
             'risk_category': combined_risk.get('risk_category', 'Unknown'),
             'risk_factors': risk_factors,
             'explanation': combined_risk.get('explanation', 'No detailed explanation available'),
+            'assessed_by': combined_risk.get('assessed_by', 'llm'),
             'total_transactions': len(customer_transactions),
             'risky_transactions': len(customer_transactions[customer_transactions['label_for_fraud'] == 1])
         }
@@ -891,6 +845,14 @@ def risk_assessment_api(request):
         print(f"Error in risk_assessment_api: {str(e)}")
         return JsonResponse({'error': f'Error processing risk assessment: {str(e)}'}, status=500)
 
+def risk_tier_stats_api(request):
+    """API endpoint reporting which scoring tier (rules or LLM) decided risk assessments"""
+    return JsonResponse(get_tier_stats())
+
+def neo4j_pool_metrics_api(request):
+    """API endpoint reporting usage of the shared Neo4j connection pool"""
+    return JsonResponse({'pools': get_pool_metrics()})
+
 @csrf_exempt
 @require_POST
 def insider_threat_logs_api(request):
@@ -1,17 +1,24 @@
-from neo4j import GraphDatabase
+import os
+import sys
+
+# Use the same pooled driver as the Django app
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bankapp', 'branches'))
+from neo4j_pool import get_driver, close_drivers, get_pool_metrics
 
 def test_connection():
     try:
         # Try to connect to Neo4j
-        driver = GraphDatabase.driver('bolt://localhost:7687', auth=('neo4j', 'admin123'))
+        driver = get_driver('bolt://localhost:7687', 'neo4j', 'admin123')
         driver.verify_connectivity()
         print(driver)
+        print(get_pool_metrics())
         print("Neo4j connection successful!")
-        driver.close()
         return True
     except Exception as e:
         print(f"Neo4j connection failed: {str(e)}")
         return False
+    finally:
+        close_drivers()
 
 if __name__ == "__main__":
-    test_connection() 
\ No newline at end of file
+    test_connection() 